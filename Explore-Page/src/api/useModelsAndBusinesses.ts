@@ -24,6 +24,24 @@ export type BusinessInfo = {
   image: string;
 };
 
+// Card returned by the batched explore/cards endpoint
+type ExploreCard = {
+  user_Id: string;
+  name: string | null;
+  role: string | null;
+  image: string | null;
+  // eslint-disable-next-line @typescript-eslint/no-explicit-any
+  tags: Record<string, any> | null;
+};
+
+const fetchExploreCards = (userIds: string[]): Promise<ExploreCard[]> =>
+  userIds.length
+    ? fetchData("explore/cards", {
+        method: "POST",
+        body: JSON.stringify({ user_Ids: userIds, folder: "profile-pic" }),
+      })
+    : Promise.resolve([]);
+
 export function useModelsAndBusinesses() {
   const [models, setModels] = useState<ModelInfo[]>([]);
   const [businesses, setBusinesses] = useState<BusinessInfo[]>([]);
@@ -45,50 +63,34 @@ export function useModelsAndBusinesses() {
           { method: "POST", body: JSON.stringify({}) }
         );
 
-        // Fetch model details
-        const modelDetails = await Promise.all(
-          modelIds.map(async (id) => {
-            const user = await fetchData(`users/${id}`);
-            const imageRes = await fetchData(
-              `files/files/latest?user_id=${id}&folder=profile-pic`
-            );
-            const tags = await fetchData(`ModellaTag/tags/models/${id}`);
+        // Hydrate all cards in one request per list instead of three per id
+        const [modelCards, businessCards]: ExploreCard[][] = await Promise.all([
+          fetchExploreCards(modelIds),
+          fetchExploreCards(businessIds),
+        ]);
 
-            return {
-              id,
-              name: user.name,
-              age: tags?.age || "Unknown",
-              image: imageRes?.s3_url || "/placeholder.svg",
-              height: tags?.height || "Unknown",
-              eyeColor: tags?.natural_eye_color || "Unknown",
-              bodyType: tags?.body_Type || "Unknown",
-              workField: tags?.work_Field || "Unknown",
-              gender: tags?.gender || "Unknown",
-              skinTone: tags?.skin_Tone || "Unknown",
-              experience: tags?.experience_Level || "Unknown",
-              location: tags?.location || "Unknown",
-            };
-          })
-        );
-
-        // Fetch business details
-        const businessDetails = await Promise.all(
-          businessIds.map(async (id) => {
-            const user = await fetchData(`users/${id}`);
-            const imageRes = await fetchData(
-              `files/files/latest?user_id=${id}&folder=profile-pic`
-            );
-            const tags = await fetchData(`ModellaTag/tags/brands/${id}`);
+        const modelDetails = modelCards.map(({ user_Id, name, image, tags }) => ({
+          id: user_Id,
+          name: name || "Unknown",
+          age: tags?.age || "Unknown",
+          image: image || "/placeholder.svg",
+          height: tags?.height || "Unknown",
+          eyeColor: tags?.natural_eye_color || "Unknown",
+          bodyType: tags?.body_Type || "Unknown",
+          workField: tags?.work_Field || "Unknown",
+          gender: tags?.gender || "Unknown",
+          skinTone: tags?.skin_Tone || "Unknown",
+          experience: tags?.experience_Level || "Unknown",
+          location: tags?.location || "Unknown",
+        }));
 
-            return {
-              id,
-              name: user.name,
-              workField: tags?.work_Field || "Unknown",
-              location: tags?.location || "Unknown",
-              image: imageRes?.s3_url || "/placeholder.svg",
-            };
-          })
-        );
+        const businessDetails = businessCards.map(({ user_Id, name, image, tags }) => ({
+          id: user_Id,
+          name: name || "Unknown",
+          workField: tags?.work_Field || "Unknown",
+          location: tags?.location || "Unknown",
+          image: image || "/placeholder.svg",
+        }));
 
         setModels(modelDetails);
         setBusinesses(businessDetails);
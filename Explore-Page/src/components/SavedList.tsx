@@ -105,7 +105,7 @@ export function SavedList({
 
           // Fetch the profile image URL(s)
           const fileUrlResponse = await fetchData(
-            `files/urls-for-user-id-and-foldername-with-limits?user_id=${id}&folder=profile-pic&limit=4`
+            `files/urls-for-user-id-and-foldername-with-limits?user_id=${id}&folder=profile-pic&limit=4&size=small`
           );
           const profileImage = Array.isArray(fileUrlResponse)
             ? fileUrlResponse.map((file: { s3_url: string }) => file.s3_url)
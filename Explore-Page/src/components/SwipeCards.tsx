@@ -122,7 +122,7 @@ const fetchUserProfileImage = async (
 ): Promise<ProfileImage[] | null> => {
   try {
     const data = await fetchData(
-      `files/urls-for-user-id-and-foldername-with-limits?user_id=${user__Id}&folder=profile-pic&limit=1`
+      `files/urls-for-user-id-and-foldername-with-limits?user_id=${user__Id}&folder=profile-pic&limit=1&size=large`
     );
     return data; // Return the profile image URL data if successful
   } catch (error) {
@@ -0,0 +1,104 @@
+"""Benchmark ranked brand-to-model matching with the NumPy scoring engine.
+
+Usage:
+    python benchmarks/bench_match_scoring.py --docs 1000000
+
+Compares one vectorized scoring pass + top-k selection against scoring the same
+models one document at a time in Python.
+"""
+import argparse
+import heapq
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.bench_tag_index import random_tag
+from services.match_scoring import FIELD_WEIGHTS, NUMERIC_FIELDS, RANGE_TOLERANCE, ModelScoringEngine
+
+PREFERENCES = {
+    "gender": {"gender": ["Female"]},
+    "brand-typical": {
+        "gender": ["Female"],
+        "age": (20, 30),
+        "height": (165, 180),
+        "work_Field": ["Beauty Modeling", "Runway Modeling"],
+        "location": ["Paris, France", "Milan, Italy"],
+    },
+    "everything": {
+        "age": (18, 25),
+        "height": (160, 175),
+        "natural_eye_color": ["Brown"],
+        "body_Type": ["Slim"],
+        "work_Field": ["Beauty Modeling"],
+        "skin_Tone": ["Olive"],
+        "ethnicity": ["Asian"],
+        "natural_hair_type": ["Curly"],
+        "experience_Level": ["Beginner"],
+        "gender": ["Female"],
+        "location": ["Mumbai, India"],
+        "shoe_Size": (36, 40),
+        "bust_chest": (80, 90),
+        "waist": (60, 70),
+        "hips": (85, 95),
+    },
+}
+
+
+def python_score(doc, preference):
+    """Per-document reference scorer with the engine's weighting rules."""
+    total = weight_sum = 0.0
+    for field, wanted in preference.items():
+        weight = FIELD_WEIGHTS[field]
+        weight_sum += weight
+        value = doc.get(field)
+        if field in NUMERIC_FIELDS:
+            low, high = wanted
+            distance = max(low - value, 0) + max(value - high, 0)
+            total += weight * min(max(1 - distance / RANGE_TOLERANCE[field], 0), 1)
+        elif isinstance(value, list):
+            overlap = len(set(value) & set(wanted))
+            total += weight * overlap / min(len(value), len(wanted))
+        elif value in wanted:
+            total += weight
+    return total / weight_sum
+
+
+def time_calls(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--top", type=int, default=100)
+    args = parser.parse_args()
+
+    random.seed(42)
+    docs = [random_tag(i) for i in range(args.docs)]
+
+    engine = ModelScoringEngine()
+    start = time.perf_counter()
+    engine.rebuild(docs)
+    print(f"engine build: {args.docs} docs in {time.perf_counter() - start:.2f}s")
+
+    print(f"{'preference':<16}{'numpy ms':>12}{'python ms':>12}")
+    for name, preference in PREFERENCES.items():
+        vectorized = time_calls(lambda: engine.rank(preference, args.top), args.repeat)
+        looped = time_calls(
+            lambda: heapq.nlargest(args.top, docs, key=lambda doc: python_score(doc, preference)), 1
+        )
+        print(f"{name:<16}{vectorized * 1000:>12.2f}{looped * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Benchmark random-key pivot sampling against the `$match` + `$sample` aggregation.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_random_sampling.py --docs 100000
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_random_sampling.py --docs 1000000
+
+Loads synthetic model tags (with random keys and the same indexes main.py
+creates) into a scratch database, reports the median latency and documents
+examined for both strategies, and drops the database afterwards.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from benchmarks.bench_tag_index import QUERIES, random_tag
+from services.random_sampling import RANDOM_KEY_FIELD, sample_documents, with_random_key
+
+
+async def time_calls(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+async def docs_examined(collection, pipeline):
+    explain = await collection.database.command(
+        "explain", {"aggregate": collection.name, "pipeline": pipeline, "cursor": {}}, verbosity="executionStats"
+    )
+    stats = explain.get("executionStats") or explain["stages"][0]["$cursor"]["executionStats"]
+    return stats["totalDocsExamined"]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--sample", type=int, default=100)
+    args = parser.parse_args()
+
+    mongo_url = os.getenv("MONGO_URL")
+    if not mongo_url:
+        sys.exit("MONGO_URL must point at a MongoDB server")
+
+    random.seed(42)
+    client = AsyncIOMotorClient(mongo_url)
+    collection = client["modella_bench"]["models_tags"]
+    await collection.drop()
+    for offset in range(0, args.docs, 10_000):
+        batch = [with_random_key(random_tag(i)) for i in range(offset, min(offset + 10_000, args.docs))]
+        await collection.insert_many(batch)
+    await collection.create_index(RANDOM_KEY_FIELD)
+    await collection.create_index([("gender", 1), (RANDOM_KEY_FIELD, 1)])
+    await collection.create_index([("location", 1), (RANDOM_KEY_FIELD, 1)])
+    print(f"loaded {args.docs} docs")
+
+    print(f"{'query':<18}{'$sample ms':>12}{'pivot ms':>10}{'$sample docs':>14}{'pivot docs':>12}")
+    for name, query in QUERIES.items():
+        pipeline = [{"$match": query}, {"$sample": {"size": args.sample}}]
+        sample_time = await time_calls(lambda: collection.aggregate(pipeline).to_list(length=None), args.repeat)
+        pivot_time = await time_calls(lambda: sample_documents(collection, query, args.sample), args.repeat)
+
+        pivot_pipeline = [
+            {"$match": {"$and": [query, {RANDOM_KEY_FIELD: {"$gte": random.random()}}]}},
+            {"$sort": {RANDOM_KEY_FIELD: 1}},
+            {"$limit": args.sample},
+        ]
+        print(
+            f"{name:<18}{sample_time * 1000:>12.1f}{pivot_time * 1000:>10.1f}"
+            f"{await docs_examined(collection, pipeline):>14}{await docs_examined(collection, pivot_pipeline):>12}"
+        )
+
+    await client.drop_database("modella_bench")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
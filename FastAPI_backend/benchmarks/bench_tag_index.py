@@ -0,0 +1,112 @@
+"""Benchmark the in-memory model tag index against the `$match` + `$sample` aggregation.
+
+Usage:
+    python benchmarks/bench_tag_index.py --docs 100000
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_tag_index.py --docs 500000
+
+The MongoDB side only runs when MONGO_URL is set; it loads the same synthetic
+tags into a scratch database and drops it afterwards.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.keywords import get_keywords
+from services.tag_index import TagBitmapIndex
+
+QUERIES = {
+    "gender": {"gender": "Female"},
+    "gender+location": {"gender": "Female", "location": {"$in": ["Paris, France", "Rome, Italy"]}},
+    "work_field": {"work_Field": {"$in": ["Beauty Modeling"]}},
+    "age+height": {"age": {"$gte": 20, "$lte": 30}, "height": {"$gte": 160, "$lte": 175}},
+    "explore": {
+        "gender": "Female",
+        "skin_Tone": "Olive",
+        "age": {"$gte": 18, "$lte": 25},
+        "location": {"$in": ["Mumbai, India", "London, United Kingdom"]},
+    },
+}
+
+
+def random_tag(i):
+    return {
+        "client_Type": "Model",
+        "user_Id": f"model_bench_{i}",
+        "age": random.randint(18, 60),
+        "height": random.randint(150, 191),
+        "natural_eye_color": random.choice(get_keywords("natural_eye_colors")),
+        "body_Type": random.choice(get_keywords("body_types")),
+        "work_Field": random.sample(get_keywords("work_fields"), 3),
+        "skin_Tone": random.choice(get_keywords("skin_tones")),
+        "ethnicity": random.choice(get_keywords("ethnicities")),
+        "natural_hair_type": random.choice(get_keywords("natural_hair_types")),
+        "experience_Level": random.choice(get_keywords("experience_levels")),
+        "gender": random.choice(get_keywords("genders")),
+        "location": random.choice(get_keywords("locations")),
+        "shoe_Size": random.randint(31, 50),
+        "bust_chest": random.randint(61, 117),
+        "waist": random.randint(51, 91),
+        "hips": random.randint(61, 107),
+    }
+
+
+def time_calls(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--sample", type=int, default=100)
+    args = parser.parse_args()
+
+    random.seed(42)
+    docs = [random_tag(i) for i in range(args.docs)]
+
+    index = TagBitmapIndex()
+    start = time.perf_counter()
+    index.rebuild(docs)
+    print(f"index build: {args.docs} docs in {time.perf_counter() - start:.2f}s")
+
+    collection = None
+    mongo_url = os.getenv("MONGO_URL")
+    if mongo_url:
+        from pymongo import MongoClient
+
+        client = MongoClient(mongo_url)
+        collection = client["modella_bench"]["models_tags"]
+        collection.drop()
+        collection.create_index("user_Id", unique=True)
+        for offset in range(0, len(docs), 10_000):
+            collection.insert_many([dict(doc) for doc in docs[offset:offset + 10_000]])
+    else:
+        print("MONGO_URL not set: skipping the aggregation side")
+
+    print(f"{'query':<18}{'matches':>10}{'index (us)':>14}{'aggregate (us)':>16}")
+    for name, query in QUERIES.items():
+        matches = index.count(query)
+        index_time = time_calls(lambda: index.sample_user_ids(query, args.sample), args.repeat)
+        aggregate_time = None
+        if collection is not None:
+            pipeline = [{"$match": query}, {"$sample": {"size": args.sample}}]
+            aggregate_time = time_calls(lambda: list(collection.aggregate(pipeline)), args.repeat)
+        aggregate_column = f"{aggregate_time * 1e6:>16.0f}" if aggregate_time is not None else f"{'-':>16}"
+        print(f"{name:<18}{matches:>10}{index_time * 1e6:>14.0f}{aggregate_column}")
+
+    if collection is not None:
+        collection.database.client.drop_database("modella_bench")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""Every MongoDB index the services rely on, declared per collection.
+
+Usage:
+    python -m config.indexes            # build missing indexes (what main.py does at startup)
+    python -m config.indexes --check    # list missing and undeclared indexes; exit 1 if any are missing
+    python -m config.indexes --prune    # build missing indexes and drop undeclared ones
+
+Add an index here next to the query it serves; tests/test_index_plans.py
+explains each hot query against a scratch database and fails on a COLLSCAN.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from services.random_sampling import RANDOM_KEY_FIELD
+
+logger = logging.getLogger(__name__)
+
+# Newest file per uploader, in one folder or across all of them (file_service.get_latest_files_by_users)
+LATEST_FILE_INDEXES = (
+    [("uploaded_by", ASCENDING), ("folder", ASCENDING), ("uploaded_at", DESCENDING)],
+    [("uploaded_by", ASCENDING), ("uploaded_at", DESCENDING)],
+)
+
+
+def _random_key_index() -> IndexModel:
+    # Random-key sampling without filters (services.random_sampling)
+    return IndexModel([(RANDOM_KEY_FIELD, ASCENDING)])
+
+
+def _paging_indexes(*fields: str) -> List[IndexModel]:
+    # Equality filter on one field, then the `_id` order and `_id > cursor` seek of keyset pagination
+    return [IndexModel([(field, ASCENDING), ("_id", ASCENDING)]) for field in fields]
+
+
+# Collection name -> indexes; names follow pymongo's defaults so existing indexes are recognised
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("user_Id", ASCENDING)], unique=True),  # Also serves the `^model` / `^brand` prefix regex
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "ratings": [
+        IndexModel([("user_Id", ASCENDING), ("ratedBy_Id", ASCENDING)], unique=True),  # One rating per pair
+        IndexModel([("user_Id", ASCENDING), ("rating", ASCENDING), ("_id", DESCENDING)]),  # Ratings at a level, newest first
+        IndexModel([("ratedBy_Id", ASCENDING), ("user_Id", ASCENDING)]),  # Who a user already rated (feed exclusions)
+    ],
+    "rating_summary": [
+        IndexModel([("user_Id", ASCENDING)], unique=True),
+    ],
+    "file_metadata": [
+        IndexModel([("file_id", ASCENDING)], unique=True),
+        *(IndexModel(keys) for keys in LATEST_FILE_INDEXES),
+        # Public listings (optionally by folder); only public files are indexed
+        IndexModel(
+            [("is_private", ASCENDING), ("folder", ASCENDING)],
+            name="public_files_by_folder", partialFilterExpression={"is_private": False},
+        ),
+        IndexModel([("folder", ASCENDING), ("uploaded_at", DESCENDING)]),  # Folder listings without a user
+    ],
+    "file_objects": [
+        IndexModel([("sha256", ASCENDING)], unique=True),
+    ],
+    "upload_sessions": [
+        IndexModel([("session_id", ASCENDING)], unique=True),
+        IndexModel([("updated_at", ASCENDING)]),  # Stale-session GC
+    ],
+    "projects": [
+        IndexModel([("project_Id", ASCENDING)], unique=True),
+        IndexModel([("user_Id", ASCENDING), ("project_Id", ASCENDING)]),  # A user's projects
+    ],
+    "SavedList": [
+        IndexModel([("user_Id", ASCENDING)], unique=True),
+    ],
+    "models_tags": [
+        IndexModel([("user_Id", ASCENDING)], unique=True),
+        _random_key_index(),
+        # Random-key sampling behind the common equality filters
+        IndexModel([("gender", ASCENDING), (RANDOM_KEY_FIELD, ASCENDING)]),
+        IndexModel([("location", ASCENDING), (RANDOM_KEY_FIELD, ASCENDING)]),
+        # Keyset pages (services.pagination.find_page) behind the same filters: a seek, no in-memory sort
+        *_paging_indexes("gender", "location"),
+    ],
+    "brands_tags": [
+        IndexModel([("user_Id", ASCENDING)], unique=True),
+        _random_key_index(),
+        IndexModel([("location", ASCENDING), (RANDOM_KEY_FIELD, ASCENDING)]),
+        *_paging_indexes("location"),
+    ],
+    "projects_tags": [
+        IndexModel([("project_Id", ASCENDING)], unique=True),
+        _random_key_index(),
+        IndexModel([("user_Id", ASCENDING), ("project_Id", ASCENDING)]),
+        *_paging_indexes("user_Id"),  # A brand paging through its projects
+    ],
+    "model_preference": [
+        IndexModel([("user_Id", ASCENDING)], unique=True),
+        _random_key_index(),
+    ],
+    "brand_preferences": [
+        IndexModel([("user_Id", ASCENDING)], unique=True),
+        _random_key_index(),
+    ],
+    "model_brand_preference": [
+        IndexModel([("user_Id", ASCENDING)], unique=True),
+        _random_key_index(),
+    ],
+}
+
+
+def _declared_names(collection_name: str) -> List[str]:
+    return [model.document["name"] for model in INDEXES[collection_name]]
+
+
+async def _ensure_collection(database, collection_name: str) -> List[str]:
+    try:
+        return await database[collection_name].create_indexes(INDEXES[collection_name])
+    except Exception as e:
+        # One collection's conflict must not keep the others from getting their indexes
+        logger.error(f"Error creating indexes on {collection_name}: {str(e)}")
+        return []
+
+
+async def ensure_indexes(database) -> Dict[str, List[str]]:
+    """Create every declared index, building the collections concurrently (existing indexes are no-ops)."""
+    names = list(INDEXES)
+    built = await asyncio.gather(*(_ensure_collection(database, name) for name in names))
+    logger.info(f"Indexes ensured on {len(names)} collections")
+    return dict(zip(names, built))
+
+
+async def index_plan(database) -> Dict[str, Dict[str, List[str]]]:
+    """Declared indexes a collection lacks, and indexes it has that are not declared here."""
+    plan = {}
+    for collection_name in INDEXES:
+        existing = set(await database[collection_name].index_information()) - {"_id_"}
+        declared = _declared_names(collection_name)
+        plan[collection_name] = {
+            "missing": [name for name in declared if name not in existing],
+            "undeclared": sorted(existing - set(declared)),
+        }
+    return plan
+
+
+async def prune_indexes(database, plan: Dict[str, Dict[str, List[str]]]):
+    for collection_name, changes in plan.items():
+        for name in changes["undeclared"]:
+            await database[collection_name].drop_index(name)
+            logger.info(f"Dropped undeclared index {collection_name}.{name}")
+
+
+async def main(argv=None) -> int:
+    from config.setting import db
+
+    parser = argparse.ArgumentParser(description="Build the declared MongoDB indexes.")
+    parser.add_argument("--check", action="store_true", help="only report missing and undeclared indexes")
+    parser.add_argument("--prune", action="store_true", help="drop indexes that are not declared")
+    args = parser.parse_args(argv)
+
+    plan = await index_plan(db)
+    for collection_name, changes in plan.items():
+        for name in changes["missing"]:
+            print(f"missing     {collection_name}.{name}")
+        for name in changes["undeclared"]:
+            print(f"undeclared  {collection_name}.{name}")
+    if args.check:
+        return 1 if any(changes["missing"] for changes in plan.values()) else 0
+
+    await ensure_indexes(db)
+    if args.prune:
+        await prune_indexes(db, plan)
+    print("Indexes up to date.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
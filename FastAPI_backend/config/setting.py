@@ -2,6 +2,7 @@ import os
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 import boto3
+from botocore.config import Config
 
 # Load environment variables from the .env file
 load_dotenv()
@@ -17,7 +18,10 @@ db = client[MONGO_DB]
 
 user_collection = db["users"]
 rating_collection = db["ratings"]
+rating_summary_collection = db["rating_summary"]
 file_collection = db["file_metadata"]
+file_objects_collection = db["file_objects"]  # Content-addressed S3 objects and their reference counts
+upload_sessions_collection = db["upload_sessions"]
 project_collection =db["projects"]
 saved_list_collection=db["SavedList"]
 
@@ -36,11 +40,20 @@ AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 AWS_BUCKET_NAME = os.getenv("AWS_BUCKET_NAME")
 AWS_REGION = os.getenv("AWS_REGION")
 
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "16"))
+
 s3_client = boto3.client(
     "s3",
     aws_access_key_id=AWS_ACCESS_KEY,
     aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=AWS_REGION
+    region_name=AWS_REGION,
+    # Pooled keep-alive connections shared by the storage executor's threads, with bounded connect/read waits
+    config=Config(
+        max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+        connect_timeout=5,
+        read_timeout=60,
+        retries={"max_attempts": 3, "mode": "standard"},
+    )
 )
 
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
@@ -4,12 +4,22 @@ from routes.file_routes import router as file_router
 from routes.user_routes import router as user_router
 from routes.rating_routes import router as rating_router
 from routes.project_routes import router as project_router
-from routes.role_management import router as role_router
-from services.Modellatag_service import router as Modellatag_router
+from routes.role_management import router as role_router, jwks_store, auth0_identity
+from services.Modellatag_service import router as Modellatag_router, load_model_tag_index, load_project_interval_index
 from services.Modella_preference_service import router as ModellaPref_router
 from services.keywords import router as keyword_router
+from services.feed_service import router as feed_router
+from services.explore_service import router as explore_router
+from services.rating_services import ensure_rating_summaries
+from services.loaders import start_request_loaders
+from services.user_existence import load_user_existence_filter
+from services.upload_session_service import run_upload_session_gc
+from services.storage import object_store
+from services import image_derivatives
+from services.random_sampling import backfill_random_keys
 from models.saved_list import router as savedList_router
 from config.setting import *
+from config.indexes import ensure_indexes
 import logging
 from config.logging_config import *
 from contextlib import asynccontextmanager
@@ -18,8 +28,8 @@ from config.rate_limiter import limiter
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
 from dotenv import load_dotenv
+import asyncio
 import os
-import requests
 
 
 # Load environment variables
@@ -32,38 +42,46 @@ AUTH0_AUDIENCE = os.getenv("AUTH0_AUDIENCE")
 REDIRECT_URI = os.getenv("REDIRECT_URI")
 AUTH0_ALGORITHM = "RS256"
 
+# Collections sampled through services.random_sampling
+random_key_collections = (
+    model_tags_collection, brand_tags_collection, project_tags_collection,
+    model_preferences_collection, brand_preferences_collection, model_brand_preferences_collection
+)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    try:
-        # Create unique indexes for user_collection
-        await user_collection.create_index("user_Id", unique=True)
-        await user_collection.create_index("email", unique=True)
-        # Create unique index for rating_collection to prevent duplicate ratings
-        await rating_collection.create_index(
-            [("user_Id", 1), ("ratedBy_Id", 1)],
-            unique=True
-        )
-        await file_collection.create_index("file_id", unique=True)
-        await project_collection.create_index("project_Id", unique=True)
-        await saved_list_collection.create_index("user_Id", unique=True)
-
-        await model_tags_collection.create_index("user_Id", unique=True)
-        await brand_tags_collection.create_index("user_Id", unique=True)
-        await project_tags_collection.create_index("project_Id", unique=True)
-
-        await model_preferences_collection.create_index("user_Id", unique=True)
-        await brand_preferences_collection.create_index("user_Id", unique=True)
-        await model_brand_preferences_collection.create_index("user_Id", unique=True)
-
-        logger.info("All indexes created successfully!")
-        print("Indexes created.")
-
-    except Exception as e:
-        logger.error(f"Error creating indexes: {str(e)}")
+    # Declared in config/indexes.py; collections are built concurrently (also: python -m config.indexes)
+    await ensure_indexes(db)
+    print("Indexes created.")
+
+    # Build the in-memory model tag index in the background; filters use MongoDB until it is ready
+    tag_index_task = asyncio.create_task(load_model_tag_index())
+    project_index_task = asyncio.create_task(load_project_interval_index())
+    # Existence checks ask MongoDB until the user Bloom filter is built
+    user_filter_task = asyncio.create_task(load_user_existence_filter())
+    # Keep the Auth0 signing keys cached so token checks never wait on the JWKS endpoint
+    jwks_task = asyncio.create_task(jwks_store.run_refresher())
+    # Backfill rating summaries on the first start after they were introduced
+    rating_summary_task = asyncio.create_task(ensure_rating_summaries())
+    # Give documents written before random keys existed their key
+    random_key_task = asyncio.create_task(backfill_random_keys(*random_key_collections))
+    # Abort resumable uploads that were abandoned part-way
+    upload_gc_task = asyncio.create_task(run_upload_session_gc())
 
     yield  # FastAPI app is running
 
     # Shutdown actions
+    tag_index_task.cancel()
+    project_index_task.cancel()
+    user_filter_task.cancel()
+    jwks_task.cancel()
+    await jwks_store.aclose()
+    await auth0_identity.aclose()
+    rating_summary_task.cancel()
+    random_key_task.cancel()
+    upload_gc_task.cancel()
+    image_derivatives.shutdown()
+    object_store.shutdown()
     logger.info("Application is shutting down")
     print("App is shutting down")
 
@@ -82,11 +100,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # Keyset pagination cursor on filter endpoints
 )
 
 # Add SlowAPI middleware
 app.add_middleware(SlowAPIMiddleware)
 
+# Give each request its own batching loaders and log how many queries its lookups took
+@app.middleware("http")
+async def request_loaders_middleware(request: Request, call_next):
+    loaders = start_request_loaders()
+    response = await call_next(request)
+    stats = loaders.stats()
+    if stats["lookups"]:
+        logger.info(f"{request.method} {request.url.path}: {stats['lookups']} lookups in {stats['queries']} queries")
+    return response
+
 app.state.limiter = limiter
 
 # Global rate limit error handler
@@ -118,6 +147,12 @@ app.include_router(ModellaPref_router)
 # Include the keyword managing routes
 app.include_router(keyword_router)
 
+# Include the swipe feed routes
+app.include_router(feed_router)
+
+# Include the batched Explore card routes
+app.include_router(explore_router)
+
 # Include the Saved List managing routes
 app.include_router(savedList_router)
 
@@ -141,17 +176,10 @@ def login():
 
 # Auth0 token endpoint
 @app.get("/token")
-def get_access_token(code: str, response: Response):
+async def get_access_token(code: str, response: Response):
     print(f"Received code: {code}")
-    payload = (
-        "grant_type=authorization_code"
-        f"&client_id={AUTH0_CLIENT_ID}"
-        f"&client_secret={AUTH0_CLIENT_SECRET}"
-        f"&code={code}"
-        f"&redirect_uri={REDIRECT_URI}"
-    )
-    headers = {"content-type": "application/x-www-form-urlencoded"}
-    response_data = requests.post(f"https://{AUTH0_DOMAIN}/oauth/token", data=payload, headers=headers)
+    # Pooled, time-limited and concurrency-capped; no threadpool worker is held while Auth0 answers
+    response_data = await auth0_identity.exchange_code(code, REDIRECT_URI)
     print(response_data)
     print(f"Response Text: {response_data.text}")
 
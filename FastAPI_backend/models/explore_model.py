@@ -0,0 +1,18 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+# Largest batch a single /explore/cards call hydrates
+MAX_EXPLORE_CARDS = 200
+
+class ExploreCardsRequest(BaseModel):
+    user_Ids: List[str] = Field(..., max_length=MAX_EXPLORE_CARDS)
+    folder: str = "profile-pic"  # Folder the card image is taken from
+    size: Optional[str] = "small"  # Image rendition size class (None for the original upload)
+
+
+class ExploreCard(BaseModel):
+    user_Id: str
+    name: Optional[str] = None
+    role: Optional[str] = None
+    image: Optional[str] = None  # Presigned URL of the latest file in the folder
+    tags: Optional[dict] = None  # Model or brand tag, depending on the role
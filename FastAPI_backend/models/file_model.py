@@ -1,5 +1,5 @@
-from typing import Optional
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, Field
 from datetime import datetime
 
 class FileMetadata(BaseModel):
@@ -22,3 +22,32 @@ class FileMetadataOnURL(BaseModel):
     s3_url: Optional[str]
     is_private: bool
     description:Optional[str] = None
+
+
+class UploadSessionRequest(BaseModel):
+    user_id: str
+    file_name: str
+    file_type: str
+    file_size: int = Field(..., gt=0)  # Total bytes; fixes the part layout for the session
+    folder: str = "video"
+    is_private: bool = False
+    description: Optional[str] = "No description"
+    project_id: Optional[str] = None
+
+
+class UploadSessionStatus(BaseModel):
+    session_id: str
+    file_id: str
+    file_size: int
+    part_size: int  # Every part but the last is exactly this size
+    total_parts: int
+    uploaded_parts: List[int]  # Part numbers already stored; resume with the rest
+    expires_at: datetime
+
+
+class DirectUploadTicket(BaseModel):
+    session_id: str  # Pass to the completion callback once the POST succeeds
+    file_id: str
+    url: str  # POST the file here as multipart/form-data ...
+    fields: dict  # ... with these form fields before the file field
+    expires_at: datetime
@@ -1,7 +1,8 @@
 from typing import List
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from config.setting import saved_list_collection, user_collection, project_collection
+from config.setting import saved_list_collection, project_collection
+from services.user_existence import user_is_registered, users_are_registered
 
 
 router = APIRouter(prefix="/savedList", tags=["savedList"])
@@ -13,7 +14,8 @@ class savedList(BaseModel):
 
 @router.post("/add")
 async def add_saved_id(user_id: str, new_id: List[str]):
-    user = await user_collection.find_one({"user_Id": user_id})
+    # The user and the ID to save are checked together (at most one $in query)
+    user, *new_users = await users_are_registered([user_id, *new_id])
     if not user:
         raise HTTPException(status_code=404, detail="User not registered")
     
@@ -21,7 +23,7 @@ async def add_saved_id(user_id: str, new_id: List[str]):
         raise HTTPException(status_code=400, detail="Only one ID should be sent in the list")
     new_id = new_id[0]
 
-    new_user = await user_collection.find_one({"user_Id": new_id})
+    new_user = new_users[0]
     if not new_user:
         raise HTTPException(status_code=404, detail="The ID to save is not a registered user")
     
@@ -44,7 +46,8 @@ async def add_saved_id(user_id: str, new_id: List[str]):
 
 @router.post("/remove")
 async def remove_saved_id(user_id: str, remove_id: List[str]):
-    user = await user_collection.find_one({"user_Id": user_id})
+    # The user and the ID to remove are checked together (at most one $in query)
+    user, *remove_users = await users_are_registered([user_id, *remove_id])
     if not user:
         raise HTTPException(status_code=404, detail="User not registered")
 
@@ -52,7 +55,7 @@ async def remove_saved_id(user_id: str, remove_id: List[str]):
         raise HTTPException(status_code=400, detail="Only one ID should be sent in the list")
     remove_id = remove_id[0]
 
-    remove_user = await user_collection.find_one({"user_Id": remove_id})
+    remove_user = remove_users[0]
     if not remove_user:
         raise HTTPException(status_code=404, detail="The ID to remove is not a registered user")
 
@@ -77,7 +80,7 @@ async def remove_saved_id(user_id: str, remove_id: List[str]):
 @router.get("/{user_id}")
 async def get_saved_ids(user_id: str):
     # Check if the user exists
-    user = await user_collection.find_one({"user_Id": user_id})
+    user = await user_is_registered(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not registered")
 
@@ -93,7 +96,7 @@ async def get_saved_ids(user_id: str):
 
 @router.post("/add-project")
 async def add_saved_id(user_id: str, new_id: List[str]):
-    user = await user_collection.find_one({"user_Id": user_id})
+    user = await user_is_registered(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not registered")
     
@@ -121,7 +124,7 @@ async def add_saved_id(user_id: str, new_id: List[str]):
 
 @router.post("/remove-project")
 async def remove_saved_id(user_id: str, remove_id: List[str]):
-    user = await user_collection.find_one({"user_Id": user_id})
+    user = await user_is_registered(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not registered")
 
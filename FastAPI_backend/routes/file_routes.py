@@ -1,10 +1,16 @@
-from fastapi import APIRouter, UploadFile, File
+from fastapi import APIRouter, UploadFile, File, Request
 from typing import List, Optional
 from services.file_service import (
     get_file_by_project, get_files_urls_by_folder, get_latest_file_by_user_folder, upload_file, get_files, download_file, delete_file, update_visibility, get_file_url, get_files_urls_by_user_folders
 )
+from services.upload_session_service import (
+    initiate_upload_session, upload_session_part, get_upload_session, complete_upload_session, abort_upload_session,
+    initiate_direct_upload, complete_direct_upload
+)
+from services.storage import object_store
+from services.url_signer import url_signer
 
-from models.file_model import FileMetadataOnURL
+from models.file_model import DirectUploadTicket, FileMetadataOnURL, UploadSessionRequest, UploadSessionStatus
 
 router = APIRouter(prefix="/files", tags=["File Management"])
 
@@ -12,6 +18,47 @@ router = APIRouter(prefix="/files", tags=["File Management"])
 async def upload(file: UploadFile = File(...), user_id: str = "default_user", folder: str = "image", is_private: bool = False, description: str ="No description",project_id: Optional[str] = None):
     return await upload_file(file, user_id, folder, is_private, description, project_id)
 
+# Resumable uploads: initiate, PUT parts (in any order, in parallel), then complete or abort
+@router.post("/uploads", response_model=UploadSessionStatus)
+async def start_upload_session(request: UploadSessionRequest):
+    return await initiate_upload_session(request)
+
+@router.put("/uploads/{session_id}/parts/{part_number}", response_model=UploadSessionStatus)
+async def put_upload_part(session_id: str, part_number: int, user_id: str, request: Request):
+    """Raw part bytes in the request body; every part but the last is exactly `part_size` bytes."""
+    return await upload_session_part(session_id, part_number, user_id, request.stream())
+
+@router.get("/uploads/{session_id}", response_model=UploadSessionStatus)
+async def upload_session_status(session_id: str, user_id: str):
+    return await get_upload_session(session_id, user_id)
+
+@router.post("/uploads/{session_id}/complete")
+async def finish_upload_session(session_id: str, user_id: str):
+    return await complete_upload_session(session_id, user_id)
+
+@router.delete("/uploads/{session_id}")
+async def cancel_upload_session(session_id: str, user_id: str):
+    return await abort_upload_session(session_id, user_id)
+
+# Direct-to-S3 uploads: get a presigned POST, upload to S3, then report back so the file is recorded
+@router.post("/direct-uploads", response_model=DirectUploadTicket)
+async def start_direct_upload(request: UploadSessionRequest):
+    return await initiate_direct_upload(request)
+
+@router.post("/direct-uploads/{session_id}/complete")
+async def finish_direct_upload(session_id: str, user_id: str):
+    return await complete_direct_upload(session_id, user_id)
+
+@router.get("/url-cache/stats")
+async def url_cache_stats():
+    """Hit rate of the presigned URL cache."""
+    return url_signer.stats()
+
+@router.get("/storage/stats")
+async def storage_stats():
+    """S3 operations in flight, queued for a worker, and per-operation latency."""
+    return object_store.stats()
+
 @router.get("/files/", response_model=List[dict])
 async def list_files(user_id: str = None):
     return await get_files(user_id)
@@ -31,33 +78,36 @@ async def change_visibility(file_id: str, user_id: str, is_private: bool):
 
 
 @router.get("/files/urls", response_model=List[FileMetadataOnURL])
-async def get_file_urls_by_user_id(user_id: Optional[str] = None):
+async def get_file_urls_by_user_id(user_id: Optional[str] = None, size: Optional[str] = None, image_format: str = "webp"):
     """
     Get file URLs for a specific user or all public files if user_id is not provided.
     Excludes private files unless the user is the owner.
+    `size` (thumb, small, large) returns image renditions in `image_format` (webp or jpeg) where they exist.
     """
     # Call the get_file_url function to retrieve the file URLs
-    files = await get_file_url(user_id=user_id)
+    files = await get_file_url(user_id=user_id, size=size, image_format=image_format)
     return files
 
 @router.get("/urls-for-user-id-and-foldername-with-limit", response_model=List[FileMetadataOnURL])
-async def get_file_urls_by_user_id_and_folder_with_limit(user_id: Optional[str] = None, folder: Optional[str] = None, limit: Optional[int] = None):
+async def get_file_urls_by_user_id_and_folder_with_limit(user_id: Optional[str] = None, folder: Optional[str] = None, limit: Optional[int] = None, size: Optional[str] = None, image_format: str = "webp"):
     """
     Get file URLs for a specific user or all public files if user_id is not provided.
     Excludes private files unless the user is the owner.
+    `size` (thumb, small, large) returns image renditions in `image_format` (webp or jpeg) where they exist.
     """
     # Call the get_file_url function to retrieve the file URLs
-    files = await get_files_urls_by_folder(user_id=user_id, folder= folder, limit=limit)
+    files = await get_files_urls_by_folder(user_id=user_id, folder= folder, limit=limit, size=size, image_format=image_format)
     return files
 
 @router.get("/urls-for-user-id-and-foldername-with-limits", response_model=List[FileMetadataOnURL])
-async def get_file_urls_by_user_id_and_folder_with_limits(user_id: str, folder: Optional[str] = None, limit: Optional[int] = None):
+async def get_file_urls_by_user_id_and_folder_with_limits(user_id: str, folder: Optional[str] = None, limit: Optional[int] = None, size: Optional[str] = None, image_format: str = "webp"):
     """
     Get file URLs for a specific user or all public files if user_id is not provided.
     Excludes private files unless the user is the owner.
+    `size` (thumb, small, large) returns image renditions in `image_format` (webp or jpeg) where they exist.
     """
     # Call the get_file_url function to retrieve the file URLs
-    files = await get_files_urls_by_user_folders(user_id=user_id, folder= folder, limit=limit)
+    files = await get_files_urls_by_user_folders(user_id=user_id, folder= folder, limit=limit, size=size, image_format=image_format)
     return files
 
 
@@ -65,18 +115,22 @@ async def get_file_urls_by_user_id_and_folder_with_limits(user_id: str, folder:
 async def get_latest_file(
     user_id: str,
     folder: Optional[str] = None, 
+    size: Optional[str] = None,
+    image_format: str = "webp",
 ):
     """
     API endpoint to get the latest file uploaded by the authenticated user.
     """
-    return await get_latest_file_by_user_folder(user_id=user_id, folder=folder)
+    return await get_latest_file_by_user_folder(user_id=user_id, folder=folder, size=size, image_format=image_format)
 
 @router.get("/files-project", response_model=Optional[FileMetadataOnURL])
 async def get_project_file(
     user_id: str,
     project_id: str, 
+    size: Optional[str] = None,
+    image_format: str = "webp",
 ):
     """
     API endpoint to get the project file uploaded by the authenticated user.
     """
-    return await get_file_by_project(user_id=user_id, project_id=project_id)
\ No newline at end of file
+    return await get_file_by_project(user_id=user_id, project_id=project_id, size=size, image_format=image_format)
\ No newline at end of file
@@ -67,4 +67,15 @@ async def get_ratings_by_level(user_Id: str, rating_level: int):
     ratings = await get_ratings_by_level_service(user_Id, rating_level)
     if "error" in ratings:
         raise HTTPException(status_code=400, detail=ratings["error"])
-    return ratings
\ No newline at end of file
+    return ratings
+
+
+@router.get("/summary/{user_Id}")
+async def get_rating_summary(user_Id: str):
+    """Count, sum, mean and per-level histogram of a user's ratings."""
+    return await get_rating_summary_service(user_Id)
+
+@router.post("/summary/rebuild")
+async def rebuild_rating_summaries():
+    """Recompute all rating summaries from the ratings collection."""
+    return await rebuild_rating_summaries_service()
@@ -4,7 +4,10 @@ import httpx
 import os
 from dotenv import load_dotenv
 from jose import jwt, JWTError
-import requests
+from services.auth0_identity import Auth0Identity
+from services.jwks import JWKSKeyStore
+from services.token_cache import verified_tokens
+import time
 
 # Load environment variables
 load_dotenv()
@@ -17,6 +20,11 @@ AUTH0_ALGORITHM = "RS256"
 
 router = APIRouter()
 
+# Parsed Auth0 signing keys, refreshed in the background (see main.py lifespan)
+jwks_store = JWKSKeyStore(f"https://{AUTH0_DOMAIN}/.well-known/jwks.json", AUTH0_ALGORITHM)
+# Management API token, pooled client and per-user role/name cache (closed in main.py lifespan)
+auth0_identity = Auth0Identity(AUTH0_DOMAIN, AUTH0_CLIENT_ID, AUTH0_CLIENT_SECRET)
+
 class RoleRequest(BaseModel):
     role: str  # User selects "model" or "business"
 
@@ -25,190 +33,95 @@ class TokenVerificationResponse(BaseModel):
     user_id: str = None
 
 async def get_auth0_token():
-    """Fetch an Auth0 Management API token."""
-    url = f"https://{AUTH0_DOMAIN}/oauth/token"
-    payload = {
-        "client_id": AUTH0_CLIENT_ID,
-        "client_secret": AUTH0_CLIENT_SECRET,
-        "audience": f"https://{AUTH0_DOMAIN}/api/v2/",
-        "grant_type": "client_credentials"
-    }
-
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=payload)
-        if response.status_code != 200:
-            raise HTTPException(status_code=500, detail=f"Failed to get Auth0 token: {response.text}")
-        return response.json()["access_token"]
-
-def get_auth0_public_key():
-    """Fetch the public key from Auth0's JWKS for token verification."""
+    """Auth0 Management API token, reused until shortly before it expires."""
+    return await auth0_identity.management_token()
+
+async def get_auth0_public_key(kid: str):
+    """Look up the Auth0 signing key for `kid` in the JWKS cache (None if Auth0 has no such key)."""
     try:
-        jwks_url = f"https://{AUTH0_DOMAIN}/.well-known/jwks.json"
-        jwks = requests.get(jwks_url).json()
-        return jwks
-    except requests.RequestException:
+        return await jwks_store.get_key(kid)
+    except (httpx.HTTPError, ValueError):
         raise HTTPException(status_code=500, detail="Could not fetch JWKS keys from Auth0")
+
+async def _decode_verified(token: str) -> dict:
+    """Verify the token's signature, audience and issuer and return its claims.
+    Tokens verified before are answered from the verified-token cache until they expire."""
+    cached_claims = verified_tokens.get(token)
+    if cached_claims is not None:
+        return cached_claims
+
+    unverified_header = jwt.get_unverified_header(token)
+    rsa_key = await get_auth0_public_key(unverified_header.get("kid"))
+    if rsa_key is None:
+        raise HTTPException(status_code=401, detail="Invalid token: Key not found")
+
+    # Verify token using the public key
+    started = time.process_time()
+    payload = jwt.decode(
+        token, rsa_key, algorithms=[AUTH0_ALGORITHM],
+        audience=AUTH0_AUDIENCE, issuer=f"https://{AUTH0_DOMAIN}/"
+    )
+    verified_tokens.put(token, payload, time.process_time() - started)
+    return payload
     
-async def get_user_role(user_id: str, token: str):
-    """Fetch the user's role from Auth0."""
-    url = f"https://{AUTH0_DOMAIN}/api/v2/users/{user_id}"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, headers=headers)
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail=response.json())
-        user_data = response.json()
-        return user_data.get("app_metadata", {}).get("role", None)
+async def get_user_role(user_id: str):
+    """Fetch the user's role from Auth0 (cached per user)."""
+    profile = await auth0_identity.get_profile(user_id)
+    return profile["role"]
     
-async def get_userName(user_id: str, token: str):
-    """Fetch the user's name from Auth0."""
-    url = f"https://{AUTH0_DOMAIN}/api/v2/users/{user_id}"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, headers=headers)
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail=response.json())
-        user_data = response.json()
-        print("Name : " + user_data.get("name"))  # Debugging step
-        print(user_data)
-        return user_data.get("name")
-
-
-def get_payload_from_token(authorization: str = Header(None)):  # Not Used
+async def get_userName(user_id: str):
+    """Fetch the user's name from Auth0 (cached per user)."""
+    profile = await auth0_identity.get_profile(user_id)
+    print("Name : " + str(profile["name"]))  # Debugging step
+    return profile["name"]
+
+
+async def get_payload_from_token(authorization: str = Header(None)):  # Not Used
     if authorization is None or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or malformed token")
     
     token = authorization.split(" ")[1]  # Extract JWT
-    print("Received Token:", token)  # Debugging step
 
     try:
-        jwks = get_auth0_public_key()
-        unverified_header = jwt.get_unverified_header(token)
-        print("JWT Header:", unverified_header)  # Debugging step
-
-        rsa_key = {}
-
-        for key in jwks["keys"]:
-            if key["kid"] == unverified_header["kid"]:
-                rsa_key = {
-                    "kty": key["kty"],
-                    "kid": key["kid"],
-                    "use": key["use"],
-                    "n": key["n"],
-                    "e": key["e"],
-                }
-                break
-        
-        if not rsa_key:
-            raise HTTPException(status_code=401, detail="Invalid token: Key not found")
-
-        unverified_payload = jwt.get_unverified_claims(token)
-        print("Token Payload:", unverified_payload)
-
-        # Verify token using the public key
-        payload = jwt.decode(
-            token, rsa_key, algorithms=[AUTH0_ALGORITHM], 
-            audience=AUTH0_AUDIENCE, issuer=f"https://{AUTH0_DOMAIN}/"
-        )
+        payload = await _decode_verified(token)
         return payload
     
     except JWTError as e:
         raise HTTPException(status_code=401, detail=f"Invalid or expired token: {str(e)}")
 
-def get_user_id_from_token(authorization: str = Header(None)):
+async def get_user_id_from_token(authorization: str = Header(None)):
     """Extract and verify user ID from JWT token using Auth0's public key."""
-    print(f"Authorization Header: {authorization}")  # Debugging line
-
     if authorization is None or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or malformed token")
     
     token = authorization.split(" ")[1]  # Extract JWT
-    print("Received Token:", token)  # Debugging step
 
     try:
-        jwks = get_auth0_public_key()
-        unverified_header = jwt.get_unverified_header(token)
-        print("JWT Header:", unverified_header)  # Debugging step
-
-        rsa_key = {}
-
-        for key in jwks["keys"]:
-            if key["kid"] == unverified_header["kid"]:
-                rsa_key = {
-                    "kty": key["kty"],
-                    "kid": key["kid"],
-                    "use": key["use"],
-                    "n": key["n"],
-                    "e": key["e"],
-                }
-                break
-        
-        if not rsa_key:
-            raise HTTPException(status_code=401, detail="Invalid token: Key not found")
-
-        unverified_payload = jwt.get_unverified_claims(token)
-        print("Token Payload:", unverified_payload)
-
-        # Verify token using the public key
-        payload = jwt.decode(
-            token, rsa_key, algorithms=[AUTH0_ALGORITHM], 
-            audience=AUTH0_AUDIENCE, issuer=f"https://{AUTH0_DOMAIN}/"
-        )
+        payload = await _decode_verified(token)
 
         return payload.get("sub")  # "sub" contains Auth0 user ID
 
     except JWTError as e:
         raise HTTPException(status_code=401, detail=f"Invalid or expired token: {str(e)}")
 
-def get_username_from_token(authorization: str = Header(None)): # Not Used
+async def get_username_from_token(authorization: str = Header(None)): # Not Used
     """Extract and verify username from JWT token using Auth0's public key."""
-    payload = get_payload_from_token(authorization)
+    payload = await get_payload_from_token(authorization)
     print("Name : " + payload.get("name"))  # Debugging step
     return payload.get("name")
 
-def get_user_id_from_cookie(request: Request):
+async def get_user_id_from_cookie(request: Request):
     """Extract and verify user ID from JWT token using Auth0's public key."""
     
     # Extract the access token from cookies
     access_token = request.cookies.get("access_token")
-    print("Received Token:", access_token)  # Debugging step
 
     if not access_token:
         raise HTTPException(status_code=401, detail="Token not found in cookies")
 
     try:
-        # Fetch Auth0 public keys
-        jwks = get_auth0_public_key()
-        unverified_header = jwt.get_unverified_header(access_token)
-
-        rsa_key = {}
-        for key in jwks["keys"]:
-            if key["kid"] == unverified_header["kid"]:
-                rsa_key = {
-                    "kty": key["kty"],
-                    "kid": key["kid"],
-                    "use": key["use"],
-                    "n": key["n"],
-                    "e": key["e"],
-                }
-                break
-        
-        if not rsa_key:
-            raise HTTPException(status_code=401, detail="Invalid token: Key not found")
-
-        # Verify the token
-        payload = jwt.decode(
-            access_token, rsa_key, algorithms=[AUTH0_ALGORITHM], 
-            audience=AUTH0_AUDIENCE, issuer=f"https://{AUTH0_DOMAIN}/"
-        )
+        # Verify the token against the cached Auth0 public keys
+        payload = await _decode_verified(access_token)
 
         return payload.get("sub")  # "sub" contains Auth0 user ID
 
@@ -219,57 +132,52 @@ def get_user_id_from_cookie(request: Request):
 async def verify_token(authorization: str = Header(None)):
     """Verify if the token is valid and return the user ID."""
     try:
-        user_id = get_user_id_from_token(authorization)
+        user_id = await get_user_id_from_token(authorization)
         return TokenVerificationResponse(is_valid=True, user_id=user_id)
     except HTTPException:
         # Return a 200 response with is_valid=False instead of raising an exception
         return TokenVerificationResponse(is_valid=False)
     
+@router.get("/token-cache/stats")
+async def get_token_cache_stats():
+    """Hit rate and CPU time saved by the verified-token cache."""
+    return verified_tokens.stats()
+
+@router.get("/identity-cache/stats")
+async def get_identity_cache_stats():
+    """Hit rate of the per-user Auth0 identity cache and management token reuse."""
+    return auth0_identity.stats()
+
 @router.post("/select-role")
 async def select_role(
     request: RoleRequest,
-    user_id: str = Depends(get_user_id_from_token),
-    token: str = Depends(get_auth0_token)
+    user_id: str = Depends(get_user_id_from_token)
 ):
     """Assign a role ('model' or 'business') to a user in Auth0."""
     print(f"User ID: {user_id}, Role: {request.role}")
-    print(f"Token: {token}")
     valid_roles = ["model", "business"]
     if request.role not in valid_roles:
         raise HTTPException(status_code=400, detail="Invalid role selected")
 
-    url = f"https://{AUTH0_DOMAIN}/api/v2/users/{user_id}"
-
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-
-    payload = {"app_metadata": {"role": request.role}}
-
-    async with httpx.AsyncClient() as client:
-        response = await client.patch(url, headers=headers, json=payload)
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail=response.json())
+    # Written through to the identity cache, so the next role check needs no Auth0 call
+    await auth0_identity.set_role(user_id, request.role)
 
     return {"message": f"Role '{request.role}' assigned successfully"}
 
 @router.get("/user-role")
 async def fetch_user_role(
-    user_id: str = Depends(get_user_id_from_token),
-    token: str = Depends(get_auth0_token)
+    user_id: str = Depends(get_user_id_from_token)
 ):
     """Fetch the role of the authenticated user."""
-    role = await get_user_role(user_id, token)
+    role = await get_user_role(user_id)
     return {"user_id": user_id, "role": role}
 
 @router.get("/user-name")
 async def fetch_user_role(
-    user_id: str = Depends(get_user_id_from_token),
-    token: str = Depends(get_auth0_token)
+    user_id: str = Depends(get_user_id_from_token)
 ):
     """Fetch the role of the authenticated user."""
-    userName = await get_userName(user_id, token)
+    userName = await get_userName(user_id)
     return {"user_id": user_id, "userName": userName}
 
 @router.get("/user-role-cookie")
@@ -277,46 +185,26 @@ async def fetch_user_role_cookie(
     token: str = Cookie(None)  # Read access token from HttpOnly cookie
 ):
     """Fetch the role of the authenticated user."""
-    print("Received Token:", token)
     if not token:
         raise HTTPException(status_code=401, detail="Unauthorized: No token found")
     
-    user_id = get_user_id_from_token(token)
-    role = await get_user_role(user_id, token)
+    user_id = await get_user_id_from_token(token)
+    role = await get_user_role(user_id)
     
     return {"user_id": user_id, "role": role}
 
 @router.get("/user-details")
 async def fetch_user_details(
-    user_id: str = Depends(get_user_id_from_token),
-    token: str = Depends(get_auth0_token)
+    user_id: str = Depends(get_user_id_from_token)
 ):
     """Fetch the user_id, role, username, and email of the authenticated user."""
-    # Fetch the user's role from Auth0
-    role = await get_user_role(user_id, token)
-    
-    # Fetch the user's name from Auth0
-    # user_name = await get_userName(user_id, token)
-    
-    # Fetch the user's email from Auth0
-    url = f"https://{AUTH0_DOMAIN}/api/v2/users/{user_id}"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, headers=headers)
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail=response.json())
-        user_data = response.json()
-        email = user_data.get("email")
+    # Role and email come from the same cached Auth0 profile
+    profile = await auth0_identity.get_profile(user_id)
     
     # Return the user details including user_name
     return {
         "user_id": user_id,
-        "role": role,
-        # "user_name": user_name,  # Include the user name here
-        "email": email
-    }
-
+        "role": profile["role"],
+        # "user_name": profile["name"],  # Include the user name here
+        "email": profile["email"]
+    }
\ No newline at end of file
@@ -1,10 +1,10 @@
 from fastapi import FastAPI, Response
 from starlette.responses import RedirectResponse
-from routes.role_management import router as role_router
+from routes.role_management import router as role_router, auth0_identity
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import os
-import requests
 
 
 # Load environment variables
@@ -19,7 +19,12 @@ AUTH0_ALGORITHM = "RS256"
 
 print(f"Auth0 Domain: {AUTH0_DOMAIN}")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await auth0_identity.aclose()  # Shared Auth0 client used by /token and the role routes
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -47,17 +52,10 @@ def register():
     )
 
 @app.get("/token")
-def get_access_token(code: str, response: Response):
+async def get_access_token(code: str, response: Response):
     print(f"Received code: {code}")
-    payload = (
-        "grant_type=authorization_code"
-        f"&client_id={AUTH0_CLIENT_ID}"
-        f"&client_secret={AUTH0_CLIENT_SECRET}"
-        f"&code={code}"
-        f"&redirect_uri={REDIRECT_URI}"
-    )
-    headers = {"content-type": "application/x-www-form-urlencoded"}
-    response_data = requests.post(f"https://{AUTH0_DOMAIN}/oauth/token", data=payload, headers=headers)
+    # Pooled, time-limited and concurrency-capped; no threadpool worker is held while Auth0 answers
+    response_data = await auth0_identity.exchange_code(code, REDIRECT_URI)
     print(response_data)
     print(f"Response Text: {response_data.text}")
 
@@ -1,15 +1,20 @@
 from datetime import datetime, timezone
 from random import choice, randint, sample
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Response
+from typing import List, Optional
 from pydantic import BaseModel
 from pymongo import ReturnDocument
 from models.Modella_preference import BrandModelPreferenceFilterRequest, ModelBrandPreferenceData, ModelBrandPreferenceFilterRequest, ModelProjectPreferenceData, BrandModelPreferenceData, ModelProjectPreferenceFilterRequest
-from models.Modella_tag import CreateRandomTagsRequest, ProjectTagFilterRequest
-from services.Modellatag_service import filter_modelproject_tags
+from models.Modella_tag import CreateRandomTagsRequest
+from services.Modellatag_service import sample_matching_project_ids, sample_model_tag_user_ids
 from services.keywords import get_keywords
-from services.model_convert import convert_model
-from services.rating_services import get_ratings_by_level_service
+from services.loaders import request_loaders
+from services.user_existence import user_is_registered
+from services.match_cache import BRANDS, MODELS, PROJECTS, canonical_signature, match_cache, project_predicate, query_predicate
+from services.match_scoring import model_scoring_engine
+from services.pagination import MAX_PAGE_SIZE, decode_cursor, encode_cursor, find_page, set_next_cursor
+from services.random_sampling import sample_documents, with_random_key, with_random_key_on_insert
+from services.rating_services import filter_user_ids_by_rating_level
 from services.validate_tag import validate_tag_data
 from config.setting import  user_collection, model_preferences_collection, brand_preferences_collection, model_brand_preferences_collection, model_tags_collection, brand_tags_collection
 
@@ -26,7 +31,7 @@ def serialize_document(doc):
 @router.post("/preferences/model/", response_model=ModelProjectPreferenceData)
 async def create_model_preference(preference: ModelProjectPreferenceData):
     # Check if user_Id exists in user_collection
-    user_exists = await user_collection.find_one({"user_Id": preference.user_Id})
+    user_exists = await user_is_registered(preference.user_Id)
     if not user_exists:
         raise HTTPException(status_code=400, detail="Invalid user_Id. User does not exist.")
     
@@ -34,13 +39,13 @@ async def create_model_preference(preference: ModelProjectPreferenceData):
     if existing_preference:
         raise HTTPException(status_code=400, detail="Preference already exists for this user.")
     validate_tag_data(preference)
-    result = await model_preferences_collection.insert_one(preference.model_dump())
+    result = await model_preferences_collection.insert_one(with_random_key(preference.model_dump()))
     return {"id": str(result.inserted_id), **preference.model_dump()}
 
 @router.post("/preferences/brand/", response_model=BrandModelPreferenceData)
 async def create_brand_preference(preference: BrandModelPreferenceData):
     # Check if user_Id exists in user_collection
-    user_exists = await user_collection.find_one({"user_Id": preference.user_Id})
+    user_exists = await user_is_registered(preference.user_Id)
     if not user_exists:
         raise HTTPException(status_code=400, detail="Invalid user_Id. User does not exist.")
 
@@ -48,13 +53,13 @@ async def create_brand_preference(preference: BrandModelPreferenceData):
     if existing_preference:
         raise HTTPException(status_code=400, detail="Preference already exists for this user.")
     validate_tag_data(preference)
-    result = await brand_preferences_collection.insert_one(preference.model_dump())
+    result = await brand_preferences_collection.insert_one(with_random_key(preference.model_dump()))
     return {"id": str(result.inserted_id), **preference.model_dump()}
 
 @router.post("/preferences/model-brand/", response_model=ModelBrandPreferenceData)
 async def create_model_brand_preference(preference: ModelBrandPreferenceData):
     # Check if user_Id exists in user_collection
-    user_exists = await user_collection.find_one({"user_Id": preference.user_Id})
+    user_exists = await user_is_registered(preference.user_Id)
     if not user_exists:
         raise HTTPException(status_code=400, detail="Invalid user_Id. User does not exist.")
 
@@ -62,7 +67,7 @@ async def create_model_brand_preference(preference: ModelBrandPreferenceData):
     if existing_preference:
         raise HTTPException(status_code=400, detail="Preference already exists for this user.")
     validate_tag_data(preference)
-    result = await model_brand_preferences_collection.insert_one(preference.model_dump())
+    result = await model_brand_preferences_collection.insert_one(with_random_key(preference.model_dump()))
     return {"id": str(result.inserted_id), **preference.model_dump()}
 
 
@@ -70,7 +75,7 @@ async def create_model_brand_preference(preference: ModelBrandPreferenceData):
 @router.put("/preferences/upsert/model/", response_model=ModelProjectPreferenceData)
 async def upsert_model_preference(preference_data: ModelProjectPreferenceData):
     # Check if user_Id exists in user_collection
-    user_exists = await user_collection.find_one({"user_Id": preference_data.user_Id})
+    user_exists = await user_is_registered(preference_data.user_Id)
     if not user_exists:
         raise HTTPException(status_code=400, detail="Invalid user_Id. User does not exist.")
 
@@ -91,10 +96,11 @@ async def upsert_model_preference(preference_data: ModelProjectPreferenceData):
     # Upsert the preference
     updated_pref = await model_preferences_collection.find_one_and_update(
         {"user_Id": preference_data.user_Id},
-        {"$set": updated_pref_data},
+        with_random_key_on_insert({"$set": updated_pref_data}),
         upsert=True,
         return_document=ReturnDocument.AFTER
     )
+    match_cache.forget_user(PROJECTS, preference_data.user_Id)
 
     return ModelProjectPreferenceData(**updated_pref)
 
@@ -103,7 +109,7 @@ async def upsert_model_preference(preference_data: ModelProjectPreferenceData):
 @router.put("/preferences/upsert/brand/", response_model=BrandModelPreferenceData)
 async def upsert_brand_preference(preference_data: BrandModelPreferenceData):
     # Check if user_Id exists in user_collection
-    user_exists = await user_collection.find_one({"user_Id": preference_data.user_Id})
+    user_exists = await user_is_registered(preference_data.user_Id)
     if not user_exists:
         raise HTTPException(status_code=400, detail="Invalid user_Id. User does not exist.")
 
@@ -124,10 +130,11 @@ async def upsert_brand_preference(preference_data: BrandModelPreferenceData):
     # Upsert the preference
     updated_pref = await brand_preferences_collection.find_one_and_update(
         {"user_Id": preference_data.user_Id},
-        {"$set": updated_pref_data},
+        with_random_key_on_insert({"$set": updated_pref_data}),
         upsert=True,
         return_document=ReturnDocument.AFTER
     )
+    match_cache.forget_user(MODELS, preference_data.user_Id)
 
     return BrandModelPreferenceData(**updated_pref)
 
@@ -198,6 +205,7 @@ async def update_model_preference(user_id: str, preference_data : dict):
         return_document=ReturnDocument.AFTER
     )
     if updated_pref:
+        match_cache.forget_user(PROJECTS, user_id)
         return ModelProjectPreferenceData(**updated_pref)
     raise HTTPException(status_code=404, detail="Model preference not found")
 
@@ -219,6 +227,7 @@ async def update_brand_preference(user_id: str, preference_data : dict):
         return_document=ReturnDocument.AFTER
     )
     if updated_pref:
+        match_cache.forget_user(MODELS, user_id)
         return BrandModelPreferenceData(**updated_pref)
     raise HTTPException(status_code=404, detail="Brand preference not found")
 
@@ -241,6 +250,7 @@ async def update_model_brand_preference(user_id: str, preference_data : dict):
         return_document=ReturnDocument.AFTER
     )
     if updated_pref:
+        match_cache.forget_user(BRANDS, user_id)
         return ModelBrandPreferenceData(**updated_pref)
     raise HTTPException(status_code=404, detail="Model Brand preference not found")
 
@@ -254,6 +264,7 @@ async def delete_model_preference(user_id: str):
     result = await model_preferences_collection.delete_one({"user_Id": user_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Preference not found")
+    match_cache.forget_user(PROJECTS, user_id)
     return {"message": "Preference deleted successfully"}
 
 @router.delete("/preferences/brand/{user_id}")
@@ -261,6 +272,7 @@ async def delete_brand_preference(user_id: str):
     result = await brand_preferences_collection.delete_one({"user_Id": user_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Preference not found")
+    match_cache.forget_user(MODELS, user_id)
     return {"message": "Preference deleted successfully"}
 
 @router.delete("/preferences/model-brand/{user_id}")
@@ -268,6 +280,7 @@ async def delete_model_brand_preference(user_id: str):
     result = await model_brand_preferences_collection.delete_one({"user_Id": user_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Preference not found")
+    match_cache.forget_user(BRANDS, user_id)
     return {"message": "Preference deleted successfully"}
 
 
@@ -275,16 +288,19 @@ async def delete_model_brand_preference(user_id: str):
 @router.delete("/preferences/model-delete-all")
 async def delete_all_model_preferences():
     await model_preferences_collection.delete_many({})
+    match_cache.clear(PROJECTS)
     return {"message": "All model preferences deleted successfully"}
 
 @router.delete("/preferences/brand-delete-all")
 async def delete_all_brand_preferences():
     await brand_preferences_collection.delete_many({})
+    match_cache.clear(MODELS)
     return {"message": "All brand preferences deleted successfully"}
 
 @router.delete("/preferences/model-brand-delete-all")
 async def delete_all_model_brand_preferences():
     await model_brand_preferences_collection.delete_many({})
+    match_cache.clear(BRANDS)
     return {"message": "All brand preferences deleted successfully"}
 
 
@@ -294,38 +310,47 @@ async def delete_all_model_brand_preferences():
 #filter preference
 
 @router.post("/preferences/model-project/filter", response_model=List[ModelProjectPreferenceData])
-async def filter_model_project_pref(data: ModelProjectPreferenceFilterRequest):
+async def filter_model_project_pref(data: ModelProjectPreferenceFilterRequest, response: Response, page_size: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
     query = build_query(data)  # Construct the query based on the filter data
     print(f"Generated Query: {query}")
+
+    if page_size is not None:
+        # Opt-in keyset pagination: stable `_id` order, next cursor in the X-Next-Cursor header
+        matched_preferences, next_cursor = await find_page(model_preferences_collection, query, page_size, cursor)
+        set_next_cursor(response, next_cursor)
+        return [ModelProjectPreferenceData(**doc) for doc in matched_preferences]
     
-    matched_preferences = await model_preferences_collection.aggregate([
-        {"$match": query},  # Filter based on the query
-        {"$sample": {"size": 100}}  # Randomly select 100 documents
-    ]).to_list(length=None)
+    matched_preferences = await sample_documents(model_preferences_collection, query, 100)  # Seek a random pivot instead of $sample
     
     return [ModelProjectPreferenceData(**pref) for pref in matched_preferences]
 
 @router.post("/preferences/brand-model/filter", response_model=List[BrandModelPreferenceData])
-async def filter_brand_model_pref(data: BrandModelPreferenceFilterRequest):
+async def filter_brand_model_pref(data: BrandModelPreferenceFilterRequest, response: Response, page_size: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
     query = build_query(data)  # Construct the query based on the filter data
     print(f"Generated Query: {query}")
+
+    if page_size is not None:
+        # Opt-in keyset pagination: stable `_id` order, next cursor in the X-Next-Cursor header
+        matched_preferences, next_cursor = await find_page(brand_preferences_collection, query, page_size, cursor)
+        set_next_cursor(response, next_cursor)
+        return [BrandModelPreferenceData(**doc) for doc in matched_preferences]
     
-    matched_preferences = await brand_preferences_collection.aggregate([
-        {"$match": query},  # Filter based on the query
-        {"$sample": {"size": 100}}  # Randomly select 100 documents
-    ]).to_list(length=None)
+    matched_preferences = await sample_documents(brand_preferences_collection, query, 100)  # Seek a random pivot instead of $sample
     
     return [BrandModelPreferenceData(**pref) for pref in matched_preferences]
 
 @router.post("/preferences/model-brand/filter", response_model=List[ModelBrandPreferenceData])
-async def filter_model_brand_pref(data: ModelBrandPreferenceFilterRequest):
+async def filter_model_brand_pref(data: ModelBrandPreferenceFilterRequest, response: Response, page_size: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
     query = build_query(data)  # Construct the query based on the filter data
     print(f"Generated Query: {query}")
+
+    if page_size is not None:
+        # Opt-in keyset pagination: stable `_id` order, next cursor in the X-Next-Cursor header
+        matched_preferences, next_cursor = await find_page(model_brand_preferences_collection, query, page_size, cursor)
+        set_next_cursor(response, next_cursor)
+        return [ModelBrandPreferenceData(**doc) for doc in matched_preferences]
     
-    matched_preferences = await model_brand_preferences_collection.aggregate([
-        {"$match": query},  # Filter based on the query
-        {"$sample": {"size": 100}}  # Randomly select 100 documents
-    ]).to_list(length=None)
+    matched_preferences = await sample_documents(model_brand_preferences_collection, query, 100)  # Seek a random pivot instead of $sample
     
     return [ModelBrandPreferenceData(**pref) for pref in matched_preferences]
 
@@ -355,89 +380,125 @@ def build_query(data):
 @router.post("/Model-project-preference-matched-project-ids", response_model=List[str])
 async def filter_model_project_preference_matched_project_ids(data: ModelProjectPreferenceFilterRequest):
     """
-    Converts ModelProjectPreferenceFilterRequest to ProjectTagFilterRequest, 
-    sends it to the filtering API, and extracts project IDs from the response.
+    Matches projects whose requirements overlap ModelProjectPreferenceFilterRequest:
+    each preferred range must overlap the project's range and each list must share
+    a value with the project's. Fields a project leaves unset accept anything.
 
     :param data: ModelProjectPreferenceFilterRequest containing filter criteria
-    :return: List of user IDs from the matched ProjectTagData
+    :return: Up to 100 random matched project IDs
     """
-    # Convert ModelProjectPreferenceFilterRequest to ProjectTagFilterRequest
-    converted_data = convert_model(data, ProjectTagFilterRequest)
-
-    # Construct query from converted_data
-    query = await build_query_cross_filter(converted_data)
-    print(f"Generated Query: {query}")
-
-    # Convert database results into Pydantic models
-    project_tag_data_list = await filter_modelproject_tags(query)
-
-    # Extract user_Id from ProjectTagData objects
-    project_ids = [tag.project_Id for tag in project_tag_data_list]
-
-    return project_ids
+    # Preference ranges must overlap the project's ranges (interval index, or MongoDB while it loads)
+    return await sample_matching_project_ids(data.model_dump(exclude={"user_Id"}, exclude_none=True), 100)
 
 @router.post("/Model-project-preference-matched-project-ids-by-user-id/{user_id}", response_model=List[str])
 async def filter_model_project_preference_by_user_id(user_id: str):
     """
-    Fetches ModelProjectPreferenceData using user_id, converts it to ProjectTagFilterRequest, 
-    filters the matched projects, and returns the list of project IDs.
+    Fetches ModelProjectPreferenceData using user_id and matches projects whose
+    requirements overlap it, as in filter_model_project_preference_matched_project_ids.
 
     :param user_id: The ID of the user whose preferences are being used
     :return: List of matched project IDs
     """
+    cached = match_cache.lookup(PROJECTS, user_id)
+    if cached is not None:
+        return cached[0]
+    generation = match_cache.generation(PROJECTS)  # Before the preference read, so a concurrent write discards this result
+
     # Fetch model preferences
     preference = await get_model_preference(user_id)
     
-    #temporary feild removal.
-    # Convert ModelProjectPreferenceFilterRequest to ProjectTagFilterRequest
-    converted_data = convert_model(preference, ProjectTagFilterRequest,["saved_time", "client_Type", "user_Id", "is_project","shoe_Size","bust_chest","waist","hips","height"])
-
-    # Build the query
-    query = await build_query_cross_filter(converted_data)
-    print(f"Generated Query: {query}")
-
-    # Get matched project tags
-    project_tag_data_list = await filter_modelproject_tags(query)
-
-    # Extract project IDs
-    project_ids = [tag.project_Id for tag in project_tag_data_list]
+    # Preference ranges must overlap the project's ranges (interval index, or MongoDB while it loads)
+    preference_dict = preference.model_dump() if isinstance(preference, BaseModel) else preference
+    requirements = {k: v for k, v in preference_dict.items() if k not in {"saved_time", "client_Type", "user_Id", "is_project"}}
+    matched_project_ids = await sample_matching_project_ids(requirements, 100)
+    match_cache.store(PROJECTS, user_id, canonical_signature(requirements), project_predicate(requirements), matched_project_ids, generation=generation)
+    return matched_project_ids
+
+@router.post("/Model-tag-matched-project-ids/{user_id}", response_model=List[str])
+async def filter_projects_for_model_tag(user_id: str):
+    """
+    Matches projects against a model's own tag: each of the model's measurements
+    must fall inside the project's range, and the model's attributes must be
+    among the values the project asks for.
 
-    return project_ids
+    :param user_id: The model whose tag is matched
+    :return: List of matched project IDs
+    """
+    model_tag = await request_loaders().model_tags.load(user_id)
+    if not model_tag:
+        raise HTTPException(status_code=404, detail="Model tag not found")
+
+    return await sample_matching_project_ids({k: v for k, v in model_tag.items() if k != "_id"}, 100)
+
+def _check_ranked_paging(ranked: bool, page_size: Optional[int], cursor: Optional[str]):
+    """Paging only exists for ranked results; refuse it rather than silently answering with a random sample."""
+    if page_size is None and cursor is None:
+        return
+    if not ranked:
+        raise HTTPException(status_code=400, detail="page_size and cursor require ranked=true")
+    if page_size is None:
+        raise HTTPException(status_code=400, detail="cursor requires page_size")
+    if not model_scoring_engine.ready:
+        raise HTTPException(status_code=503, detail="Ranking is still loading, retry shortly", headers={"Retry-After": "5"})
+
+def _rank_models(preference: dict, response: Response, page_size: Optional[int], cursor: Optional[str]) -> Optional[List[str]]:
+    """Model user_Ids by match score, best first, or None while the scoring engine is still loading.
+    With `page_size` one page is returned and the (score, user_Id) cursor for the next goes in the response header."""
+    if not model_scoring_engine.ready:
+        return None
+
+    after = None
+    if cursor:
+        position = decode_cursor(cursor)
+        if not isinstance(position.get("score"), (int, float)) or not isinstance(position.get("id"), str):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        after = (position["score"], position["id"])
+
+    ranked_models = model_scoring_engine.rank(preference, page_size or 100, after)
+    if page_size is not None and len(ranked_models) == page_size:
+        last_user_id, last_score = ranked_models[-1]
+        set_next_cursor(response, encode_cursor({"score": last_score, "id": last_user_id}))
+    return [model_user_id for model_user_id, _ in ranked_models]
 
 @router.post("/brand-Model-preference-matched-ids", response_model=List[str])
-async def filter_brand_Model_preference_matched_user_ids(data: BrandModelPreferenceFilterRequest):
-    """Filter ModelTagData based on BrandModelPreferenceFilterRequest"""
-    query = await build_query_cross_filter(data)  # Convert preferences into query
-    print(f"Generated Query: {query}")  # Debugging
+async def filter_brand_Model_preference_matched_user_ids(data: BrandModelPreferenceFilterRequest, response: Response, ranked: bool = False, page_size: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    """Filter ModelTagData based on BrandModelPreferenceFilterRequest.
+    With `ranked=true` the 100 best-scoring models are returned instead, best first
+    (or pages of `page_size` through all of them, following the X-Next-Cursor header)."""
+    _check_ranked_paging(ranked, page_size, cursor)
+    matched_user_ids = _rank_models(data.model_dump(), response, page_size, cursor) if ranked else None
 
-    matched_tags = await model_tags_collection.aggregate([
-        {"$match": query},  # Filter based on query
-        {"$sample": {"size": 100}}  # Randomly select 100 models
-    ]).to_list(length=None)
+    if matched_user_ids is None:
+        query = await build_query_cross_filter(data)  # Convert preferences into query
+        print(f"Generated Query: {query}")  # Debugging
 
-    if not matched_tags:
+        # Randomly select 100 models (answered from the in-memory tag index when possible)
+        matched_user_ids = await sample_model_tag_user_ids(query, 100)
+
+    if not matched_user_ids:
             return []  # Return an empty list if no models match
 
         # If rating_level filtering is needed
     if data.rating_level is not None:
-        filtered_user_ids = []
-        for model in matched_tags:
-            user_id = model["user_Id"]
-            ratings = await get_ratings_by_level_service(user_id, data.rating_level)
-            
-            # If ratings exist, keep the user_id; otherwise, discard it
-            if isinstance(ratings, list) and len(ratings) > 0:
-                filtered_user_ids.append(user_id)
+        # Keep only users with at least one rating at this level (one query for the whole batch)
+        return await filter_user_ids_by_rating_level(matched_user_ids, data.rating_level)
 
-        return filtered_user_ids  # Return only user IDs
-
-    return [model["user_Id"] for model in matched_tags]  # Return user IDs if no rating filter
+    return matched_user_ids  # Return user IDs if no rating filter
 
 
 
 @router.post("/brand-Model-preference-matched-ids-by-user-id/{user_id}", response_model=List[str])
-async def filter_brand_Model_preference_by_user_id(user_id: str):
-    """Filter ModelTagData based on BrandModelPreferenceFilterRequest"""
+async def filter_brand_Model_preference_by_user_id(user_id: str, response: Response, ranked: bool = False, page_size: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    """Filter ModelTagData based on the brand's saved preference.
+    With `ranked=true` the 100 best-scoring models are returned instead, best first
+    (or pages of `page_size` through all of them, following the X-Next-Cursor header).
+    Unranked results are cached per preference until a matching model tag or the preference changes."""
+    _check_ranked_paging(ranked, page_size, cursor)
+    cached = match_cache.lookup(MODELS, user_id) if not ranked else None
+    if cached is not None:
+        return await _apply_rating_level(*cached)
+    generation = match_cache.generation(MODELS)
+
     # Fetch model preferences
     preference = await get_brand_preference(user_id)
     
@@ -451,31 +512,17 @@ async def filter_brand_Model_preference_by_user_id(user_id: str):
     excluded_fields = {"saved_time", "client_Type", "user_Id"}
     data = {k: v for k, v in preference_dict.items() if k not in excluded_fields}
 
-    query = await build_query_cross_filter(DictWrapper(data))  # Convert preferences into query
-    print(f"Generated Query: {query}")  # Debugging
+    matched_user_ids = _rank_models(data, response, page_size, cursor) if ranked else None
 
-    matched_tags = await model_tags_collection.aggregate([
-        {"$match": query},  # Filter based on query
-        {"$sample": {"size": 100}}  # Randomly select 100 models
-    ]).to_list(length=None)
+    if matched_user_ids is None:
+        query = await build_query_cross_filter(DictWrapper(data))  # Convert preferences into query
+        print(f"Generated Query: {query}")  # Debugging
 
-    if not matched_tags:
-            return []  # Return an empty list if no models match
+        # Randomly select 100 models (answered from the in-memory tag index when possible)
+        matched_user_ids = await sample_model_tag_user_ids(query, 100)
+        match_cache.store(MODELS, user_id, _filter_signature(data), query_predicate(query), matched_user_ids, data.get("rating_level"), generation=generation)
 
-    # If rating_level filtering is needed
-    if "rating_level" in data and data["rating_level"] is not None:
-        filtered_user_ids = []
-        for model in matched_tags:
-            user_id = model["user_Id"]
-            ratings = await get_ratings_by_level_service(user_id, data["rating_level"])
-            
-            # If ratings exist, keep the user_id; otherwise, discard it
-            if isinstance(ratings, list) and len(ratings) > 0:
-                filtered_user_ids.append(user_id)
-
-        return filtered_user_ids  # Return only user IDs
-
-    return [model["user_Id"] for model in matched_tags]  # Return user IDs if no rating filter
+    return await _apply_rating_level(matched_user_ids, data.get("rating_level"))
 
 
 
@@ -487,32 +534,26 @@ async def filter_Model_brand_preference_matched_user_ids(data: ModelBrandPrefere
     query = await build_query_cross_filter(data)  # Convert preferences into query
     print(f"Generated Query: {query}")  # Debugging
 
-    matched_tags = await brand_tags_collection.aggregate([
-        {"$match": query},  # Filter based on query
-        {"$sample": {"size": 100}}  # Randomly select 100 models
-    ]).to_list(length=None)
+    matched_tags = await sample_documents(brand_tags_collection, query, 100)  # Seek a random pivot instead of $sample
 
     if not matched_tags:
             return []  # Return an empty list if no models match
 
         # If rating_level filtering is needed
     if data.rating_level is not None:
-        filtered_user_ids = []
-        for brand in matched_tags:
-            user_id = brand["user_Id"]
-            ratings = await get_ratings_by_level_service(user_id, data.rating_level)
-            
-            # If ratings exist, keep the user_id; otherwise, discard it
-            if isinstance(ratings, list) and len(ratings) > 0:
-                filtered_user_ids.append(user_id)
-
-        return filtered_user_ids  # Return only user IDs
+        # Keep only users with at least one rating at this level (one query for the whole batch)
+        return await filter_user_ids_by_rating_level([brand["user_Id"] for brand in matched_tags], data.rating_level)
 
     return [brand["user_Id"] for brand in matched_tags]  # Return user IDs if no rating filter
 
 @router.post("/Model-brand-preference-matched-ids-by-user-id/{user_id}", response_model=List[str])
 async def filter_Model_brand_preference_by_user_id(user_id: str):
-    """Filter BrandTagData based on ModelBrandPreferenceFilterRequest"""
+    """Filter BrandTagData based on the model's saved brand preference (cached until a matching brand tag or the preference changes)"""
+    cached = match_cache.lookup(BRANDS, user_id)
+    if cached is not None:
+        return await _apply_rating_level(*cached)
+    generation = match_cache.generation(BRANDS)
+
     # Fetch model preferences
     preference = await get_model_brand_preference(user_id)
     
@@ -529,28 +570,28 @@ async def filter_Model_brand_preference_by_user_id(user_id: str):
     query = await build_query_cross_filter(DictWrapper(data))  # Convert preferences into query
     print(f"Generated Query: {query}")  # Debugging
 
-    matched_tags = await brand_tags_collection.aggregate([
-        {"$match": query},  # Filter based on query
-        {"$sample": {"size": 100}}  # Randomly select 100 models
-    ]).to_list(length=None)
+    matched_tags = await sample_documents(brand_tags_collection, query, 100)  # Seek a random pivot instead of $sample
+    matched_user_ids = [brand["user_Id"] for brand in matched_tags]
+    match_cache.store(BRANDS, user_id, _filter_signature(data), query_predicate(query), matched_user_ids, data.get("rating_level"), generation=generation)
 
-    if not matched_tags:
-            return []  # Return an empty list if no models match
+    return await _apply_rating_level(matched_user_ids, data.get("rating_level"))
 
-        # If rating_level filtering is needed
-    if "rating_level" in data and data["rating_level"] is not None:
-        filtered_user_ids = []
-        for model in matched_tags:
-            user_id = model["user_Id"]
-            ratings = await get_ratings_by_level_service(user_id, data["rating_level"])
-            
-            # If ratings exist, keep the user_id; otherwise, discard it
-            if isinstance(ratings, list) and len(ratings) > 0:
-                filtered_user_ids.append(user_id)
+def _filter_signature(data: dict) -> str:
+    """Signature of the tag filter a preference builds; rating_level is applied after the cache."""
+    return canonical_signature({k: v for k, v in data.items() if k != "rating_level"})
 
-        return filtered_user_ids  # Return only user IDs
+async def _apply_rating_level(matched_user_ids: List[str], rating_level: Optional[int]) -> List[str]:
+    """Keep only users with at least one rating at `rating_level` (one query for the whole batch), if set."""
+    if not matched_user_ids:
+        return []  # Return an empty list if no users match
+    if rating_level is not None:
+        return await filter_user_ids_by_rating_level(matched_user_ids, rating_level)
+    return matched_user_ids  # Return user IDs if no rating filter
 
-    return [model["user_Id"] for model in matched_tags]  # Return user IDs if no rating filter
+@router.get("/match-cache/stats")
+async def get_match_cache_stats():
+    """Hit/miss counters and size of the *-by-user-id match cache."""
+    return match_cache.stats()
 
 async def build_query_cross_filter(data):
     """Convert BrandModelPreferenceFilterRequest into a MongoDB query for ModelTagData filtering."""
@@ -679,7 +720,7 @@ async def create_random_pref(count: int, tag_type: str):
             if existing_tag:
                 continue  # Skip if user already has a tag
 
-            await collection.insert_one(tag.model_dump())  # Save the tag
+            await collection.insert_one(with_random_key(tag.model_dump()))  # Save the tag
             created_count += 1
         else:
             break  # Stop if no more user IDs available
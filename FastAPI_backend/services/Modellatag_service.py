@@ -1,22 +1,33 @@
 from datetime import datetime, timezone
+import logging
 from random import choice, randint, sample
 from bson import ObjectId
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
 from pymongo import ReturnDocument
 from typing import List, Optional
 from models.Modella_tag import BrandTagFilterRequest, CreateRandomTagsRequest, ModelTagData, BrandTagData, ModelTagFilterRequest, ProjectTagData, ProjectTagFilterRequest
 from config.setting import  user_collection, model_tags_collection, brand_tags_collection, project_tags_collection
 from services.keywords import get_keywords
+from services.loaders import request_loaders
+from services.user_existence import user_is_registered
+from services.tag_index import KEYWORD_FIELDS, NUMERIC_FIELDS, UnsupportedQuery, model_tag_index
+from services.interval_index import LIST_FIELDS, RANGE_FIELDS, build_interval_query, project_interval_index, split_requirements
+from services.match_cache import BRANDS, MODELS, PROJECTS, match_cache
+from services.match_scoring import model_scoring_engine
+from services.pagination import MAX_PAGE_SIZE, find_page, set_next_cursor
+from services.random_sampling import sample_documents, with_random_key, with_random_key_on_insert
 from services.validate_tag import validate_tag_data
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/ModellaTag", tags=["Modella Tag"])
 
 # Create Tags
 @router.post("/tags/models/", response_model=ModelTagData)
 async def create_model_tag(tag: ModelTagData):
     # Check if user_Id exists in user_collection
-    user_exists = await user_collection.find_one({"user_Id": tag.user_Id})
+    user_exists = await user_is_registered(tag.user_Id)
     if not user_exists:
         raise HTTPException(status_code=400, detail="Invalid user_Id. User does not exist.")
 
@@ -25,19 +36,22 @@ async def create_model_tag(tag: ModelTagData):
         raise HTTPException(status_code=400, detail="Tag for this user_Id already exists.")
         
     validate_tag_data(tag)
-    result = await model_tags_collection.insert_one(tag.model_dump())
+    result = await model_tags_collection.insert_one(with_random_key(tag.model_dump()))
     if result.inserted_id:
         # Retrieve the inserted document
         inserted_tag = await model_tags_collection.find_one({"_id": result.inserted_id})
         
         if inserted_tag:
+            model_tag_index.upsert(inserted_tag)
+            model_scoring_engine.upsert(inserted_tag)
+            match_cache.invalidate(MODELS, inserted_tag)
             return ModelTagData(**inserted_tag)
     raise HTTPException(status_code=500, detail="Failed to create model tag")
 
 @router.post("/tags/brands/", response_model=BrandTagData)
 async def create_brand_tag(tag: BrandTagData):
     # Check if user_Id exists in user_collection
-    user_exists = await user_collection.find_one({"user_Id": tag.user_Id})
+    user_exists = await user_is_registered(tag.user_Id)
     if not user_exists:
         raise HTTPException(status_code=400, detail="Invalid user_Id. User does not exist.")
 
@@ -46,12 +60,13 @@ async def create_brand_tag(tag: BrandTagData):
         raise HTTPException(status_code=400, detail="Tag for this user_Id already exists.")
     
     validate_tag_data(tag)
-    result = await brand_tags_collection.insert_one(tag.model_dump())
+    result = await brand_tags_collection.insert_one(with_random_key(tag.model_dump()))
     if result.inserted_id:
         # Retrieve the inserted document
         inserted_tag = await brand_tags_collection.find_one({"_id": result.inserted_id})
         
         if inserted_tag:
+            match_cache.invalidate(BRANDS, inserted_tag)
             return BrandTagData(**inserted_tag)
     raise HTTPException(status_code=500, detail="Failed to create brand tag")
 
@@ -64,17 +79,19 @@ async def create_project_tag(tag: ProjectTagData):
         raise HTTPException(status_code=400, detail="Project ID already exists")
 
     # Check if user_Id exists in user_collection
-    user_exists = await user_collection.find_one({"user_Id": tag.user_Id})
+    user_exists = await user_is_registered(tag.user_Id)
     if not user_exists:
         raise HTTPException(status_code=400, detail="Invalid user_Id. User does not exist.")
 
     validate_tag_data(tag)
-    result = await project_tags_collection.insert_one(tag.model_dump())
+    result = await project_tags_collection.insert_one(with_random_key(tag.model_dump()))
     if result.inserted_id:
         # Retrieve the inserted document
         inserted_tag = await project_tags_collection.find_one({"_id": result.inserted_id})
         
         if inserted_tag:
+            project_interval_index.upsert(inserted_tag)
+            match_cache.invalidate(PROJECTS, inserted_tag)
             return ProjectTagData(**inserted_tag)
     raise HTTPException(status_code=500, detail="Failed to create project tag")
 
@@ -82,7 +99,7 @@ async def create_project_tag(tag: ProjectTagData):
 @router.put("/tags/upsert/models/", response_model=ModelTagData)
 async def upsert_model_tag(tag_data: ModelTagData):
     # Check if user_Id exists in user_collection
-    user_exists = await user_collection.find_one({"user_Id": tag_data.user_Id})
+    user_exists = await user_is_registered(tag_data.user_Id)
     if not user_exists:
         raise HTTPException(status_code=400, detail="Invalid user_Id. User does not exist.")
 
@@ -103,10 +120,13 @@ async def upsert_model_tag(tag_data: ModelTagData):
     # Upsert the tag
     updated_tag = await model_tags_collection.find_one_and_update(
         {"user_Id": tag_data.user_Id},
-        {"$set": updated_tag_data},
+        with_random_key_on_insert({"$set": updated_tag_data}),
         upsert=True,
         return_document=ReturnDocument.AFTER
     )
+    model_tag_index.upsert(updated_tag)
+    model_scoring_engine.upsert(updated_tag)
+    match_cache.invalidate(MODELS, existing_tag, updated_tag)
 
     return ModelTagData(**updated_tag)
 
@@ -114,7 +134,7 @@ async def upsert_model_tag(tag_data: ModelTagData):
 @router.put("/tags/upsert/brands/", response_model=BrandTagData)
 async def upsert_brand_tag(tag_data: BrandTagData):
     # Check if user_Id exists in user_collection
-    user_exists = await user_collection.find_one({"user_Id": tag_data.user_Id})
+    user_exists = await user_is_registered(tag_data.user_Id)
     if not user_exists:
         raise HTTPException(status_code=400, detail="Invalid user_Id. User does not exist.")
 
@@ -135,10 +155,11 @@ async def upsert_brand_tag(tag_data: BrandTagData):
     # Upsert the tag
     updated_tag = await brand_tags_collection.find_one_and_update(
         {"user_Id": tag_data.user_Id},
-        {"$set": updated_tag_data},
+        with_random_key_on_insert({"$set": updated_tag_data}),
         upsert=True,
         return_document=ReturnDocument.AFTER
     )
+    match_cache.invalidate(BRANDS, existing_tag, updated_tag)
 
     return BrandTagData(**updated_tag)
 
@@ -147,14 +168,14 @@ async def upsert_brand_tag(tag_data: BrandTagData):
 # Get Tags
 @router.get("/tags/models/{user_id}", response_model=Optional[ModelTagData])
 async def get_model_tag(user_id: str):
-    tag = await model_tags_collection.find_one({"user_Id": user_id})
+    tag = await request_loaders().model_tags.load(user_id)  # Batched with the request's other tag lookups
     if tag:
         return ModelTagData(**tag)
     raise HTTPException(status_code=404, detail="Model tag not found")
 
 @router.get("/tags/brands/{user_id}", response_model=Optional[BrandTagData])
 async def get_brand_tag(user_id: str):
-    tag = await brand_tags_collection.find_one({"user_Id": user_id})
+    tag = await request_loaders().brand_tags.load(user_id)  # Batched with the request's other tag lookups
     if tag:
         return BrandTagData(**tag)
     raise HTTPException(status_code=404, detail="Brand tag not found")
@@ -200,6 +221,9 @@ async def update_model_tag(user_id: str, update_data: dict):
         return_document=ReturnDocument.AFTER
     )
     if updated_tag:
+        model_tag_index.upsert(updated_tag)
+        model_scoring_engine.upsert(updated_tag)
+        match_cache.invalidate(MODELS, existing_tag, updated_tag)
         return ModelTagData(**updated_tag)
     raise HTTPException(status_code=404, detail="Model tag not found")
 
@@ -222,6 +246,7 @@ async def update_brand_tag(user_id: str, update_data: dict):
         return_document=ReturnDocument.AFTER
     )
     if updated_tag:
+        match_cache.invalidate(BRANDS, existing_tag, updated_tag)
         return BrandTagData(**updated_tag)
     raise HTTPException(status_code=404, detail="Brand tag not found")
 
@@ -244,6 +269,8 @@ async def update_project_tag(user_id: str, project_id:str, update_data: dict):
         return_document=ReturnDocument.AFTER
     )
     if updated_tag:
+        project_interval_index.upsert(updated_tag)
+        match_cache.invalidate(PROJECTS, existing_tag, updated_tag)
         return ProjectTagData(**updated_tag)
     raise HTTPException(status_code=404, detail="Project tag not found")
 
@@ -254,22 +281,28 @@ async def update_project_tag(user_id: str, project_id:str, update_data: dict):
 # Delete Tags
 @router.delete("/tags/models/{user_id}")
 async def delete_model_tag(user_id: str):
-    result = await model_tags_collection.delete_one({"user_Id": user_id})
-    if result.deleted_count:
+    deleted_tag = await model_tags_collection.find_one_and_delete({"user_Id": user_id})
+    if deleted_tag:
+        model_tag_index.remove(user_id)
+        model_scoring_engine.remove(user_id)
+        match_cache.invalidate(MODELS, deleted_tag)
         return {"message": "Model tag deleted successfully"}
     raise HTTPException(status_code=404, detail="Model tag not found")
 
 @router.delete("/tags/brands/{user_id}")
 async def delete_brand_tag(user_id: str):
-    result = await brand_tags_collection.delete_one({"user_Id": user_id})
-    if result.deleted_count:
+    deleted_tag = await brand_tags_collection.find_one_and_delete({"user_Id": user_id})
+    if deleted_tag:
+        match_cache.invalidate(BRANDS, deleted_tag)
         return {"message": "Brand tag deleted successfully"}
     raise HTTPException(status_code=404, detail="Brand tag not found")
 
 @router.delete("/tags/projects/{user_id}/{project_id}")
 async def delete_project_tag(user_id: str,project_id: str):
-    result = await project_tags_collection.delete_one({"user_Id": user_id, "project_Id": project_id})
-    if result.deleted_count:
+    deleted_tag = await project_tags_collection.find_one_and_delete({"user_Id": user_id, "project_Id": project_id})
+    if deleted_tag:
+        project_interval_index.remove(project_id)
+        match_cache.invalidate(PROJECTS, deleted_tag)
         return {"message": "Project tag deleted successfully"}
     raise HTTPException(status_code=404, detail="Project tag not found")
 
@@ -304,49 +337,124 @@ async def list_project_tags():
 #Filter tags
 
 @router.post("/tags/models/filter", response_model=List[ModelTagData])
-async def filter_model_tags(data: ModelTagFilterRequest):
+async def filter_model_tags(data: ModelTagFilterRequest, response: Response, page_size: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
     query = build_query(data)  # Construct the query based on the filter data
     print(f"Generated Query: {query}")
-    
-    matched_tags = await model_tags_collection.aggregate([
-        {"$match": query},  # Filter based on the query
-        {"$sample": {"size": 100}}  # Randomly select 100 documents
-    ]).to_list(length=None)
+
+    if page_size is not None:
+        # Opt-in keyset pagination: stable `_id` order, next cursor in the X-Next-Cursor header
+        matched_tags, next_cursor = await find_page(model_tags_collection, query, page_size, cursor)
+        set_next_cursor(response, next_cursor)
+        return [ModelTagData(**doc) for doc in matched_tags]
+
+    user_ids = _sample_from_model_tag_index(query, 100)
+    if user_ids is not None:
+        # The index picked the sample, so only those documents are read
+        matched_tags = await model_tags_collection.find({"user_Id": {"$in": user_ids}}).to_list(length=None)
+    else:
+        matched_tags = await sample_documents(model_tags_collection, query, 100)  # Seek a random pivot instead of $sample
     
     return [ModelTagData(**tag) for tag in matched_tags]
 
 @router.post("/tags/brands/filter", response_model=List[BrandTagData])
-async def filter_brand_tags(data: BrandTagFilterRequest):
+async def filter_brand_tags(data: BrandTagFilterRequest, response: Response, page_size: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
     query = build_query(data)  # Construct the query based on the filter data
     print(f"Generated Query: {query}")
+
+    if page_size is not None:
+        # Opt-in keyset pagination: stable `_id` order, next cursor in the X-Next-Cursor header
+        matched_tags, next_cursor = await find_page(brand_tags_collection, query, page_size, cursor)
+        set_next_cursor(response, next_cursor)
+        return [BrandTagData(**doc) for doc in matched_tags]
     
-    matched_tags = await brand_tags_collection.aggregate([
-        {"$match": query},  # Filter based on the query
-        {"$sample": {"size": 100}}  # Randomly select 100 documents
-    ]).to_list(length=None)
+    matched_tags = await sample_documents(brand_tags_collection, query, 100)  # Seek a random pivot instead of $sample
     
     return [BrandTagData(**tag) for tag in matched_tags]
 
 @router.post("/tags/projects/filter", response_model=List[ProjectTagData])
-async def filter_project_tags(data: ProjectTagFilterRequest):
+async def filter_project_tags(data: ProjectTagFilterRequest, response: Response, page_size: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
     query = build_query(data)  # Construct the query based on the filter data
     print(f"Generated Query: {query}")
+
+    if page_size is not None:
+        # Opt-in keyset pagination: stable `_id` order, next cursor in the X-Next-Cursor header
+        matched_tags, next_cursor = await find_page(project_tags_collection, query, page_size, cursor)
+        set_next_cursor(response, next_cursor)
+        return [ProjectTagData(**doc) for doc in matched_tags]
     
-    matched_tags = await project_tags_collection.aggregate([
-        {"$match": query},  # Filter based on the query
-        {"$sample": {"size": 100}}  # Randomly select 100 documents
-    ]).to_list(length=None)
+    matched_tags = await sample_documents(project_tags_collection, query, 100)  # Seek a random pivot instead of $sample
     
     return [ProjectTagData(**tag) for tag in matched_tags]
 
+def _sample_from_model_tag_index(query: dict, size: int) -> Optional[List[str]]:
+    """Answer a models_tags filter from the in-memory index, or None if MongoDB must be used."""
+    if not model_tag_index.ready:
+        return None
+    try:
+        return model_tag_index.sample_user_ids(query, size)
+    except UnsupportedQuery:
+        return None  # Field or operator the index does not cover
+
+async def sample_model_tag_user_ids(query: dict, size: int = 100) -> List[str]:
+    """Return up to `size` random user_Ids from models_tags matching `query`."""
+    user_ids = _sample_from_model_tag_index(query, size)
+    if user_ids is not None:
+        return user_ids
+
+    matched_tags = await sample_documents(model_tags_collection, query, size, {"_id": 0, "user_Id": 1})
+    return [tag["user_Id"] for tag in matched_tags]
+
+async def match_model_tag_user_ids(query: dict) -> List[str]:
+    """Return every user_Id in models_tags matching `query`."""
+    if model_tag_index.ready:
+        try:
+            return [model_tag_index.user_ids[doc_id] for doc_id in model_tag_index.match(query)]
+        except UnsupportedQuery:
+            pass
+
+    matched_tags = await model_tags_collection.find(query, {"_id": 0, "user_Id": 1}).to_list(length=None)
+    return [tag["user_Id"] for tag in matched_tags]
+
+async def load_model_tag_index():
+    """Build the in-memory model tag index and scoring engine from models_tags."""
+    projection = {"_id": 0, "user_Id": 1, **{field: 1 for field in (*KEYWORD_FIELDS, *NUMERIC_FIELDS)}}
+    try:
+        await model_tag_index.rebuild_async(model_tags_collection.find({}, projection))
+    except Exception as e:
+        logger.error(f"Error building model tag index: {str(e)}")
+    try:
+        await model_scoring_engine.rebuild_async(model_tags_collection.find({}, projection))
+    except Exception as e:
+        logger.error(f"Error building model scoring engine: {str(e)}")
+
+async def sample_matching_project_ids(requirements: dict, size: int = 100) -> List[str]:
+    """
+    Return up to `size` random project_Ids whose requirements fit `requirements`.
+
+    Ranges in `requirements` (a preference's tuples, or a model's single values)
+    must overlap the project's range; list fields must share at least one value.
+    Fields a project leaves unset accept anything.
+    """
+    ranges, keywords = split_requirements(requirements)
+    if project_interval_index.ready:
+        return project_interval_index.sample(ranges, keywords, size)
+
+    matched_tags = await sample_documents(project_tags_collection, build_interval_query(ranges, keywords), size, {"_id": 0, "project_Id": 1})
+    return [tag["project_Id"] for tag in matched_tags if tag.get("project_Id")]
+
+async def load_project_interval_index():
+    """Build the in-memory project interval index from projects_tags."""
+    projection = {"_id": 0, "project_Id": 1, **{field: 1 for field in (*RANGE_FIELDS, *LIST_FIELDS)}}
+    try:
+        await project_interval_index.rebuild_async(project_tags_collection.find({}, projection))
+    except Exception as e:
+        logger.error(f"Error building project interval index: {str(e)}")
+
 async def filter_modelproject_tags(data):
     # query = build_query(data)  # Construct the query based on the filter data
     print(f"Generated Query: {data}")
     
-    matched_tags = await project_tags_collection.aggregate([
-        {"$match": data},  # Filter based on the query
-        {"$sample": {"size": 100}}  # Randomly select 100 documents
-    ]).to_list(length=None)
+    matched_tags = await sample_documents(project_tags_collection, data, 100)  # Seek a random pivot instead of $sample
     
     return [ProjectTagData(**tag) for tag in matched_tags]
 
@@ -378,18 +486,24 @@ def build_query(data):
 async def delete_all_ModelTags_service():
     """Deletes all tags from model_tags_collection."""
     result = await model_tags_collection.delete_many({})
+    model_tag_index.clear()
+    model_scoring_engine.clear()
+    match_cache.clear(MODELS)
     return {"message": f"Deleted {result.deleted_count} tags successfully."}
 
 @router.delete("/tags/delete-all-BrandTag")
 async def delete_all_brandTags_service():
     """Deletes all tags from model_tags_collection."""
     result = await brand_tags_collection.delete_many({})
+    match_cache.clear(BRANDS)
     return {"message": f"Deleted {result.deleted_count} tags successfully."}
 
 @router.delete("/tags/delete-all-ProjectTag")
 async def delete_all_projectTags_service():
     """Deletes all tags from model_tags_collection."""
     result = await project_tags_collection.delete_many({})
+    project_interval_index.clear()
+    match_cache.clear(PROJECTS)
     return {"message": f"Deleted {result.deleted_count} tags successfully."}
 
 
@@ -509,7 +623,17 @@ async def create_random_tags(count: int, tag_type: str):
             if existing_tag:
                 continue  # Skip if user already has a tag
 
-            await collection.insert_one(tag.model_dump())  # Save the tag
+            tag_doc = tag.model_dump()
+            await collection.insert_one(with_random_key(tag_doc))  # Save the tag
+            if tag_type == "Model":
+                model_tag_index.upsert(tag_doc)
+                model_scoring_engine.upsert(tag_doc)
+                match_cache.invalidate(MODELS, tag_doc)
+            elif tag_type == "Project":
+                project_interval_index.upsert(tag_doc)
+                match_cache.invalidate(PROJECTS, tag_doc)
+            else:
+                match_cache.invalidate(BRANDS, tag_doc)
             created_count += 1
         else:
             break  # Stop if no more user IDs available
@@ -0,0 +1,203 @@
+import asyncio
+import importlib.util
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+from cachetools import TTLCache
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+TOKEN_EXPIRY_MARGIN_SECONDS = 5 * 60  # Fetch a new management token this long before the old one expires
+PROFILE_TTL_SECONDS = 10 * 60  # Bounds staleness for changes made outside this API (e.g. the Auth0 dashboard)
+PROFILE_CACHE_SIZE = 50_000
+HTTP_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+HTTP_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60)
+HTTP2 = importlib.util.find_spec("h2") is not None  # httpx only negotiates HTTP/2 with the h2 package installed
+MAX_CONCURRENT_CODE_EXCHANGES = 20  # Login code exchanges in flight to Auth0 at once
+CODE_EXCHANGE_QUEUE_SECONDS = 10  # How long a login waits for a slot before getting a 503
+
+
+def _profile(user_data: dict) -> Dict[str, Any]:
+    """The fields the API serves from an Auth0 user document."""
+    return {
+        "role": (user_data.get("app_metadata") or {}).get("role"),
+        "name": user_data.get("name"),
+        "email": user_data.get("email"),
+    }
+
+
+def _error_detail(response: httpx.Response):
+    try:
+        return response.json()
+    except ValueError:
+        return response.text
+
+
+class Auth0Identity:
+    """
+    Auth0 Management API access with the expensive parts cached.
+
+    One pooled AsyncClient is kept for the app's lifetime. The client-credentials
+    token is reused until shortly before it expires, with concurrent callers
+    sharing a single exchange. Each user's role, name and email are cached;
+    role changes made through `set_role` are written through, so role checks
+    are answered from memory in the steady state. Login code exchanges use the
+    same client and are capped so a login storm queues instead of piling up.
+    """
+
+    def __init__(self, domain: str, client_id: str, client_secret: str,
+                 base_url: Optional[str] = None, client: Optional[httpx.AsyncClient] = None,
+                 max_code_exchanges: int = MAX_CONCURRENT_CODE_EXCHANGES):
+        self.domain = domain
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.base_url = base_url or f"https://{domain}"
+        self.profiles = TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_TTL_SECONDS)
+        self.token_fetches = 0
+        self.profile_fetches = 0
+        self.profile_hits = 0
+        self.code_exchanges = 0
+        self.code_exchanges_rejected = 0
+        self._code_exchange_slots = asyncio.Semaphore(max_code_exchanges)
+        self._client = client
+        self._token: Optional[str] = None
+        self._token_expires_at = 0.0  # time.monotonic()
+        self._token_inflight: Optional[asyncio.Future] = None
+        self._profile_inflight: Dict[str, asyncio.Future] = {}
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS, http2=HTTP2)
+        return self._client
+
+    async def _send(self, method: str, url: str, **kwargs) -> httpx.Response:
+        try:
+            return await self._http().request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            logger.error(f"Auth0 request failed: {str(e)}")
+            raise HTTPException(status_code=502, detail="Could not reach Auth0")
+
+    async def _fetch_token(self) -> str:
+        self.token_fetches += 1
+        payload = {
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "audience": f"https://{self.domain}/api/v2/",
+            "grant_type": "client_credentials"
+        }
+        response = await self._send("POST", f"{self.base_url}/oauth/token", json=payload)
+        if response.status_code != 200:
+            raise HTTPException(status_code=500, detail=f"Failed to get Auth0 token: {response.text}")
+
+        data = response.json()
+        expires_in = float(data.get("expires_in", 0))
+        self._token = data["access_token"]
+        self._token_expires_at = time.monotonic() + expires_in - min(TOKEN_EXPIRY_MARGIN_SECONDS, expires_in / 2)
+        logger.info(f"Fetched Auth0 Management API token (expires in {int(expires_in)}s)")
+        return self._token
+
+    async def management_token(self) -> str:
+        """A Management API token, reused until shortly before it expires."""
+        if self._token is not None and time.monotonic() < self._token_expires_at:
+            return self._token
+        if self._token_inflight is None or self._token_inflight.done():
+            self._token_inflight = asyncio.ensure_future(self._fetch_token())
+        return await asyncio.shield(self._token_inflight)
+
+    async def exchange_code(self, code: str, redirect_uri: str) -> httpx.Response:
+        """Exchange a login authorization code for the user's tokens."""
+        payload = {
+            "grant_type": "authorization_code",
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "code": code,
+            "redirect_uri": redirect_uri
+        }
+        try:
+            await asyncio.wait_for(self._code_exchange_slots.acquire(), CODE_EXCHANGE_QUEUE_SECONDS)
+        except asyncio.TimeoutError:
+            self.code_exchanges_rejected += 1
+            raise HTTPException(status_code=503, detail="Too many logins in progress, please retry")
+        try:
+            self.code_exchanges += 1
+            return await self._send("POST", f"{self.base_url}/oauth/token", data=payload)
+        finally:
+            self._code_exchange_slots.release()
+
+    async def _management_request(self, method: str, user_id: str, **kwargs) -> dict:
+        """Call /api/v2/users/{user_id}, fetching a new token once if Auth0 rejects the cached one."""
+        url = f"{self.base_url}/api/v2/users/{user_id}"
+        for attempt in range(2):
+            headers = {
+                "Authorization": f"Bearer {await self.management_token()}",
+                "Content-Type": "application/json"
+            }
+            response = await self._send(method, url, headers=headers, **kwargs)
+            if response.status_code == 401 and attempt == 0:
+                self._token = None  # Revoked or rotated before its expiry
+                continue
+            if response.status_code != 200:
+                raise HTTPException(status_code=response.status_code, detail=_error_detail(response))
+            return response.json()
+
+    async def _fetch_profile(self, user_id: str) -> Dict[str, Any]:
+        self.profile_fetches += 1
+        return _profile(await self._management_request("GET", user_id))
+
+    def _profile_fetched(self, user_id: str, future: asyncio.Future):
+        # A fetch overtaken by set_role is no longer registered and must not overwrite its write-through
+        if self._profile_inflight.get(user_id) is not future:
+            return
+        del self._profile_inflight[user_id]
+        if not future.cancelled() and future.exception() is None:
+            self.profiles[user_id] = future.result()
+
+    async def get_profile(self, user_id: str) -> Dict[str, Any]:
+        """The user's role, name and email; concurrent misses for one user share a fetch."""
+        profile = self.profiles.get(user_id)
+        if profile is not None:
+            self.profile_hits += 1
+            return dict(profile)
+
+        inflight = self._profile_inflight.get(user_id)
+        if inflight is None or inflight.done():
+            inflight = asyncio.ensure_future(self._fetch_profile(user_id))
+            self._profile_inflight[user_id] = inflight
+            inflight.add_done_callback(lambda future: self._profile_fetched(user_id, future))
+        return dict(await asyncio.shield(inflight))
+
+    async def set_role(self, user_id: str, role: str):
+        """Assign the role in Auth0 and write it through to the cache."""
+        user_data = await self._management_request("PATCH", user_id, json={"app_metadata": {"role": role}})
+        self._profile_inflight.pop(user_id, None)
+        self.profiles[user_id] = {**_profile(user_data), "role": role}
+
+    def forget(self, user_id: Optional[str] = None):
+        if user_id is None:
+            self.profiles.clear()
+            self._profile_inflight.clear()
+        else:
+            self.profiles.pop(user_id, None)
+            self._profile_inflight.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.profile_hits + self.profile_fetches
+        return {
+            "cached_profiles": len(self.profiles),
+            "profile_hits": self.profile_hits,
+            "profile_fetches": self.profile_fetches,
+            "hit_rate": self.profile_hits / lookups if lookups else 0.0,
+            "token_fetches": self.token_fetches,
+            "token_valid_for": max(self._token_expires_at - time.monotonic(), 0) if self._token else 0,
+            "code_exchanges": self.code_exchanges,
+            "code_exchanges_rejected": self.code_exchanges_rejected,
+            "http2": HTTP2,
+        }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,85 @@
+"""
+Content-addressed S3 objects shared by identical uploads.
+
+file_objects maps a SHA-256 to one S3 object and counts the file records
+pointing at it. A duplicate upload only bumps the count; an object is
+deleted when its last reference goes. A count at zero is never revived
+into a deleted object: release only deletes the mapping while it is still
+at zero, and a re-upload after that stores a fresh object under a new key.
+"""
+
+import hashlib
+import logging
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from pymongo import ReturnDocument
+
+from config.setting import AWS_BUCKET_NAME, file_objects_collection
+from services.storage import CHUNK_SIZE, UploadTooLarge, object_store
+
+logger = logging.getLogger(__name__)
+
+
+def object_key(file_id: str) -> str:
+    """Key for a new object (one per first upload, so a re-upload never collides with a delete in progress)."""
+    return f"objects/{file_id}"
+
+
+async def hash_upload(file, max_size: int) -> Tuple[str, int]:
+    """SHA-256 and size of an UploadFile, read one chunk at a time; rewinds it for the upload."""
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := await file.read(CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_size:
+            raise UploadTooLarge(size)
+        digest.update(chunk)
+    await file.seek(0)
+    return digest.hexdigest(), size
+
+
+async def acquire(sha256: str) -> Optional[str]:
+    """Add a reference to stored content; returns its object key, or None if it is not stored yet."""
+    existing = await file_objects_collection.find_one_and_update(
+        {"sha256": sha256}, {"$inc": {"ref_count": 1}}, return_document=ReturnDocument.AFTER
+    )
+    return existing["object_key"] if existing else None
+
+
+async def register(sha256: str, key: str, size: int, content_type: str) -> str:
+    """
+    Record a newly stored object with one reference and return the key to use.
+
+    When the same content was registered concurrently the earlier object wins:
+    this one is deleted and the reference goes to the existing object.
+    """
+    stored = await file_objects_collection.find_one_and_update(
+        {"sha256": sha256},
+        {
+            "$inc": {"ref_count": 1},
+            "$setOnInsert": {"object_key": key, "size": size, "content_type": content_type, "created_at": datetime.now(timezone.utc)},
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    if stored["object_key"] != key:
+        await object_store.call("delete_object", Bucket=AWS_BUCKET_NAME, Key=key)
+    return stored["object_key"]
+
+
+async def release(sha256: str) -> bool:
+    """Drop a reference; deletes the object (and returns True) when it was the last one."""
+    stored = await file_objects_collection.find_one_and_update(
+        {"sha256": sha256}, {"$inc": {"ref_count": -1}}, return_document=ReturnDocument.AFTER
+    )
+    if stored is None or stored["ref_count"] > 0:
+        return False
+
+    # A concurrent acquire between the decrement and here makes this a no-op
+    result = await file_objects_collection.delete_one({"sha256": sha256, "ref_count": {"$lte": 0}})
+    if result.deleted_count == 0:
+        return False
+    await object_store.call("delete_object", Bucket=AWS_BUCKET_NAME, Key=stored["object_key"])
+    logger.info(f"Deleted object {stored['object_key']} after its last reference")
+    return True
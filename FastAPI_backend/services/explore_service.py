@@ -0,0 +1,58 @@
+import asyncio
+import logging
+from typing import List
+
+from fastapi import APIRouter
+
+from config.setting import brand_tags_collection, model_tags_collection, user_collection
+from models.explore_model import ExploreCard, ExploreCardsRequest
+from services.file_service import get_latest_files_by_users
+from services.random_sampling import RANDOM_KEY_FIELD
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/explore", tags=["Explore"])
+
+TAG_PROJECTION = {"_id": 0, RANDOM_KEY_FIELD: 0}
+
+
+@router.post("/cards", response_model=List[ExploreCard])
+async def get_explore_cards(request: ExploreCardsRequest):
+    """
+    Hydrate Explore cards (name, latest image, tags) for a list of user_Ids.
+
+    Replaces a users/{id} + files/files/latest + tags/{id} round trip per card
+    with one `$in` query per collection and one latest-file aggregation, all run
+    concurrently. Cards come back in request order; unknown user_Ids are skipped.
+    """
+    user_ids = list(dict.fromkeys(request.user_Ids))  # Drop duplicates, keep order
+    if not user_ids:
+        return []
+
+    users, model_tags, brand_tags, latest_files = await asyncio.gather(
+        user_collection.find({"user_Id": {"$in": user_ids}}, {"_id": 0, "user_Id": 1, "name": 1, "role": 1}).to_list(None),
+        model_tags_collection.find({"user_Id": {"$in": user_ids}}, TAG_PROJECTION).to_list(None),
+        brand_tags_collection.find({"user_Id": {"$in": user_ids}}, TAG_PROJECTION).to_list(None),
+        get_latest_files_by_users(user_ids, request.folder, size=request.size),
+    )
+
+    users_by_id = {user["user_Id"]: user for user in users}
+    tags_by_id = {tag["user_Id"]: tag for tag in brand_tags}
+    tags_by_id.update({tag["user_Id"]: tag for tag in model_tags})
+
+    cards = []
+    for user_id in user_ids:
+        user = users_by_id.get(user_id)
+        if user is None:
+            continue
+        latest_file = latest_files.get(user_id)
+        cards.append(ExploreCard(
+            user_Id=user_id,
+            name=user.get("name"),
+            role=user.get("role"),
+            image=latest_file["s3_url"] if latest_file else None,
+            tags=tags_by_id.get(user_id),
+        ))
+
+    logger.info(f"Hydrated {len(cards)} of {len(user_ids)} explore cards")
+    return cards
@@ -0,0 +1,224 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import APIRouter, Query
+
+from config.setting import brand_tags_collection, rating_collection, saved_list_collection
+from models.Modella_tag import BrandTagFilterRequest, ModelTagFilterRequest
+from services.Modellatag_service import build_query, match_model_tag_user_ids
+from services.random_sampling import sample_documents
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/feed", tags=["Feed"])
+
+SESSION_TTL_SECONDS = 30 * 60
+MAX_SESSIONS = 10_000
+MAX_SESSION_BYTES = 256 * 1024 * 1024  # All sessions together; least recently used go first
+ENTRY_BYTES = 100  # Approximate cost of one user_Id held in a seen set or queue
+MAX_QUEUE = 1000  # Candidates queued per refill; larger matches are sampled
+REFILL_INTERVAL_SECONDS = 60  # How often an exhausted session may rerun a filter it has fully drained
+
+
+class FeedSession:
+    """A shuffled candidate queue plus the set of everything already handed out or excluded."""
+
+    def __init__(self):
+        self.queue: List[str] = []  # consumed from the end
+        self.seen: Set[str] = set()
+        self.touched = time.monotonic()
+        self.refilled_at = 0.0
+        self.truncated = False  # The last refill left unseen candidates out, so refilling again finds more
+        self.accounted = 0  # Bytes counted for this session in FeedSessions.bytes
+
+    def footprint(self) -> int:
+        return (len(self.seen) + len(self.queue)) * ENTRY_BYTES
+
+    def mark_seen(self, user_ids: Iterable[str]):
+        self.seen.update(user_ids)
+
+    def refill(self, candidates: List[str], sampled: bool = False) -> int:
+        """
+        Queue up to MAX_QUEUE unseen candidates in random order; returns how many were queued.
+
+        `sampled` candidates are a random sample of a larger match, so one that
+        still turned up unseen profiles is worth drawing again right away.
+        """
+        fresh = [user_id for user_id in candidates if user_id not in self.seen]
+        self.truncated = len(fresh) > MAX_QUEUE or (sampled and bool(fresh))
+        if len(fresh) > MAX_QUEUE:
+            fresh = random.sample(fresh, MAX_QUEUE)
+        else:
+            random.shuffle(fresh)
+        self.queue = fresh
+        self.refilled_at = time.monotonic()
+        return len(fresh)
+
+    def take(self, batch_size: int) -> List[str]:
+        batch = []
+        while self.queue and len(batch) < batch_size:
+            user_id = self.queue.pop()
+            if user_id in self.seen:
+                continue  # Marked seen after it was queued
+            self.seen.add(user_id)
+            batch.append(user_id)
+        return batch
+
+
+class FeedSessions:
+    """
+    Feed sessions keyed by (user_Id, feed, filter signature), least recently used first.
+
+    Bounded by count and by the approximate bytes of their seen sets and
+    queues. Concurrent first requests for a key share one session build, so
+    the profiles the first request hands out stay in the session that survives.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, max_bytes: int = MAX_SESSION_BYTES):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[Tuple[str, str, str], FeedSession]" = OrderedDict()
+        self.bytes = 0
+        self._creating: Dict[Tuple[str, str, str], asyncio.Future] = {}
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[FeedSession]:
+        now = time.monotonic()
+        # Drop expired sessions from the cold end
+        while self.entries:
+            oldest_key, oldest = next(iter(self.entries.items()))
+            if now - oldest.touched < SESSION_TTL_SECONDS:
+                break
+            self._drop(oldest_key)
+
+        session = self.entries.get(key)
+        if session is not None:
+            session.touched = now
+            self.entries.move_to_end(key)
+        return session
+
+    async def get_or_create(self, key: Tuple[str, str, str], create: Callable[[], Awaitable[FeedSession]]) -> FeedSession:
+        session = self.get(key)
+        if session is not None:
+            return session
+        inflight = self._creating.get(key)
+        if inflight is None or inflight.done():
+            inflight = asyncio.ensure_future(create())
+            self._creating[key] = inflight
+            inflight.add_done_callback(lambda future: self._created(key, future))
+        return await asyncio.shield(inflight)
+
+    def _created(self, key: Tuple[str, str, str], future: asyncio.Future):
+        if self._creating.get(key) is not future:
+            return  # Reset while it was being built
+        del self._creating[key]
+        if not future.cancelled() and future.exception() is None:
+            self.entries[key] = future.result()
+            self.resized(key, future.result())
+
+    def resized(self, key: Tuple[str, str, str], session: FeedSession):
+        """Account for a session's growth or shrinkage, then evict down to the limits."""
+        if self.entries.get(key) is not session:
+            return  # Reset, evicted or expired while it was being served; no longer counted
+        footprint = session.footprint()
+        self.bytes += footprint - session.accounted
+        session.accounted = footprint
+        # The most recently used session (the one being served) is kept even if it alone is over the limit
+        while len(self.entries) > 1 and (len(self.entries) > self.max_sessions or self.bytes > self.max_bytes):
+            self._drop(next(iter(self.entries)))
+
+    def _drop(self, key: Tuple[str, str, str]):
+        session = self.entries.pop(key)
+        self.bytes -= session.accounted
+        session.accounted = 0
+
+    def for_user(self, user_id: str) -> List[Tuple[Tuple[str, str, str], FeedSession]]:
+        return [(key, session) for key, session in self.entries.items() if key[0] == user_id]
+
+    def reset_user(self, user_id: str) -> int:
+        keys = [key for key in self.entries if key[0] == user_id]
+        for key in keys:
+            self._drop(key)
+        for key in [key for key in self._creating if key[0] == user_id]:
+            del self._creating[key]
+        return len(keys)
+
+    def stats(self) -> Dict[str, int]:
+        return {"sessions": len(self.entries), "bytes": self.bytes, "building": len(self._creating)}
+
+
+sessions = FeedSessions()
+
+
+def _filter_signature(query: dict) -> str:
+    return json.dumps(query, sort_keys=True, default=str)
+
+
+async def _excluded_user_ids(user_id: str) -> List[str]:
+    """The user themself plus everyone they have already saved or rated."""
+    saved = await saved_list_collection.find_one({"user_Id": user_id}, {"_id": 0, "saved_Ids": 1})
+    rated = await rating_collection.distinct("user_Id", {"ratedBy_Id": user_id})
+    return [user_id, *(saved or {}).get("saved_Ids", []), *rated]
+
+
+async def _match_brand_tag_user_ids(query: dict) -> List[str]:
+    # A random-key sample of one queue's worth; a drained session samples again
+    matched_tags = await sample_documents(brand_tags_collection, query, MAX_QUEUE, {"_id": 0, "user_Id": 1})
+    return [tag["user_Id"] for tag in matched_tags]
+
+
+async def _next_batch(user_id: str, feed: str, query: dict, batch_size: int, match, sampled: bool = False) -> List[str]:
+    async def create() -> FeedSession:
+        session = FeedSession()
+        session.mark_seen(await _excluded_user_ids(user_id))
+        session.refill(await match(query), sampled)
+        return session
+
+    key = (user_id, feed, _filter_signature(query))
+    session = await sessions.get_or_create(key, create)
+
+    batch = session.take(batch_size)
+    if len(batch) < batch_size and (session.truncated or time.monotonic() - session.refilled_at >= REFILL_INTERVAL_SECONDS):
+        # Queue exhausted: queue the rest of a large match, or rerun the filter (at most once
+        # per interval once it stops turning up unseen profiles) to pick up new ones
+        if session.refill(await match(query), sampled):
+            batch.extend(session.take(batch_size - len(batch)))
+    sessions.resized(key, session)
+    return batch
+
+
+@router.post("/models/{user_id}", response_model=List[str])
+async def next_model_cards(user_id: str, data: ModelTagFilterRequest, batch_size: int = Query(10, ge=1, le=100)):
+    """Next batch of model user_Ids for a swipe feed, never repeating a profile within the session."""
+    return await _next_batch(user_id, "models", build_query(data), batch_size, match_model_tag_user_ids)
+
+
+@router.post("/brands/{user_id}", response_model=List[str])
+async def next_brand_cards(user_id: str, data: BrandTagFilterRequest, batch_size: int = Query(10, ge=1, le=100)):
+    """Next batch of brand user_Ids for a swipe feed, never repeating a profile within the session."""
+    return await _next_batch(user_id, "brands", build_query(data), batch_size, _match_brand_tag_user_ids, sampled=True)
+
+
+@router.post("/{user_id}/seen")
+async def mark_cards_seen(user_id: str, seen_ids: List[str]):
+    """Exclude profiles the user has seen elsewhere (e.g. saved from search) from all their feed sessions."""
+    for key, session in sessions.for_user(user_id):
+        session.mark_seen(seen_ids)
+        sessions.resized(key, session)
+    return {"message": f"Marked {len(seen_ids)} profiles as seen"}
+
+
+@router.get("/stats")
+async def feed_stats():
+    """Live feed sessions and their approximate memory."""
+    return sessions.stats()
+
+
+@router.delete("/{user_id}")
+async def reset_feed(user_id: str):
+    """Forget the user's feed sessions so the next request starts from a fresh queue."""
+    return {"message": f"Reset {sessions.reset_user(user_id)} feed sessions"}
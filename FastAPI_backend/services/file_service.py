@@ -1,11 +1,17 @@
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Dict, List, Optional
 from fastapi import HTTPException
 import uuid
 import logging
 from config.setting import *
+from config.indexes import LATEST_FILE_INDEXES
 from bson import ObjectId
-from botocore.exceptions import NoCredentialsError
+from services import content_store
+from services.image_derivatives import FORMATS, SIZE_CLASSES, derived_keys, schedule_derivatives
+from services.loaders import request_loaders
+from services.storage import UploadTooLarge, object_store, stream_upload
+from services.url_signer import url_signer
+from services.user_existence import user_is_registered
 
 # Import logger
 #from config.logging_config import logger
@@ -24,12 +30,13 @@ ALLOWED_FILE_TYPES = {
     "video/mp4"                 # Videos
 }
 
+MAX_FILE_SIZE = 25 * 1024 * 1024  # 25MB
+
 async def _validate_user(user_id: str) -> bool:
     """Helper function to validate if a user exists"""
     if not user_id:
         return False
-    user = await user_collection.find_one({"user_Id": user_id})
-    return user is not None
+    return await user_is_registered(user_id)
 
 async def _validate_project(project_id: str) -> bool:
     """Helper function to validate if a user exists"""
@@ -38,6 +45,40 @@ async def _validate_project(project_id: str) -> bool:
     project = await project_collection.find_one({"project_Id": project_id})
     return project is not None
 
+def _file_key(file: dict) -> str:
+    if file.get("object_key"):
+        return file["object_key"]  # Content-addressed object, possibly shared with identical uploads
+    return f"{file['folder']}/{file['file_id']}_{file['file_name']}"
+
+def _validate_size(size: Optional[str], image_format: str = "webp"):
+    if size is not None and size not in SIZE_CLASSES:
+        raise HTTPException(status_code=400, detail=f"Invalid size, expected one of {sorted(SIZE_CLASSES)}")
+    if image_format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid image format, expected one of {sorted(FORMATS)}")
+
+def _url_request(file: dict, size: Optional[str], image_format: str):
+    """(key, content type, public) to sign: the rendition in `size` when there is one, else the original."""
+    public = not file.get("is_private", False)
+    rendition = (file.get("derivatives") or {}).get(size, {}).get(image_format) if size else None
+    if rendition:
+        return rendition, FORMATS[image_format][1], public
+    return _file_key(file), file.get('file_type', 'application/octet-stream'), public
+
+async def _sign_file_urls(files: List[dict], user_id: Optional[str] = None, owner_view: bool = False,
+                          size: Optional[str] = None, image_format: str = "webp"):
+    """Fill in each file's s3_url from the URL signer in one batch.
+    Private files are only signed for their owner (or for every file when `owner_view`)."""
+    visible = []
+    for file in files:
+        if owner_view or not file.get("is_private", False) or file.get("uploaded_by") == user_id:
+            visible.append(file)
+        else:
+            file["s3_url"] = None  # Hide private files from non-owners
+    urls = await url_signer.urls([_url_request(file, size, image_format) for file in visible])
+    for file, url in zip(visible, urls):
+        file["s3_url"] = url
+        file.pop("derivatives", None)
+
 async def upload_file(file, user_id: str, folder: str, is_private: bool = False, description: str ="No description", project_id: Optional[str] = None):
     """ Upload a file to AWS S3 and store metadata in MongoDB """
     # Validate user existence
@@ -62,18 +103,21 @@ async def upload_file(file, user_id: str, folder: str, is_private: bool = False,
 
     file_id = str(uuid.uuid4())
     file_name = file.filename
-    file_size = len(await file.read())
-    
-    
-    # File size validation (Max: 25MB)
-    if file_size > 25 * 1024 * 1024:
-        logger.warning(f"File size exceeded by {user_id}: {file_name} ({file_size} bytes)")
-        raise HTTPException(status_code=400, detail="File size exceeds 25MB limit")
 
-    # Upload to S3 in correct folder
-    file_key = f"{folder}/{file_id}_{file_name}"
-    file.file.seek(0)  # Reset file pointer
-    s3_client.upload_fileobj(file.file, AWS_BUCKET_NAME, file_key)
+    # Hash the spooled upload first (enforcing the 25MB limit), so identical content is stored once
+    try:
+        sha256, file_size = await content_store.hash_upload(file, MAX_FILE_SIZE)
+        file_key = await content_store.acquire(sha256)
+        if file_key:
+            logger.info(f"Duplicate upload by {user_id}: {file_name} re-uses {file_key}")
+        else:
+            # Stream to S3, still bounded in case the body changed under us
+            new_key = content_store.object_key(file_id)
+            file_size = await stream_upload(file, AWS_BUCKET_NAME, new_key, file_type, MAX_FILE_SIZE)
+            file_key = await content_store.register(sha256, new_key, file_size, file_type)
+    except UploadTooLarge as e:
+        logger.warning(f"File size exceeded by {user_id}: {file_name} (at least {e.args[0]} bytes)")
+        raise HTTPException(status_code=400, detail="File size exceeds 25MB limit")
     
     # Generate S3 URL
     s3_url = f"https://{AWS_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{file_key}"
@@ -90,11 +134,20 @@ async def upload_file(file, user_id: str, folder: str, is_private: bool = False,
         "folder": folder,
         "is_private": is_private,
         "description": description,
-        "project_id": project_id
+        "project_id": project_id,
+        "content_sha256": sha256,
+        "object_key": file_key
     }
-    await file_collection.insert_one(file_metadata)
+    try:
+        await file_collection.insert_one(file_metadata)
+    except Exception:
+        await content_store.release(sha256)  # Do not leak the reference taken above
+        raise
     logger.info(f"File uploaded successfully by {user_id}: {file_name} (Private: {is_private})")
 
+    # Thumbnails and WebP renditions are rendered in the background
+    schedule_derivatives(file_id, file_key, folder, file_type)
+
     return {"message": "File uploaded successfully", "file_url": s3_url}
 
 
@@ -118,7 +171,7 @@ async def download_file(file_id: str, user_id: str):
         logger.warning(f"Download attempt by non-existent user: {user_id}")
         raise HTTPException(status_code=404, detail="User not found")
 
-    file_metadata = await file_collection.find_one({"file_id": file_id})
+    file_metadata = await request_loaders().files.load(file_id)
     if not file_metadata:
         logger.warning(f"Download attempt for non-existing file: {file_id} by {user_id}")
         raise HTTPException(status_code=404, detail="File not found")
@@ -128,12 +181,8 @@ async def download_file(file_id: str, user_id: str):
         logger.warning(f"Unauthorized download attempt by {user_id} for {file_id}")
         raise HTTPException(status_code=403, detail="Unauthorized access")
 
-    file_key = f"{file_metadata['folder']}/{file_id}_{file_metadata['file_name']}"
-    url = s3_client.generate_presigned_url(
-        "get_object",
-        Params={"Bucket": AWS_BUCKET_NAME, "Key": file_key},
-        ExpiresIn=3600
-    )
+    file_key = _file_key(file_metadata)
+    url = await url_signer.url(file_key, None, public=not file_metadata["is_private"])
 
     logger.info(f"Download link generated for {file_id} by {user_id}")
 
@@ -147,7 +196,7 @@ async def delete_file(file_id: str, user_id: str):
         logger.warning(f"Delete attempt by non-existent user: {user_id}")
         raise HTTPException(status_code=404, detail="User not found")
 
-    file_metadata = await file_collection.find_one({"file_id": file_id})
+    file_metadata = await request_loaders().files.load(file_id)
     if not file_metadata:
         logger.warning(f"Delete attempt for non-existing file: {file_id} by {user_id}")
         raise HTTPException(status_code=404, detail="File not found")
@@ -157,10 +206,22 @@ async def delete_file(file_id: str, user_id: str):
         logger.warning(f"Unauthorized delete attempt by {user_id} for {file_id}")
         raise HTTPException(status_code=403, detail="Unauthorized")
 
-    file_key = f"{file_metadata['folder']}/{file_id}_{file_metadata['file_name']}"
-    s3_client.delete_object(Bucket=AWS_BUCKET_NAME, Key=file_key)
+    file_key = _file_key(file_metadata)
+    for key in derived_keys(file_metadata):
+        await object_store.call("delete_object", Bucket=AWS_BUCKET_NAME, Key=key)
+        url_signer.forget(key)
 
     await file_collection.delete_one({"file_id": file_id})
+    request_loaders().files.clear(file_id)
+
+    # Shared objects go with their last reference; older uploads own their object outright
+    if file_metadata.get("content_sha256"):
+        dropped = await content_store.release(file_metadata["content_sha256"])
+    else:
+        await object_store.call("delete_object", Bucket=AWS_BUCKET_NAME, Key=file_key)
+        dropped = True
+    if dropped:
+        url_signer.forget(file_key)
 
     logger.info(f"File deleted successfully by {user_id}: {file_id}")
 
@@ -172,7 +233,7 @@ async def update_visibility(file_id: str, user_id: str, is_private: bool):
         logger.warning(f"Visibility update attempt by non-existent user: {user_id}")
         raise HTTPException(status_code=404, detail="User not found")
 
-    file_metadata = await file_collection.find_one({"file_id": file_id})
+    file_metadata = await request_loaders().files.load(file_id)
     if not file_metadata:
         logger.warning(f"Visibility update attempt for non-existing file: {file_id} by {user_id}")
         raise HTTPException(status_code=404, detail="File not found")
@@ -183,14 +244,16 @@ async def update_visibility(file_id: str, user_id: str, is_private: bool):
         raise HTTPException(status_code=403, detail="Unauthorized")
 
     await file_collection.update_one({"file_id": file_id}, {"$set": {"is_private": is_private}})
+    request_loaders().files.clear(file_id)
     logger.info(f"File visibility updated by {user_id}: {file_id} (Private: {is_private})")
     return {"message": "Visibility updated successfully"}
 
 
 
 
-async def get_file_url(user_id: Optional[str] = None):
+async def get_file_url(user_id: Optional[str] = None, size: Optional[str] = None, image_format: str = "webp"):
     """Retrieve file URLs, excluding private files unless the user is the owner."""
+    _validate_size(size, image_format)
     if user_id and not await _validate_user(user_id):
         logger.warning(f"File URL retrieval attempt by non-existent user: {user_id}")
         raise HTTPException(status_code=404, detail="User not found")
@@ -218,6 +281,8 @@ async def get_file_url(user_id: Optional[str] = None):
             "is_private": 1,
             "uploaded_by": 1,
             "file_type": 1,
+            "derivatives": 1,
+            "object_key": 1,
             "description": {"$ifNull": ["$description", "No description"]},
             "project_id":{"$ifNull": ["$project_id", ""]}
         }
@@ -225,44 +290,16 @@ async def get_file_url(user_id: Optional[str] = None):
 
     files = await file_collection.aggregate(pipeline).to_list(None)
 
-    for file in files:
-        file_key = f"{file['folder']}/{file['file_id']}_{file['file_name']}"
-        file_type = file.get('file_type', 'application/octet-stream')
-
-
-        if file.get("is_private", False):
-            if file.get("uploaded_by") == user_id:
-                try:
-                    file["s3_url"] = generate_presigned_url(file_key, file_type)
-                except NoCredentialsError:
-                    file["s3_url"] = None  # Handle missing credentials
-            else:
-                file["s3_url"] = None  # Hide private files from non-owners
-        else:
-            file["s3_url"] = generate_presigned_url(file_key, file_type)
+    # Private files only for their owner; all URLs come from the signer cache in one batch
+    await _sign_file_urls(files, user_id, size=size, image_format=image_format)
 
     logger.info(f"Retrieved file URLs for user: {user_id if user_id else 'all users'}")
     return files
 
 
-def generate_presigned_url(file_key: str, file_type: str, expiration: int = 3600):
-    """Generate a pre-signed URL for private files."""
-    try:
-        content_type = file_type
-
-        url = s3_client.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": AWS_BUCKET_NAME, "Key": file_key, 'ResponseContentDisposition': 'inline','ResponseContentType': content_type},
-            ExpiresIn=expiration
-        )
-        return url
-    except Exception as e:
-        logger.error(f"Error generating presigned URL: {e}")
-        return None
-
-
-async def get_files_urls_by_folder(user_id: Optional[str] = None, folder: Optional[str] = None, limit: Optional[int] = None):
+async def get_files_urls_by_folder(user_id: Optional[str] = None, folder: Optional[str] = None, limit: Optional[int] = None, size: Optional[str] = None, image_format: str = "webp"):
     """Retrieve file URLs based on optional user_id and folder, excluding private files unless the user is the owner."""
+    _validate_size(size, image_format)
     
     # Validate user if user_id is provided
     if user_id and not await _validate_user(user_id):
@@ -298,6 +335,8 @@ async def get_files_urls_by_folder(user_id: Optional[str] = None, folder: Option
             "is_private": 1,
             "uploaded_by": 1,
             "file_type": 1,
+            "derivatives": 1,
+            "object_key": 1,
             "description": {"$ifNull": ["$description", "No description"]},
             "project_id":{"$ifNull": ["$project_id", ""]} 
         }
@@ -309,22 +348,8 @@ async def get_files_urls_by_folder(user_id: Optional[str] = None, folder: Option
 
     files = await file_collection.aggregate(pipeline).to_list(None)
 
-    # Generate presigned URLs where needed
-    for file in files:
-        file_key = f"{file['folder']}/{file['file_id']}_{file['file_name']}"
-        file_type = file.get('file_type', 'application/octet-stream')
-
-        # Handle private files
-        if file.get("is_private", False):
-            if file.get("uploaded_by") == user_id:
-                try:
-                    file["s3_url"] = generate_presigned_url(file_key, file_type)
-                except NoCredentialsError:
-                    file["s3_url"] = None  # Handle missing credentials
-            else:
-                file["s3_url"] = None  # Hide private files from non-owners
-        else:
-            file["s3_url"] = generate_presigned_url(file_key, file_type)
+    # Generate presigned URLs where needed (private files only for their owner)
+    await _sign_file_urls(files, user_id, size=size, image_format=image_format)
 
     logger.info(f"Retrieved files for user: {user_id if user_id else 'all users'}, folder: {folder if folder else 'all folders'}")
     return files
@@ -335,9 +360,12 @@ async def get_files_urls_by_folder(user_id: Optional[str] = None, folder: Option
 async def get_files_urls_by_user_folders(
     user_id: str,  # Required parameter
     folder: Optional[str] = None,  # Optional parameter
-    limit: Optional[int] = None    # Optional parameter
+    limit: Optional[int] = None,   # Optional parameter
+    size: Optional[str] = None,    # Size class of image renditions (original when omitted)
+    image_format: str = "webp"
 ):
     """Retrieve file URLs based on user_id and optional folder, limiting the number of files if provided."""
+    _validate_size(size, image_format)
     
     # Validate user if user_id is provided
     if not await _validate_user(user_id):
@@ -367,6 +395,8 @@ async def get_files_urls_by_user_folders(
             "is_private": 1,
             "uploaded_by": 1,
             "file_type": 1,
+            "derivatives": 1,
+            "object_key": 1,
             "description": {"$ifNull": ["$description", "No description"]},
             "project_id":{"$ifNull": ["$project_id", ""]}
         }
@@ -379,48 +409,49 @@ async def get_files_urls_by_user_folders(
     # Perform the aggregation to get the files
     files = await file_collection.aggregate(pipeline).to_list(None)
 
-    # Generate presigned URLs where needed
-    for file in files:
-        file_key = f"{file['folder']}/{file['file_id']}_{file['file_name']}"
-        file_type = file.get('file_type', 'application/octet-stream')
-
-        # Always generate the URL for the file, without checking privacy
-        try:
-            file["s3_url"] = generate_presigned_url(file_key, file_type)
-        except NoCredentialsError:
-            file["s3_url"] = None
+    # Always generate the URL for the file, without checking privacy
+    await _sign_file_urls(files, owner_view=True, size=size, image_format=image_format)
 
     logger.info(f"Retrieved files for user: {user_id}, folder: {folder if folder else 'all folders'}")
     return files
 
 
-async def get_latest_file_by_user_folder(user_id: str, folder: Optional[str] = None):
+async def get_latest_file_by_user_folder(user_id: str, folder: Optional[str] = None, size: Optional[str] = None, image_format: str = "webp"):
     """Retrieve the latest file added by the user to a specific folder."""
+    _validate_size(size, image_format)
     
     # Validate user existence
     if not await _validate_user(user_id):
         logger.warning(f"File retrieval attempt by non-existent user: {user_id}")
         raise HTTPException(status_code=404, detail="User not found")
     
-    pipeline = []
-    
-    # Filtering based on user_id and optional folder
-    match_conditions = [{"uploaded_by": user_id}]
-    
+    # Same index-backed lookup as the bulk variant, for a single user
+    latest_files = await get_latest_files_by_users([user_id], folder, size=size, image_format=image_format)
+    return latest_files.get(user_id)  # None when the user has no file there
+
+
+async def get_latest_files_by_users(user_ids: List[str], folder: Optional[str] = None, size: Optional[str] = None, image_format: str = "webp") -> Dict[str, dict]:
+    """Latest file of each user (optionally in one folder) in a single aggregation, keyed by user_Id.
+    Callers are expected to have resolved the users already, so they are not validated one by one."""
+    _validate_size(size, image_format)
+    if not user_ids:
+        return {}
+
+    match_conditions = {"uploaded_by": {"$in": user_ids}}
+    sort = {"uploaded_by": 1, "uploaded_at": -1}
     if folder and folder in ALLOWED_FOLDERS:
-        match_conditions.append({"folder": folder})
-    
-    pipeline.append({"$match": {"$and": match_conditions}})
-    
-    # Sorting to get the latest file
-    pipeline.append({"$sort": {"uploaded_at": -1}})  # Assuming 'uploaded_at' field exists
-    
-    # Limiting to the most recent file
-    pipeline.append({"$limit": 1})
-    
-    # Projection stage
-    pipeline.append({
-        "$project": {
+        match_conditions["folder"] = folder
+        sort = {"uploaded_by": 1, "folder": 1, "uploaded_at": -1}
+
+    pipeline = [
+        {"$match": match_conditions},
+        # Walks LATEST_FILE_INDEXES in order instead of sorting in memory
+        {"$sort": sort},
+        # Keep the newest file per uploader
+        {"$group": {"_id": "$uploaded_by", "file": {"$first": "$$ROOT"}}},
+        {"$replaceRoot": {"newRoot": "$file"}},
+        {"$project": {
+            "_id": 0,
             "file_id": 1,
             "file_name": 1,
             "folder": 1,
@@ -428,34 +459,25 @@ async def get_latest_file_by_user_folder(user_id: str, folder: Optional[str] = N
             "is_private": 1,
             "uploaded_by": 1,
             "file_type": 1,
+            "derivatives": 1,
+            "object_key": 1,
             "uploaded_at": 1,
             "description": {"$ifNull": ["$description", "No description"]},
-            "project_id":{"$ifNull": ["$project_id", ""]} 
-        }
-    })
-    
-    # Perform the aggregation
-    latest_file = await file_collection.aggregate(pipeline).to_list(1)
-    
-    if not latest_file:
-        return None  # No file found
-    
-    file = latest_file[0]
-    file_key = f"{file['folder']}/{file['file_id']}_{file['file_name']}"
-    file_type = file.get('file_type', 'application/octet-stream')
-    
-    # Generate presigned URL
-    try:
-        file["s3_url"] = generate_presigned_url(file_key, file_type)
-    except NoCredentialsError:
-        file["s3_url"] = None
-    
-    logger.info(f"Retrieved latest file for user: {user_id}, folder: {folder if folder else 'all folders'}")
-    return file
+            "project_id": {"$ifNull": ["$project_id", ""]}
+        }}
+    ]
+    files = await file_collection.aggregate(pipeline).to_list(None)
 
+    # Generate all presigned URLs in one batch off the event loop
+    await _sign_file_urls(files, owner_view=True, size=size, image_format=image_format)
 
-async def get_file_by_project(user_id: str, project_id: str):
+    logger.info(f"Retrieved latest files for {len(files)} of {len(user_ids)} users, folder: {folder if folder else 'all folders'}")
+    return {file["uploaded_by"]: file for file in files}
+
+
+async def get_file_by_project(user_id: str, project_id: str, size: Optional[str] = None, image_format: str = "webp"):
     """Retrieve the latest file added by the user to the 'project' folder for a specific project."""
+    _validate_size(size, image_format)
     
     # Validate user existence
     if not await _validate_user(user_id):
@@ -481,6 +503,8 @@ async def get_file_by_project(user_id: str, project_id: str):
             "is_private": 1,
             "uploaded_by": 1,
             "file_type": 1,
+            "derivatives": 1,
+            "object_key": 1,
             "uploaded_at": 1,
             "description": {"$ifNull": ["$description", "No description"]},
             "project_id": {"$ifNull": ["$project_id", ""]}
@@ -493,14 +517,9 @@ async def get_file_by_project(user_id: str, project_id: str):
         return None  # No file found
     
     file = project_file[0]
-    file_key = f"{file['folder']}/{file['file_id']}_{file['file_name']}"
-    file_type = file.get('file_type', 'application/octet-stream')
     
     # Generate presigned URL
-    try:
-        file["s3_url"] = generate_presigned_url(file_key, file_type)
-    except NoCredentialsError:
-        file["s3_url"] = None
+    await _sign_file_urls([file], owner_view=True, size=size, image_format=image_format)
     
     logger.info(f"Retrieved latest file for user: {user_id}, project: {project_id}, folder: 'project'")
     return file
\ No newline at end of file
@@ -0,0 +1,125 @@
+import asyncio
+import io
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Set
+
+from config.setting import AWS_BUCKET_NAME, file_collection
+from services.storage import TRANSFER_TIMEOUT_SECONDS, object_store
+
+logger = logging.getLogger(__name__)
+
+# Size classes: longest side in pixels (never upscaled)
+SIZE_CLASSES = {"thumb": 200, "small": 640, "large": 1280}
+FORMATS = {"webp": ("WEBP", "image/webp"), "jpeg": ("JPEG", "image/jpeg")}
+DERIVED_FOLDERS = {"image", "profile-pic", "portfolio"}
+DERIVED_TYPES = {"image/jpeg", "image/png"}
+QUALITY = 80
+MAX_PIXELS = 50_000_000  # Refuse decompression bombs instead of rendering them
+WORKERS = 2
+
+_pool: Optional[ProcessPoolExecutor] = None
+_tasks: Set[asyncio.Task] = set()  # Keeps fire-and-forget renders alive until they finish
+
+
+def render_derivatives(data: bytes) -> Dict[str, Dict[str, bytes]]:
+    """Resize one image into every size class and format (runs in a worker process)."""
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)  # Phone photos carry their rotation in EXIF
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+
+        renditions = {}
+        for size_class, longest_side in SIZE_CLASSES.items():
+            resized = image.copy()
+            resized.thumbnail((longest_side, longest_side), Image.Resampling.LANCZOS)
+            renditions[size_class] = {}
+            for fmt, (pil_format, _) in FORMATS.items():
+                out = io.BytesIO()
+                rendition = resized.convert("RGB") if pil_format == "JPEG" else resized
+                rendition.save(out, pil_format, quality=QUALITY, optimize=pil_format == "JPEG")
+                renditions[size_class][fmt] = out.getvalue()
+        return renditions
+
+
+def derived_key(file_id: str, size_class: str, fmt: str) -> str:
+    return f"derived/{size_class}/{file_id}.{fmt}"
+
+
+def wants_derivatives(folder: str, file_type: str) -> bool:
+    return folder in DERIVED_FOLDERS and file_type in DERIVED_TYPES
+
+
+def _read_object(file_key: str) -> bytes:
+    return object_store.client.get_object(Bucket=AWS_BUCKET_NAME, Key=file_key)["Body"].read()
+
+
+def _process_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=WORKERS)
+    return _pool
+
+
+async def generate_derivatives(file_id: str, file_key: str) -> Dict[str, Dict[str, str]]:
+    """Render the renditions of an uploaded image, store them under derived/ and record their keys."""
+    data = await object_store.run(_read_object, file_key, name="get_object", timeout=TRANSFER_TIMEOUT_SECONDS)
+
+    loop = asyncio.get_running_loop()
+    renditions = await loop.run_in_executor(_process_pool(), render_derivatives, data)
+
+    derivatives = {}
+    uploads = []
+    for size_class, formats in renditions.items():
+        derivatives[size_class] = {}
+        for fmt, body in formats.items():
+            key = derived_key(file_id, size_class, fmt)
+            derivatives[size_class][fmt] = key
+            uploads.append(object_store.call(
+                "put_object", Bucket=AWS_BUCKET_NAME, Key=key, Body=body, ContentType=FORMATS[fmt][1],
+                CacheControl="public, max-age=31536000, immutable"  # A file_id's renditions never change
+            ))
+    await asyncio.gather(*uploads)
+
+    result = await file_collection.update_one({"file_id": file_id}, {"$set": {"derivatives": derivatives}})
+    if result.matched_count == 0:
+        # Deleted while rendering: nothing will ever reference these objects
+        await asyncio.gather(*(
+            object_store.call("delete_object", Bucket=AWS_BUCKET_NAME, Key=key) for key in derived_keys({"derivatives": derivatives})
+        ))
+        return {}
+    logger.info(f"Stored {len(uploads)} derivatives for {file_key}")
+    return derivatives
+
+
+async def _generate_logged(file_id: str, file_key: str):
+    try:
+        await generate_derivatives(file_id, file_key)
+    except Exception as e:
+        # The original stays servable; callers asking for a size class get it instead
+        logger.error(f"Error generating derivatives for {file_key}: {str(e)}")
+
+
+def schedule_derivatives(file_id: str, file_key: str, folder: str, file_type: str):
+    """Start rendering in the background after an upload is recorded (images in gallery folders only)."""
+    if not wants_derivatives(folder, file_type):
+        return
+    task = asyncio.create_task(_generate_logged(file_id, file_key))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+def derived_keys(file: dict):
+    """Every derived object key recorded on a file."""
+    return [key for formats in (file.get("derivatives") or {}).values() for key in formats.values()]
+
+
+def shutdown():
+    global _pool
+    for task in _tasks:
+        task.cancel()
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
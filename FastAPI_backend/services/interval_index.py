@@ -0,0 +1,240 @@
+import logging
+import random
+from bisect import bisect_left, bisect_right, insort
+from typing import AsyncIterable, Dict, Iterable, List, Optional, Set, Tuple
+
+from services.tag_index import NUMERIC_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Tuple[int, int] fields on ProjectTagData and the preference models
+RANGE_FIELDS = NUMERIC_FIELDS
+
+# List-valued (location: single string) requirement fields on ProjectTagData
+LIST_FIELDS = (
+    "natural_eye_color", "body_Type", "work_Field", "skin_Tone", "ethnicity",
+    "natural_hair_type", "experience_Level", "gender", "location",
+)
+
+INFINITY = float("inf")
+
+
+def _as_range(value) -> Optional[Tuple[float, float]]:
+    if isinstance(value, (int, float)):
+        return (value, value)  # A point is a zero-width interval
+    if isinstance(value, (list, tuple)) and len(value) == 2 and all(isinstance(v, (int, float)) for v in value):
+        low, high = value
+        return (low, high) if low <= high else (high, low)
+    return None
+
+
+def _as_keywords(value) -> Optional[frozenset]:
+    if isinstance(value, str):
+        return frozenset([value])
+    if isinstance(value, (list, tuple)):
+        values = frozenset(v for v in value if v is not None)
+        return values or None
+    return None
+
+
+def split_requirements(data: dict) -> Tuple[Dict[str, Tuple[float, float]], Dict[str, frozenset]]:
+    """Pull the range and keyword constraints out of a tag, preference or filter dict."""
+    ranges = {field: r for field in RANGE_FIELDS if (r := _as_range(data.get(field))) is not None}
+    keywords = {field: k for field in LIST_FIELDS if (k := _as_keywords(data.get(field))) is not None}
+    return ranges, keywords
+
+
+def build_interval_query(ranges: Dict[str, Tuple[float, float]], keywords: Dict[str, frozenset]) -> dict:
+    """MongoDB equivalent of ProjectIntervalIndex.match, for use before the index is loaded.
+
+    Ranges are stored as [low, high] arrays, so overlap is `field.0 <= high and
+    field.1 >= low`; a project that leaves a field unset accepts any value.
+    """
+    clauses = []
+    for field, (low, high) in ranges.items():
+        clauses.append({"$or": [{field: None}, {f"{field}.0": {"$lte": high}, f"{field}.1": {"$gte": low}}]})
+    for field, values in keywords.items():
+        clauses.append({"$or": [{field: None}, {field: {"$in": sorted(values)}}]})
+    return {"$and": clauses} if clauses else {}
+
+
+def fits(project_ranges: dict, project_keywords: dict, ranges: dict, keywords: dict) -> bool:
+    """Whether a project's requirements (as returned by split_requirements) accept the given ones."""
+    for field, (low, high) in ranges.items():
+        bounds = project_ranges.get(field)
+        if bounds is not None and (bounds[0] > high or bounds[1] < low):
+            return False
+    for field, values in keywords.items():
+        accepted = project_keywords.get(field)
+        if accepted is not None and accepted.isdisjoint(values):
+            return False
+    return True
+
+
+class ProjectIntervalIndex:
+    """In-memory interval matching over projects_tags.
+
+    Each range dimension keeps the project intervals as two sorted endpoint
+    arrays (by low and by high); each keyword dimension keeps a posting set per
+    value. A query starts from its most selective dimension (a bisection gives
+    the candidate count without touching the candidates) and checks the rest
+    per candidate, so the cost is O(log n + candidates) rather than O(n).
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._replay: Optional[list] = None  # writes seen while an async rebuild is running
+        self.clear()
+
+    def clear(self):
+        """Drop every project."""
+        if self._replay is not None:
+            self._replay.append(("clear", ()))
+        self.ids: Dict[str, int] = {}  # project_Id -> dense id
+        self.project_ids: List[Optional[str]] = []  # dense id -> project_Id
+        self.free_ids: List[int] = []
+        self.records: Dict[int, Tuple[dict, dict]] = {}
+        self.lows: Dict[str, List[Tuple[float, int]]] = {field: [] for field in RANGE_FIELDS}
+        self.highs: Dict[str, List[Tuple[float, int]]] = {field: [] for field in RANGE_FIELDS}
+        self.postings: Dict[str, Dict[str, Set[int]]] = {field: {} for field in LIST_FIELDS}
+        # Projects with no requirement on a field match every value of it
+        self.unconstrained: Dict[str, Set[int]] = {field: set() for field in (*RANGE_FIELDS, *LIST_FIELDS)}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def rebuild(self, docs: Iterable[dict]):
+        """Replace the indexed projects with `docs` and mark the index ready."""
+        self.clear()
+        loaded = [doc for doc in docs if doc.get("project_Id")]
+        for doc in loaded:
+            self._add(doc, sort=False)
+        for field in RANGE_FIELDS:
+            self.lows[field].sort()
+            self.highs[field].sort()
+        self.ready = True
+        logger.info(f"Project interval index built with {len(self)} projects")
+
+    async def rebuild_async(self, docs: AsyncIterable[dict]):
+        """Rebuild from an async cursor and swap in, replaying writes that arrived during the scan."""
+        self._replay = []
+        try:
+            fresh = ProjectIntervalIndex()
+            fresh.rebuild([doc async for doc in docs])
+            replay, self._replay = self._replay, None
+            self.__dict__.update(fresh.__dict__)
+            for operation, args in replay:
+                getattr(self, operation)(*args)
+        finally:
+            self._replay = None
+
+    def upsert(self, doc: dict):
+        """Index or re-index one project tag document."""
+        if self._replay is not None:
+            self._replay.append(("upsert", (doc,)))
+        if not doc.get("project_Id"):
+            return
+        self._remove(doc["project_Id"])
+        self._add(doc, sort=True)
+
+    def remove(self, project_id: str):
+        """Forget a project (no-op if it is not indexed)."""
+        if self._replay is not None:
+            self._replay.append(("remove", (project_id,)))
+        self._remove(project_id)
+
+    def _add(self, doc: dict, sort: bool):
+        project_id = doc["project_Id"]
+        doc_id = self.free_ids.pop() if self.free_ids else len(self.project_ids)
+        if doc_id == len(self.project_ids):
+            self.project_ids.append(project_id)
+        else:
+            self.project_ids[doc_id] = project_id
+        self.ids[project_id] = doc_id
+
+        ranges, keywords = split_requirements(doc)
+        self.records[doc_id] = (ranges, keywords)
+        for field in RANGE_FIELDS:
+            if field not in ranges:
+                self.unconstrained[field].add(doc_id)
+                continue
+            low, high = ranges[field]
+            if sort:
+                insort(self.lows[field], (low, doc_id))
+                insort(self.highs[field], (high, doc_id))
+            else:
+                self.lows[field].append((low, doc_id))
+                self.highs[field].append((high, doc_id))
+        for field in LIST_FIELDS:
+            if field not in keywords:
+                self.unconstrained[field].add(doc_id)
+                continue
+            for value in keywords[field]:
+                self.postings[field].setdefault(value, set()).add(doc_id)
+
+    def _remove(self, project_id: str):
+        doc_id = self.ids.pop(project_id, None)
+        if doc_id is None:
+            return
+        ranges, keywords = self.records.pop(doc_id)
+        for field in RANGE_FIELDS:
+            if field not in ranges:
+                self.unconstrained[field].discard(doc_id)
+                continue
+            low, high = ranges[field]
+            for endpoints, key in ((self.lows[field], (low, doc_id)), (self.highs[field], (high, doc_id))):
+                position = bisect_left(endpoints, key)
+                del endpoints[position]
+        for field in LIST_FIELDS:
+            if field not in keywords:
+                self.unconstrained[field].discard(doc_id)
+                continue
+            for value in keywords[field]:
+                self.postings[field][value].discard(doc_id)
+        self.project_ids[doc_id] = None
+        self.free_ids.append(doc_id)
+
+    def _range_candidates(self, field: str, low: float, high: float) -> Tuple[int, Iterable[int]]:
+        """(count, ids) of the cheaper endpoint condition: project low <= high, or project high >= low."""
+        lows, highs = self.lows[field], self.highs[field]
+        starts_before = bisect_right(lows, (high, INFINITY))
+        ends_after = len(highs) - bisect_left(highs, (low, -1))
+        if starts_before <= ends_after:
+            return starts_before, (doc_id for _, doc_id in lows[:starts_before])
+        return ends_after, (doc_id for _, doc_id in highs[len(highs) - ends_after:])
+
+    def _keyword_candidates(self, field: str, values: frozenset) -> Tuple[int, Iterable[int]]:
+        postings = [self.postings[field].get(value, ()) for value in values]
+        return sum(map(len, postings)), (doc_id for posting in postings for doc_id in posting)
+
+    def _accepts(self, doc_id: int, ranges: dict, keywords: dict) -> bool:
+        return fits(*self.records[doc_id], ranges, keywords)
+
+    def match(self, ranges: Dict[str, Tuple[float, float]], keywords: Dict[str, frozenset]) -> List[str]:
+        """project_Ids whose requirements overlap every given range and share a value with every keyword set.
+
+        Pass a model's measurements as zero-width ranges to get contains-point matching.
+        """
+        best = None
+        for field, (low, high) in ranges.items():
+            count, ids = self._range_candidates(field, low, high)
+            if best is None or count + len(self.unconstrained[field]) < best[0]:
+                best = (count + len(self.unconstrained[field]), field, ids)
+        for field, values in keywords.items():
+            count, ids = self._keyword_candidates(field, values)
+            if best is None or count + len(self.unconstrained[field]) < best[0]:
+                best = (count + len(self.unconstrained[field]), field, ids)
+
+        if best is None:
+            return [self.project_ids[doc_id] for doc_id in self.records]
+        _, field, ids = best
+        candidates = set(ids) | self.unconstrained[field]
+        return [self.project_ids[doc_id] for doc_id in candidates if self._accepts(doc_id, ranges, keywords)]
+
+    def sample(self, ranges: dict, keywords: dict, size: int) -> List[str]:
+        matches = self.match(ranges, keywords)
+        return matches if len(matches) <= size else random.sample(matches, size)
+
+
+# Process-wide index over projects_tags, loaded at startup
+project_interval_index = ProjectIntervalIndex()
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Dict, Optional
+
+import httpx
+from jose import jwk
+from jose.exceptions import JWKError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_AGE_SECONDS = 10 * 60  # When the JWKS response has no usable Cache-Control
+MIN_MAX_AGE_SECONDS = 60
+MAX_MAX_AGE_SECONDS = 24 * 60 * 60
+REFRESH_MARGIN_SECONDS = 30  # Refresh this long before the cached document goes stale
+RETRY_SECONDS = 30  # Background retry delay after a failed refresh
+UNKNOWN_KID_COOLDOWN_SECONDS = 30  # Minimum gap between refetches triggered by unknown kids
+HTTP_TIMEOUT = httpx.Timeout(5.0)
+
+
+def cache_max_age(cache_control: Optional[str]) -> float:
+    """max-age from a Cache-Control header, clamped to sane bounds."""
+    match = re.search(r"max-age=(\d+)", cache_control or "")
+    if not match or "no-cache" in cache_control or "no-store" in cache_control:
+        return DEFAULT_MAX_AGE_SECONDS
+    return min(max(int(match.group(1)), MIN_MAX_AGE_SECONDS), MAX_MAX_AGE_SECONDS)
+
+
+class JWKSKeyStore:
+    """
+    Parsed JWKS signing keys by `kid`, fetched without blocking the event loop.
+
+    Known kids are answered from memory. A background task refreshes the set
+    before the Cache-Control max-age runs out. An unknown kid (key rotation)
+    triggers one refetch shared by every concurrent caller, at most once per
+    cooldown, so forged kids cannot hammer the JWKS endpoint.
+    """
+
+    def __init__(self, jwks_url: str, algorithm: str = "RS256", client: Optional[httpx.AsyncClient] = None):
+        self.jwks_url = jwks_url
+        self.algorithm = algorithm
+        self.keys: Dict[str, object] = {}
+        self.fetched_at = 0.0  # time.monotonic() of the last successful fetch
+        self.expires_at = 0.0
+        self.fetches = 0
+        self._client = client
+        self._inflight: Optional[asyncio.Future] = None
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=HTTP_TIMEOUT)
+        return self._client
+
+    async def _fetch(self):
+        self.fetches += 1
+        response = await self._http().get(self.jwks_url)
+        response.raise_for_status()
+
+        keys = {}
+        for key in response.json().get("keys", []):
+            if not key.get("kid") or key.get("use", "sig") != "sig":
+                continue
+            try:
+                keys[key["kid"]] = jwk.construct(key, key.get("alg", self.algorithm))
+            except JWKError as e:
+                logger.warning(f"Skipping unusable JWKS key {key['kid']}: {str(e)}")
+
+        self.keys = keys
+        self.fetched_at = time.monotonic()
+        self.expires_at = self.fetched_at + cache_max_age(response.headers.get("cache-control"))
+        logger.info(f"Loaded {len(keys)} JWKS keys from {self.jwks_url}")
+
+    def refresh(self) -> "asyncio.Future":
+        """Refetch the key set, joining a fetch that is already in flight."""
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._fetch())
+        return asyncio.shield(self._inflight)
+
+    async def get_key(self, kid: Optional[str]):
+        """The parsed key for `kid`, or None if the JWKS does not have it.
+        Raises httpx.HTTPError only when no keys could be loaded at all."""
+        key = self.keys.get(kid)
+        if key is not None:
+            return key
+
+        refetch_due = time.monotonic() - self.fetched_at >= UNKNOWN_KID_COOLDOWN_SECONDS
+        if not self.keys or refetch_due or (self._inflight is not None and not self._inflight.done()):
+            try:
+                await self.refresh()
+            except (httpx.HTTPError, ValueError) as e:
+                logger.error(f"Could not fetch JWKS keys: {str(e)}")
+                if not self.keys:
+                    raise
+        return self.keys.get(kid)
+
+    async def run_refresher(self):
+        """Keep the key set fresh in the background (run as a lifespan task)."""
+        while True:
+            try:
+                await self.refresh()
+                delay = max(self.expires_at - time.monotonic() - REFRESH_MARGIN_SECONDS, MIN_MAX_AGE_SECONDS / 2)
+            except Exception as e:
+                logger.error(f"Error refreshing JWKS keys: {str(e)}")
+                delay = RETRY_SECONDS
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from config.setting import brand_tags_collection, file_collection, model_tags_collection, user_collection
+
+logger = logging.getLogger(__name__)
+
+
+class DataLoader:
+    """
+    Batches and dedupes single-document lookups by one key field.
+
+    Every `load` issued in the same event-loop tick is resolved by a single
+    `{key_field: {"$in": [...]}}` query, and each key is fetched at most once
+    for the lifetime of the loader (one request). `loads` counts the lookups
+    callers asked for, `queries` the round trips actually made.
+    """
+
+    def __init__(self, collection, key_field: str):
+        self.collection = collection
+        self.key_field = key_field
+        self.loads = 0
+        self.queries = 0
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._pending: List[str] = []
+        self._dispatches = set()  # Keep dispatch tasks referenced until they finish
+
+    def load(self, key: str) -> "asyncio.Future[Optional[dict]]":
+        """Future resolving to the document with `key_field == key`, or None."""
+        self.loads += 1
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._futures[key] = loop.create_future()
+            self._pending.append(key)
+            if len(self._pending) == 1:
+                # Dispatch after everything already scheduled for this tick has queued its keys
+                loop.call_soon(self._schedule_dispatch)
+        return future
+
+    async def load_many(self, keys: List[str]) -> List[Optional[dict]]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def clear(self, key: str):
+        """Forget a cached key, e.g. after the document was written."""
+        self._futures.pop(key, None)
+
+    def _schedule_dispatch(self):
+        task = asyncio.ensure_future(self._dispatch())
+        self._dispatches.add(task)
+        task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self):
+        keys, self._pending = self._pending, []
+        self.queries += 1
+        try:
+            docs = await self.collection.find({self.key_field: {"$in": keys}}).to_list(None)
+        except Exception as e:
+            for key in keys:
+                future = self._futures.pop(key, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+
+        found = {doc[self.key_field]: doc for doc in docs}
+        for key in keys:
+            future = self._futures.get(key)
+            if future is not None and not future.done():
+                future.set_result(found.get(key))
+
+
+class RequestLoaders:
+    """The loaders of one request, each created on first use."""
+
+    COLLECTIONS = {
+        "users": ("user_collection", "user_Id"),
+        "model_tags": ("model_tags_collection", "user_Id"),
+        "brand_tags": ("brand_tags_collection", "user_Id"),
+        "files": ("file_collection", "file_id"),
+    }
+
+    def __init__(self):
+        self._loaders: Dict[str, DataLoader] = {}
+
+    def __getattr__(self, name: str) -> DataLoader:
+        if name not in self.COLLECTIONS:
+            raise AttributeError(name)
+        loader = self._loaders.get(name)
+        if loader is None:
+            collection_name, key_field = self.COLLECTIONS[name]
+            # Looked up at use time, so tests can swap the module's collections
+            loader = self._loaders[name] = DataLoader(globals()[collection_name], key_field)
+        return loader
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "lookups": sum(loader.loads for loader in self._loaders.values()),
+            "queries": sum(loader.queries for loader in self._loaders.values()),
+        }
+
+
+_request_loaders: ContextVar[Optional[RequestLoaders]] = ContextVar("request_loaders", default=None)
+
+
+def start_request_loaders() -> RequestLoaders:
+    """Give the current request its own loaders (called by the HTTP middleware)."""
+    loaders = RequestLoaders()
+    _request_loaders.set(loaders)
+    return loaders
+
+
+def request_loaders() -> RequestLoaders:
+    """The current request's loaders; outside a request (background tasks, scripts) a fresh, unshared set."""
+    return _request_loaders.get() or RequestLoaders()
@@ -0,0 +1,182 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from services.interval_index import fits, split_requirements
+
+logger = logging.getLogger(__name__)
+
+# What each cached match result is drawn from
+MODELS = "models"      # brand preference -> models_tags
+BRANDS = "brands"      # model-brand preference -> brands_tags
+PROJECTS = "projects"  # model-project preference -> projects_tags
+
+ENTRY_TTL_SECONDS = 10 * 60  # Safety net; writes normally evict entries long before this
+MAX_ENTRIES = 5000
+
+
+def canonical_signature(requirements: Dict[str, Any]) -> str:
+    """A stable key for a filter: None dropped, lists sorted, numeric ranges as [min, max]."""
+    canonical = {}
+    for field, value in requirements.items():
+        if value is None or value == [] or value == ():
+            continue
+        if isinstance(value, (list, tuple)):
+            if len(value) == 2 and all(isinstance(v, (int, float)) for v in value):
+                value = [min(value), max(value)]
+            else:
+                value = sorted(v for v in value if v is not None)
+        canonical[field] = value
+    return json.dumps(canonical, sort_keys=True, default=str)
+
+
+def query_matches(doc: dict, query: dict) -> bool:
+    """Evaluate a build_query_cross_filter query ($in, $gte/$lte, equality) against one document."""
+    for field, condition in query.items():
+        value = doc.get(field)
+        values = value if isinstance(value, list) else [value]
+        if isinstance(condition, dict):
+            if "$in" in condition and not any(v in condition["$in"] for v in values):
+                return False
+            if "$gte" in condition and not (isinstance(value, (int, float)) and value >= condition["$gte"]):
+                return False
+            if "$lte" in condition and not (isinstance(value, (int, float)) and value <= condition["$lte"]):
+                return False
+        elif condition not in values:
+            return False
+    return True
+
+
+def query_predicate(query: dict) -> Callable[[dict], bool]:
+    """Predicate for a tag-collection filter query."""
+    return lambda doc: query_matches(doc, query)
+
+
+def project_predicate(requirements: dict) -> Callable[[dict], bool]:
+    """Predicate for preference -> project matching (interval overlap semantics)."""
+    ranges, keywords = split_requirements(requirements)
+    return lambda doc: fits(*split_requirements(doc), ranges, keywords)
+
+
+class MatchCache:
+    """Match results keyed by (kind, canonical filter signature).
+
+    Users point at the signature of their current preference (plus its
+    rating_level, applied to the cached result on every hit so rating changes
+    need no invalidation), so users with the same preference share an entry. A preference write forgets only that user's
+    pointer; a tag write evicts only the entries whose filter matches the
+    document before or after the write, since only those results could change.
+    Dropping an entry drops the pointers to it, so `users` stays bounded too.
+
+    Each kind has a generation, bumped by every forget, invalidation and clear.
+    Callers read it before computing a result and pass it to `store`, which
+    discards results computed across a write instead of caching stale matches.
+    """
+
+    def __init__(self, ttl: float = ENTRY_TTL_SECONDS, max_entries: int = MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Tuple[str, str], Tuple[float, Callable[[dict], bool], List[str]]]" = OrderedDict()
+        self.users: Dict[Tuple[str, str], Tuple[str, Optional[int]]] = {}
+        self.pointers: Dict[Tuple[str, str], Set[str]] = {}  # (kind, signature) -> users pointing at it
+        self.generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.discarded = 0
+
+    def generation(self, kind: str) -> int:
+        """Read before computing a result to store; see `store`."""
+        return self.generations.get(kind, 0)
+
+    def lookup(self, kind: str, user_id: str) -> Optional[Tuple[List[str], Optional[int]]]:
+        """(cached result, rating_level) for the user's current preference, or None."""
+        signature, rating_level = self.users.get((kind, user_id), (None, None))
+        entry = self.entries.get((kind, signature)) if signature is not None else None
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end((kind, signature))
+        return list(entry[2]), rating_level
+
+    def store(self, kind: str, user_id: str, signature: str, predicate: Callable[[dict], bool], result: List[str],
+              rating_level: Optional[int] = None, generation: Optional[int] = None):
+        """Cache a result, unless a write to `kind` happened since `generation` was read."""
+        if generation is not None and generation != self.generation(kind):
+            self.discarded += 1
+            return
+        self._unpoint(kind, user_id)
+        self.users[(kind, user_id)] = (signature, rating_level)
+        self.pointers.setdefault((kind, signature), set()).add(user_id)
+        self.entries[(kind, signature)] = (time.monotonic(), predicate, list(result))
+        self.entries.move_to_end((kind, signature))
+        while len(self.entries) > self.max_entries:
+            self._drop(next(iter(self.entries)))
+            self.evictions += 1
+
+    def forget_user(self, kind: str, user_id: str):
+        """The user's preference changed: stop serving them the old signature's result."""
+        self._bump(kind)
+        self._unpoint(kind, user_id)
+
+    def invalidate(self, kind: str, *docs: Optional[dict]):
+        """A tag document was written: evict every entry whose filter matches its old or new version."""
+        self._bump(kind)
+        docs = [doc for doc in docs if doc]
+        stale = [
+            key for key, (_, predicate, _) in self.entries.items()
+            if key[0] == kind and any(predicate(doc) for doc in docs)
+        ]
+        for key in stale:
+            self._drop(key)
+        self.evictions += len(stale)
+
+    def clear(self, kind: Optional[str] = None):
+        """Drop every entry (of one kind), e.g. after a bulk delete."""
+        for cleared in (MODELS, BRANDS, PROJECTS) if kind is None else (kind,):
+            self._bump(cleared)
+        stale = [key for key in self.entries if kind is None or key[0] == kind]
+        for key in stale:
+            self._drop(key)
+        self.evictions += len(stale)
+        if kind is None:
+            self.users.clear()
+            self.pointers.clear()
+        else:
+            self.users = {key: pointer for key, pointer in self.users.items() if key[0] != kind}
+            self.pointers = {key: user_ids for key, user_ids in self.pointers.items() if key[0] != kind}
+
+    def _bump(self, kind: str):
+        self.generations[kind] = self.generation(kind) + 1
+
+    def _unpoint(self, kind: str, user_id: str):
+        signature, _ = self.users.pop((kind, user_id), (None, None))
+        user_ids = self.pointers.get((kind, signature))
+        if user_ids is not None:
+            user_ids.discard(user_id)
+            if not user_ids:
+                del self.pointers[(kind, signature)]
+
+    def _drop(self, key: Tuple[str, str]):
+        del self.entries[key]
+        for user_id in self.pointers.pop(key, ()):
+            self.users.pop((key[0], user_id), None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "users": len(self.users),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "discarded": self.discarded,
+        }
+
+
+# Process-wide cache for the *-by-user-id matching endpoints
+match_cache = MatchCache()
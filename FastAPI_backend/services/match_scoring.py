@@ -0,0 +1,272 @@
+import logging
+from typing import AsyncIterable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from services.keywords import get_keywords
+from services.tag_index import KEYWORD_FIELDS, NUMERIC_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Multi-valued keyword fields, stored as bit-packed multi-hot rows
+MULTI_VALUE_FIELDS = ("work_Field",)
+
+# Single-valued keyword fields, stored as one-hot codes (column index, -1 when missing)
+SINGLE_VALUE_FIELDS = tuple(field for field in KEYWORD_FIELDS if field not in MULTI_VALUE_FIELDS)
+
+# Relative importance of each preference field in the final score
+FIELD_WEIGHTS = {
+    "gender": 3.0,
+    "work_Field": 2.0,
+    "age": 2.0,
+    "location": 2.0,
+    "height": 1.5,
+    "experience_Level": 1.5,
+    "natural_eye_color": 1.0,
+    "body_Type": 1.0,
+    "skin_Tone": 1.0,
+    "ethnicity": 1.0,
+    "natural_hair_type": 1.0,
+    "shoe_Size": 0.5,
+    "bust_chest": 0.5,
+    "waist": 0.5,
+    "hips": 0.5,
+}
+
+# Distance outside a preferred range at which a measurement stops contributing
+RANGE_TOLERANCE = {
+    "age": 5.0,
+    "height": 10.0,
+    "shoe_Size": 3.0,
+    "bust_chest": 8.0,
+    "waist": 8.0,
+    "hips": 8.0,
+}
+
+INITIAL_CAPACITY = 1024
+
+
+class ModelScoringEngine:
+    """Columnar copy of models_tags for ranking models against a brand preference.
+
+    Every candidate is scored in one vectorized pass: keyword fields earn full
+    credit for a preferred value (multi-valued fields earn the overlap fraction),
+    measurements earn full credit inside the preferred range and lose credit
+    linearly with the distance outside it. The weighted average is in [0, 1].
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._replay: Optional[list] = None  # writes seen while an async rebuild is running
+        self.vocabularies = {
+            field: {value: position for position, value in enumerate(get_keywords(KEYWORD_FIELDS[field]))}
+            for field in KEYWORD_FIELDS
+        }
+        self.clear()
+
+    def clear(self):
+        """Drop every stored model."""
+        if self._replay is not None:
+            self._replay.append(("clear", ()))
+        self.size = 0
+        self.user_ids: List[Optional[str]] = []
+        self.rows: Dict[str, int] = {}
+        self.free_rows: List[int] = []
+        self._allocate(INITIAL_CAPACITY)
+
+    def _allocate(self, capacity: int):
+        self.capacity = capacity
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.codes = {field: np.full(capacity, -1, dtype=np.int16) for field in SINGLE_VALUE_FIELDS}
+        self.multi_hot = {field: np.zeros(capacity, dtype=np.uint64) for field in MULTI_VALUE_FIELDS}
+        self.multi_counts = {field: np.zeros(capacity, dtype=np.float32) for field in MULTI_VALUE_FIELDS}
+        self.numeric = {field: np.full(capacity, np.nan, dtype=np.float32) for field in NUMERIC_FIELDS}
+
+    def _grow(self):
+        old = (self.alive, self.codes, self.multi_hot, self.multi_counts, self.numeric)
+        self._allocate(self.capacity * 2)
+        self.alive[:self.size] = old[0][:self.size]
+        for current, previous in zip((self.codes, self.multi_hot, self.multi_counts, self.numeric), old[1:]):
+            for field, column in previous.items():
+                current[field][:self.size] = column[:self.size]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def rebuild(self, docs: Iterable[dict]):
+        """Replace the stored models with `docs` and mark the engine ready."""
+        self.clear()
+        for doc in docs:
+            self._store(doc)
+        self.ready = True
+        logger.info(f"Model scoring engine built with {len(self)} models")
+
+    async def rebuild_async(self, docs: AsyncIterable[dict]):
+        """Rebuild from an async cursor into a fresh engine and swap it in, replaying
+        writes that arrived during the scan."""
+        self._replay = []
+        try:
+            fresh = ModelScoringEngine()
+            async for doc in docs:
+                fresh._store(doc)
+            fresh.ready = True
+            replay, self._replay = self._replay, None
+            self.__dict__.update(fresh.__dict__)
+            for operation, args in replay:
+                getattr(self, operation)(*args)
+            logger.info(f"Model scoring engine built with {len(self)} models")
+        finally:
+            self._replay = None
+
+    def upsert(self, doc: dict):
+        """Store or replace the columns for one model tag document."""
+        if self._replay is not None:
+            self._replay.append(("upsert", (doc,)))
+        self._store(doc)
+
+    def _store(self, doc: dict):
+        user_id = doc.get("user_Id")
+        if not user_id:
+            return
+        row = self.rows.get(user_id)
+        if row is None:
+            if self.free_rows:
+                row = self.free_rows.pop()
+                self.user_ids[row] = user_id
+            else:
+                if self.size == self.capacity:
+                    self._grow()
+                row = self.size
+                self.size += 1
+                self.user_ids.append(user_id)
+            self.rows[user_id] = row
+
+        for field in SINGLE_VALUE_FIELDS:
+            self.codes[field][row] = self.vocabularies[field].get(doc.get(field), -1)
+        for field in MULTI_VALUE_FIELDS:
+            bits = 0
+            for value in doc.get(field) or []:
+                position = self.vocabularies[field].get(value)
+                if position is not None:
+                    bits |= 1 << position
+            self.multi_hot[field][row] = bits
+            self.multi_counts[field][row] = bin(bits).count("1")
+        for field in NUMERIC_FIELDS:
+            value = doc.get(field)
+            self.numeric[field][row] = value if isinstance(value, (int, float)) else np.nan
+        self.alive[row] = True
+
+    def remove(self, user_id: str):
+        """Forget a model (no-op if it is not stored)."""
+        if self._replay is not None:
+            self._replay.append(("remove", (user_id,)))
+        row = self.rows.pop(user_id, None)
+        if row is None:
+            return
+        self.alive[row] = False
+        self.user_ids[row] = None
+        self.free_rows.append(row)
+
+    def score(self, preference: dict) -> np.ndarray:
+        """Score every stored row against a BrandModelPreferenceData-shaped dict.
+
+        Returns one float32 score per row; removed rows score -inf.
+        """
+        size = self.size
+        total = np.zeros(size, dtype=np.float32)
+        weight_sum = 0.0
+
+        for field in SINGLE_VALUE_FIELDS:
+            wanted = preference.get(field)
+            if not wanted:
+                continue
+            weight = FIELD_WEIGHTS.get(field, 1.0)
+            # One-hot rows dotted with the preference vector == a lookup by column index;
+            # the extra trailing 0 scores missing values (code -1)
+            vector = np.zeros(len(self.vocabularies[field]) + 1, dtype=np.float32)
+            for value in wanted if isinstance(wanted, (list, tuple)) else [wanted]:
+                position = self.vocabularies[field].get(value)
+                if position is not None:
+                    vector[position] = weight
+            total += vector[self.codes[field][:size]]
+            weight_sum += weight
+
+        for field in MULTI_VALUE_FIELDS:
+            wanted = preference.get(field)
+            if not wanted:
+                continue
+            weight = FIELD_WEIGHTS.get(field, 1.0)
+            mask = 0
+            for value in wanted if isinstance(wanted, (list, tuple)) else [wanted]:
+                position = self.vocabularies[field].get(value)
+                if position is not None:
+                    mask |= 1 << position
+            overlap = np.bitwise_count(self.multi_hot[field][:size] & np.uint64(mask)).astype(np.float32)
+            # Partial credit: share of the smaller side that overlaps
+            denominator = np.minimum(self.multi_counts[field][:size], np.float32(bin(mask).count("1")))
+            np.divide(overlap, denominator, out=overlap, where=denominator > 0)
+            overlap *= np.float32(weight)
+            total += overlap
+            weight_sum += weight
+
+        for field in NUMERIC_FIELDS:
+            wanted = preference.get(field)
+            if not wanted:
+                continue
+            low, high = wanted
+            weight = FIELD_WEIGHTS.get(field, 1.0)
+            values = self.numeric[field][:size]
+            # credit = 1 - distance outside [low, high] / tolerance, clamped to [0, 1]
+            credit = np.subtract(np.float32(low), values)
+            np.maximum(credit, 0, out=credit)
+            above = np.subtract(values, np.float32(high))
+            np.maximum(above, 0, out=above)
+            credit += above
+            credit *= np.float32(-weight / RANGE_TOLERANCE[field])
+            credit += np.float32(weight)
+            np.fmax(credit, 0, out=credit)  # fmax also turns missing (NaN) values into 0
+            total += credit
+            weight_sum += weight
+
+        if weight_sum:
+            total /= np.float32(weight_sum)
+        total[~self.alive[:size]] = -np.inf
+        return total
+
+    def rank(self, preference: dict, k: int = 100, after: Optional[Tuple[float, str]] = None) -> List[Tuple[str, float]]:
+        """Return the top-k `(user_Id, score)` pairs, best first; equal scores are ordered by user_Id.
+
+        `after` is the last pair of the previous page, so ranked results can be
+        paged through with a `(score, user_Id)` cursor.
+        """
+        scores = self.score(preference)
+        if after is not None:
+            last_score, last_user_id = after
+            last_score = np.float32(last_score)
+            later = scores < last_score
+            # Within the cursor's tie group only user_Ids past it, whether or not that model is still stored
+            tied = np.flatnonzero(scores == last_score)
+            later[tied] = self._user_ids_of(tied) > last_user_id
+            scores[~later] = -np.inf
+
+        k = min(k, len(self.rows))
+        if k <= 0:
+            return []
+        if k < scores.size:
+            # Rows strictly above the k-th best score, then ties at that score in user_Id order
+            kth = np.partition(scores, scores.size - k)[scores.size - k]
+            above = np.flatnonzero(scores > kth)
+            tied = np.flatnonzero(scores == kth)
+            tied = tied[np.argsort(self._user_ids_of(tied), kind="stable")[:k - above.size]]
+            candidates = np.concatenate([above, tied])
+        else:
+            candidates = np.arange(scores.size)
+        order = candidates[np.lexsort((self._user_ids_of(candidates), -scores[candidates]))]
+        return [(self.user_ids[row], float(scores[row])) for row in order if np.isfinite(scores[row])]
+
+    def _user_ids_of(self, rows: np.ndarray) -> np.ndarray:
+        # Free rows hold None; their scores are -inf so their placeholder never reaches a result
+        return np.array([self.user_ids[row] or "" for row in rows], dtype=str)
+
+# Process-wide engine for models_tags, loaded at startup
+model_scoring_engine = ModelScoringEngine()
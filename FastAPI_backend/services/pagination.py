@@ -0,0 +1,61 @@
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, Response
+
+# Response header carrying the cursor for the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+    """Pack a sort position (e.g. {"id": ...} or {"score": ..., "id": ...}) into an opaque token."""
+    raw = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Inverse of encode_cursor; rejects tokens that were not produced by it."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(position, dict) or "id" not in position:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return position
+
+
+async def find_page(collection, query: dict, page_size: int, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    Fetch one page of `query` results in `_id` order.
+
+    The cursor is the last `_id` of the previous page, so every page is an
+    index seek (no skip) and costs the same as the first one. That needs an
+    index on the filter's equality field followed by `_id` (see
+    config.indexes); otherwise MongoDB walks `_id` or sorts every match.
+    Returns the documents and the cursor for the next page (None at the end).
+    """
+    if cursor:
+        try:
+            after = ObjectId(decode_cursor(cursor)["id"])
+        except (InvalidId, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = {"$and": [query, {"_id": {"$gt": after}}]} if query else {"_id": {"$gt": after}}
+
+    # Fetch one extra document to know whether another page exists
+    docs = await collection.find(query).sort("_id", 1).limit(page_size + 1).to_list(length=page_size + 1)
+    if len(docs) > page_size:
+        docs = docs[:page_size]
+        return docs, encode_cursor({"id": str(docs[-1]["_id"])})
+    return docs, None
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    """Expose the next-page cursor without changing the endpoint's response model."""
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -0,0 +1,58 @@
+import logging
+import random
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Uniform random float in [0, 1) stored on every tag and preference document
+RANDOM_KEY_FIELD = "rand_key"
+
+
+def with_random_key(doc: dict) -> dict:
+    """Stamp a new document with its random key before inserting it."""
+    doc[RANDOM_KEY_FIELD] = random.random()
+    return doc
+
+
+def with_random_key_on_insert(update: dict) -> dict:
+    """Give upserted documents a random key without touching the key of existing ones."""
+    if RANDOM_KEY_FIELD not in update.get("$set", {}):
+        update["$setOnInsert"] = {RANDOM_KEY_FIELD: random.random()}
+    return update
+
+
+async def sample_documents(collection, query: dict, size: int, projection: Optional[dict] = None) -> List[dict]:
+    """
+    Pick up to `size` random documents matching `query` without `$sample`.
+
+    Seeks to a random pivot on the random key and reads forward, wrapping around
+    to the start of the key range if the tail runs out. With an index on
+    (filter fields..., rand_key) both reads are an index seek plus `size` keys,
+    instead of the collection scan and in-memory shuffle `$sample` does after a
+    non-selective `$match`.
+    """
+    pivot = random.random()
+
+    def window(bound: dict) -> dict:
+        return {"$and": [query, {RANDOM_KEY_FIELD: bound}]} if query else {RANDOM_KEY_FIELD: bound}
+
+    docs = await collection.find(window({"$gte": pivot}), projection).sort(RANDOM_KEY_FIELD, 1).limit(size).to_list(length=size)
+    if len(docs) < size:
+        # Wrap around: the first keys below the pivot
+        remaining = size - len(docs)
+        docs += await collection.find(window({"$lt": pivot}), projection).sort(RANDOM_KEY_FIELD, 1).limit(remaining).to_list(length=remaining)
+    return docs
+
+
+async def backfill_random_keys(*collections):
+    """Assign random keys to documents written before they existed."""
+    for collection in collections:
+        try:
+            result = await collection.update_many(
+                {RANDOM_KEY_FIELD: {"$exists": False}},
+                [{"$set": {RANDOM_KEY_FIELD: {"$rand": {}}}}]
+            )
+            if result.modified_count:
+                logger.info(f"Assigned random keys to {result.modified_count} documents in {collection.name}")
+        except Exception as e:
+            logger.error(f"Error assigning random keys in {collection.name}: {str(e)}")
@@ -1,10 +1,18 @@
+import asyncio
+import logging
 import random
+from contextlib import asynccontextmanager
 from bson import ObjectId
+from datetime import datetime, timezone
+from pymongo import ReturnDocument, ReplaceOne, UpdateOne
 from models.rating_model import Rating
-from config.setting import rating_collection,user_collection
-from typing import Dict, Any, List
+from services.user_existence import users_are_registered
+from config.setting import rating_collection, rating_summary_collection, user_collection
+from typing import Dict, Any, List, Optional
 from collections import Counter
 
+logger = logging.getLogger(__name__)
+
 
 # Predefined rating levels and their corresponding reviews
 RATING_REVIEW_MAP = {
@@ -15,14 +23,61 @@ RATING_REVIEW_MAP = {
     5: "Very good"
 }
 
+
+class SummaryWriteGate:
+    """
+    Keeps rating writes and a rating_summary rebuild from interleaving.
+
+    Writes (a rating change plus its summary delta) run concurrently with each
+    other; a rebuild waits for the writes in flight and holds new ones back
+    until it is done, so no delta is lost under or counted twice by its
+    replacements. This only covers this process: writes handled by another
+    instance during a rebuild can still skew those users' summaries until the
+    next rebuild, so rebuild when rating traffic is quiet.
+    """
+
+    def __init__(self):
+        self.writes = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.open = asyncio.Event()
+        self.open.set()
+        self.rebuilding = asyncio.Lock()
+
+    @asynccontextmanager
+    async def write(self):
+        while not self.open.is_set():  # A rebuild may have started again before this waiter ran
+            await self.open.wait()
+        self.writes += 1
+        self.idle.clear()
+        try:
+            yield
+        finally:
+            self.writes -= 1
+            if not self.writes:
+                self.idle.set()
+
+    @asynccontextmanager
+    async def rebuild(self):
+        async with self.rebuilding:
+            self.open.clear()
+            try:
+                await self.idle.wait()
+                yield
+            finally:
+                self.open.set()
+
+
+summary_write_gate = SummaryWriteGate()
+
 async def create_rating_service(rating: Rating):
     # Validate rating level (1-5)
     if rating.rating not in RATING_REVIEW_MAP:
         return {"error": "Invalid rating level. Must be between 1 and 5."}
 
     # Check if both user_Id (receiver) and ratedBy_Id (giver) exist in user_collection
-    user_exists = await user_collection.find_one({"user_Id": rating.user_Id})
-    rated_by_exists = await user_collection.find_one({"user_Id": rating.ratedBy_Id})
+    # Both lookups go out as one $in query (if the existence filter cannot answer them)
+    user_exists, rated_by_exists = await users_are_registered([rating.user_Id, rating.ratedBy_Id])
 
     if not user_exists or not rated_by_exists:
         return {"error": "Either the user or the rating giver does not exist."}
@@ -35,7 +90,9 @@ async def create_rating_service(rating: Rating):
     rating_data = rating.model_dump()
     rating_data["rating_id"] = str(ObjectId())  # Generate unique ID
     print(rating_data)
-    await rating_collection.insert_one(rating_data)
+    async with summary_write_gate.write():
+        await rating_collection.insert_one(rating_data)
+        await _apply_rating_summary(rating.user_Id, {rating.rating: 1})
     return {"message": "Rating submitted successfully!"}
 
 
@@ -61,7 +118,15 @@ async def update_rating_service(rating_id: str, ratedBy_Id: str, update_data: Di
     
     # If there are valid fields to update, apply them
     if updated_data:
-        await rating_collection.update_one({"_id": ObjectId(rating_id)}, {"$set": updated_data})
+        # Read the pre-update document atomically so the summary moves from the right level
+        async with summary_write_gate.write():
+            previous = await rating_collection.find_one_and_update(
+                {"_id": ObjectId(rating_id)},
+                {"$set": updated_data},
+                return_document=ReturnDocument.BEFORE
+            )
+            if previous and "rating" in updated_data and previous["rating"] != updated_data["rating"]:
+                await _apply_rating_summary(previous["user_Id"], {previous["rating"]: -1, updated_data["rating"]: 1})
         return {"message": "Rating updated successfully!"}
     else:
         return {"error": "No valid fields to update."}
@@ -74,7 +139,10 @@ async def delete_rating_service(rating_id: str, ratedBy_Id: str):
     if existing_rating["ratedBy_Id"] != ratedBy_Id:
         return {"error": "You can only delete your own rating."}
     
-    await rating_collection.delete_one({"_id": ObjectId(rating_id)})
+    async with summary_write_gate.write():
+        deleted = await rating_collection.find_one_and_delete({"_id": ObjectId(rating_id)})
+        if deleted:
+            await _apply_rating_summary(deleted["user_Id"], {deleted["rating"]: -1})
     return {"message": "Rating deleted successfully!"}
 
 async def get_ratings_service(user_Id: str = None):
@@ -90,7 +158,9 @@ async def get_ratings_service(user_Id: str = None):
 # Assuming rating_collection is your MongoDB collection
 async def delete_all_ratings_service():
     # Delete all ratings in the collection
-    result = await rating_collection.delete_many({})
+    async with summary_write_gate.write():
+        result = await rating_collection.delete_many({})
+        await rating_summary_collection.delete_many({})
     return result.deleted_count 
 
 
@@ -130,8 +200,18 @@ async def generate_random_reviews_service(num_reviews: int):
         reviews.append(rating_data)
         count += 1  # Increment only when a unique review is created
 
-    # Insert all generated reviews into rating_collection
-    await rating_collection.insert_many(reviews)
+    # One summary write per rated user for the whole batch
+    deltas: Dict[str, Counter] = {}
+    for review in reviews:
+        deltas.setdefault(review["user_Id"], Counter())[review["rating"]] += 1
+
+    async with summary_write_gate.write():
+        # Insert all generated reviews into rating_collection
+        await rating_collection.insert_many(reviews)
+        await rating_summary_collection.bulk_write([
+            UpdateOne({"user_Id": user_Id}, _rating_summary_update(levels), upsert=True)
+            for user_Id, levels in deltas.items()
+        ])
 
     return {"message": f"Successfully generated {num_reviews} random reviews!"}
 
@@ -169,6 +249,24 @@ async def get_ratings_by_level_service(user_Id: str, rating_level: int):
 
     return ratings if ratings else {"message": "No ratings found at this level."}
 
+async def filter_user_ids_by_rating_level(user_ids: List[str], rating_level: int) -> List[str]:
+    """
+    Keep the user IDs that have at least one rating at `rating_level`.
+
+    Answers the whole batch with a single rating_summary lookup instead of one
+    get_ratings_by_level_service call per user; input order is preserved.
+    """
+    if not user_ids:
+        return []
+
+    rated = await rating_summary_collection.find(
+        {"user_Id": {"$in": list(user_ids)}, f"histogram.{rating_level}": {"$gt": 0}},
+        {"_id": 0, "user_Id": 1}
+    ).to_list(length=None)
+
+    rated_ids = {doc["user_Id"] for doc in rated}
+    return [user_id for user_id in user_ids if user_id in rated_ids]
+
 async def filter_users_by_most_frequent_rating(users: List[str], target_rating: int) -> List[str]:
     """
     Filter users based on their most frequent rating level.
@@ -180,23 +278,99 @@ async def filter_users_by_most_frequent_rating(users: List[str], target_rating:
     Returns:
         List of user IDs whose most frequent rating matches the target rating
     """
-    filtered_users = []
-    
-    for user_id in users:
-        # Get all ratings for this user
-        ratings = await rating_collection.find({"user_Id": user_id}).to_list(None)
-        
-        if not ratings:
-            continue  # Skip users with no ratings
-            
-        # Count the frequency of each rating
-        rating_counts = Counter(rating["rating"] for rating in ratings)
-        
-        # Get the most common rating (returns tuple of (rating, count))
-        most_common_rating = rating_counts.most_common(1)[0][0] if rating_counts else None
-        
-        # Keep user if their most frequent rating matches the target
-        if most_common_rating == target_rating:
-            filtered_users.append(user_id)
-    
-    return filtered_users
\ No newline at end of file
+    summaries = await rating_summary_collection.find(
+        {"user_Id": {"$in": list(users)}, "count": {"$gt": 0}},
+        {"_id": 0, "user_Id": 1, "histogram": 1}
+    ).to_list(length=None)
+
+    most_common = {}
+    for summary in summaries:
+        histogram = summary.get("histogram", {})
+        # Ties go to the lowest level
+        most_common[summary["user_Id"]] = max(RATING_REVIEW_MAP, key=lambda level: (histogram.get(str(level), 0), -level))
+
+    return [user_id for user_id in users if most_common.get(user_id) == target_rating]
+
+
+def _rating_summary_update(deltas: Dict[int, int]) -> list:
+    """
+    Pipeline update applying per-level count deltas to a rating_summary document.
+
+    The $inc-style additions and the recomputed mean happen in one atomic write,
+    so concurrent ratings for the same user cannot leave the mean stale.
+    """
+    count_delta = sum(deltas.values())
+    sum_delta = sum(level * delta for level, delta in deltas.items())
+    increments = {
+        "count": {"$add": [{"$ifNull": ["$count", 0]}, count_delta]},
+        "sum": {"$add": [{"$ifNull": ["$sum", 0]}, sum_delta]},
+    }
+    for level in RATING_REVIEW_MAP:
+        increments[f"histogram.{level}"] = {"$add": [{"$ifNull": [f"$histogram.{level}", 0]}, deltas.get(level, 0)]}
+    return [
+        {"$set": increments},
+        {"$set": {
+            "mean": {"$cond": [{"$gt": ["$count", 0]}, {"$divide": ["$sum", "$count"]}, 0]},
+            "updated_at": datetime.now(timezone.utc)
+        }}
+    ]
+
+async def _apply_rating_summary(user_Id: str, deltas: Dict[int, int]):
+    await rating_summary_collection.update_one({"user_Id": user_Id}, _rating_summary_update(deltas), upsert=True)
+
+def _rating_summary_document(user_Id: str, histogram: Dict[int, int], rebuild_id: Optional[str] = None) -> Dict[str, Any]:
+    """Build a full rating_summary document from per-level counts (stamped with the rebuild that wrote it, if any)."""
+    count = sum(histogram.values())
+    total = sum(level * n for level, n in histogram.items())
+    return {
+        "user_Id": user_Id,
+        "count": count,
+        "sum": total,
+        "mean": total / count if count else 0,
+        "histogram": {str(level): histogram.get(level, 0) for level in RATING_REVIEW_MAP},
+        "updated_at": datetime.now(timezone.utc),
+        **({"rebuild_id": rebuild_id} if rebuild_id else {}),
+    }
+
+async def get_rating_summary_service(user_Id: str) -> Dict[str, Any]:
+    """Count, sum, mean and per-level histogram of the ratings a user has received."""
+    summary = await rating_summary_collection.find_one({"user_Id": user_Id}, {"_id": 0})
+    if not summary:
+        return _rating_summary_document(user_Id, {})
+    return summary
+
+async def rebuild_rating_summaries_service() -> Dict[str, Any]:
+    """
+    Recompute every rating_summary document from rating_collection.
+
+    Each rebuilt summary is stamped with this run's rebuild_id; summaries
+    without it belong to users who no longer have ratings and are deleted
+    afterwards (instead of a $nin over every rated user, which outgrows a BSON
+    document). Summaries written since the rebuild started are kept.
+    """
+    async with summary_write_gate.rebuild():
+        rebuild_id, started = str(ObjectId()), datetime.now(timezone.utc)
+        histograms: Dict[str, Dict[int, int]] = {}
+        async for group in rating_collection.aggregate([
+            {"$group": {"_id": {"user_Id": "$user_Id", "rating": "$rating"}, "n": {"$sum": 1}}}
+        ]):
+            histograms.setdefault(group["_id"]["user_Id"], {})[group["_id"]["rating"]] = group["n"]
+
+        if histograms:
+            await rating_summary_collection.bulk_write([
+                ReplaceOne({"user_Id": user_Id}, _rating_summary_document(user_Id, histogram, rebuild_id), upsert=True)
+                for user_Id, histogram in histograms.items()
+            ])
+        # Drop summaries for users whose ratings have all been removed
+        stale = await rating_summary_collection.delete_many({"rebuild_id": {"$ne": rebuild_id}, "updated_at": {"$lt": started}})
+
+    logger.info(f"Rebuilt rating summaries for {len(histograms)} users")
+    return {"message": f"Rebuilt rating summaries for {len(histograms)} users", "removed": stale.deleted_count}
+
+async def ensure_rating_summaries():
+    """Build rating_summary on first start after upgrading (the collection is empty but ratings exist)."""
+    try:
+        if await rating_summary_collection.estimated_document_count() == 0 and await rating_collection.find_one({}, {"_id": 1}):
+            await rebuild_rating_summaries_service()
+    except Exception as e:
+        logger.error(f"Error building rating summaries: {str(e)}")
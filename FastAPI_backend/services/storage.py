@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+
+from config.setting import S3_MAX_POOL_CONNECTIONS, s3_client
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5 * 1024 * 1024  # S3's minimum multipart part size (every part but the last)
+S3_WORKERS = S3_MAX_POOL_CONNECTIONS  # One thread per pooled connection, kept apart from Starlette's threadpool
+CALL_TIMEOUT_SECONDS = 15  # Metadata calls and URL signing
+TRANSFER_TIMEOUT_SECONDS = 120  # Calls that carry an object or part body
+TRANSFER_METHODS = {"put_object", "upload_part", "complete_multipart_upload", "get_object"}
+
+
+class UploadTooLarge(ValueError):
+    """The upload crossed its size limit; nothing was stored."""
+
+
+class AsyncStorage:
+    """
+    Non-blocking access to the boto3 S3 client.
+
+    Calls run on a dedicated executor sized to the client's connection pool,
+    so a slow S3 never stalls the event loop or Starlette's threadpool. Each
+    call has a deadline (surfaced as a 504). `stats()` reports operations in
+    flight, queued for a worker, and per-operation counts and latency.
+    """
+
+    def __init__(self, client=None, workers: int = S3_WORKERS):
+        self._client = client  # None: the module-level s3_client
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="s3")
+        self.queued = 0
+        self.in_flight = 0
+        self.timeouts = 0
+        self.operations: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        return self._client if self._client is not None else s3_client
+
+    def _record(self, name: str, seconds: float, failed: bool):
+        with self._lock:
+            op = self.operations.setdefault(name, {"calls": 0, "failures": 0, "seconds": 0.0})
+            op["calls"] += 1
+            op["failures"] += failed
+            op["seconds"] += seconds
+
+    def _run(self, name: str, fn, args, kwargs):
+        with self._lock:
+            self.queued -= 1
+            self.in_flight += 1
+        started, failed = time.perf_counter(), True
+        try:
+            result = fn(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._record(name, time.perf_counter() - started, failed)
+
+    def _unqueue_cancelled(self, submitted):
+        # A call that timed out while still queued never reaches a worker
+        if submitted.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    async def run(self, fn, *args, name: Optional[str] = None, timeout: float = CALL_TIMEOUT_SECONDS, **kwargs):
+        """Run a blocking function on the S3 executor with a deadline."""
+        name = name or getattr(fn, "__name__", "call")
+        with self._lock:
+            self.queued += 1
+        submitted = self.executor.submit(self._run, name, fn, args, kwargs)
+        submitted.add_done_callback(self._unqueue_cancelled)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(submitted), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.error(f"S3 {name} timed out after {timeout}s")
+            raise HTTPException(status_code=504, detail="File storage timed out")
+
+    async def call(self, method: str, timeout: Optional[float] = None, **kwargs):
+        """Call an S3 client method, e.g. `await object_store.call("head_object", Bucket=..., Key=...)`."""
+        if timeout is None:
+            timeout = TRANSFER_TIMEOUT_SECONDS if method in TRANSFER_METHODS else CALL_TIMEOUT_SECONDS
+        return await self.run(getattr(self.client, method), name=method, timeout=timeout, **kwargs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            operations = {
+                name: {**op, "avg_ms": round(op["seconds"] / op["calls"] * 1000, 2) if op["calls"] else 0.0}
+                for name, op in self.operations.items()
+            }
+            return {
+                "workers": self.workers,
+                "in_flight": self.in_flight,
+                "queued": max(self.queued, 0),
+                "timeouts": self.timeouts,
+                "operations": operations,
+            }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Process-wide S3 access used by every file service (executor shut down in main.py lifespan)
+object_store = AsyncStorage()
+
+
+async def stream_upload(file, bucket: str, key: str, content_type: str, max_size: int) -> int:
+    """
+    Copy an UploadFile to S3 one chunk at a time and return its size.
+
+    Only one chunk is held in memory. Files that fit in a single chunk are
+    written with one PUT; larger ones go through a multipart upload. Crossing
+    `max_size` stops reading at once, aborts the multipart upload and raises
+    UploadTooLarge.
+    """
+    chunk = await file.read(CHUNK_SIZE)
+    size = len(chunk)
+    if size > max_size:
+        raise UploadTooLarge(size)
+    if size < CHUNK_SIZE:
+        await object_store.call("put_object", Bucket=bucket, Key=key, Body=chunk, ContentType=content_type)
+        return size
+
+    upload = await object_store.call("create_multipart_upload", Bucket=bucket, Key=key, ContentType=content_type)
+    upload_id = upload["UploadId"]
+    parts = []
+    try:
+        while chunk:
+            part = await object_store.call(
+                "upload_part", Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=len(parts) + 1, Body=chunk
+            )
+            parts.append({"PartNumber": len(parts) + 1, "ETag": part["ETag"]})
+
+            chunk = await file.read(CHUNK_SIZE)
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLarge(size)
+
+        await object_store.call(
+            "complete_multipart_upload", Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+        )
+    except BaseException:
+        try:
+            await object_store.call("abort_multipart_upload", Bucket=bucket, Key=key, UploadId=upload_id)
+        except Exception as e:
+            logger.error(f"Error aborting multipart upload of {key}: {str(e)}")  # S3 lifecycle rules reclaim the parts
+        raise
+
+    logger.info(f"Streamed {size} bytes to {key} in {len(parts)} parts")
+    return size
@@ -0,0 +1,348 @@
+import asyncio
+import logging
+import math
+import random
+from bisect import bisect_left, bisect_right, insort
+from typing import AsyncIterable, Dict, Iterable, Iterator, List, Optional
+
+from services.keywords import get_keywords
+
+logger = logging.getLogger(__name__)
+
+# Model tag fields answered from keyword bitmaps (field -> keyword category)
+KEYWORD_FIELDS = {
+    "natural_eye_color": "natural_eye_colors",
+    "body_Type": "body_types",
+    "work_Field": "work_fields",
+    "skin_Tone": "skin_tones",
+    "ethnicity": "ethnicities",
+    "natural_hair_type": "natural_hair_types",
+    "experience_Level": "experience_levels",
+    "gender": "genders",
+    "location": "locations",
+}
+
+# Model tag fields answered from sorted value arrays
+NUMERIC_FIELDS = ("age", "height", "shoe_Size", "bust_chest", "waist", "hips")
+
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+CHUNK_BYTES = (1 << CHUNK_BITS) // 8
+
+
+class UnsupportedQuery(Exception):
+    """Raised when a query uses a field or operator the index cannot answer."""
+
+
+class Bitmap:
+    """Roaring-style bitmap: doc ids are split into 2^16 wide chunks keyed by
+    their high bits, and each chunk is stored as an int bitset."""
+
+    __slots__ = ("chunks",)
+
+    def __init__(self, chunks: Optional[Dict[int, int]] = None):
+        self.chunks = chunks if chunks is not None else {}
+
+    @classmethod
+    def from_ids(cls, ids: Iterable[int]) -> "Bitmap":
+        # Set bits in per-chunk bytearrays and convert once; OR-ing into a large int
+        # per id would copy the whole chunk every time
+        buffers: Dict[int, bytearray] = {}
+        for doc_id in ids:
+            key = doc_id >> CHUNK_BITS
+            buffer = buffers.get(key)
+            if buffer is None:
+                buffer = buffers[key] = bytearray(CHUNK_BYTES)
+            offset = doc_id & CHUNK_MASK
+            buffer[offset >> 3] |= 1 << (offset & 7)
+        chunks = {key: int.from_bytes(buffer, "little") for key, buffer in buffers.items()}
+        return cls({key: chunk for key, chunk in chunks.items() if chunk})
+
+    def add(self, doc_id: int):
+        key = doc_id >> CHUNK_BITS
+        self.chunks[key] = self.chunks.get(key, 0) | (1 << (doc_id & CHUNK_MASK))
+
+    def discard(self, doc_id: int):
+        key = doc_id >> CHUNK_BITS
+        if key in self.chunks:
+            chunk = self.chunks[key] & ~(1 << (doc_id & CHUNK_MASK))
+            if chunk:
+                self.chunks[key] = chunk
+            else:
+                del self.chunks[key]
+
+    def __contains__(self, doc_id: int) -> bool:
+        return bool(self.chunks.get(doc_id >> CHUNK_BITS, 0) >> (doc_id & CHUNK_MASK) & 1)
+
+    def __len__(self) -> int:
+        return sum(chunk.bit_count() for chunk in self.chunks.values())
+
+    def __bool__(self) -> bool:
+        return bool(self.chunks)
+
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        small, large = (self, other) if len(self.chunks) <= len(other.chunks) else (other, self)
+        chunks = {}
+        for key, chunk in small.chunks.items():
+            merged = chunk & large.chunks.get(key, 0)
+            if merged:
+                chunks[key] = merged
+        return Bitmap(chunks)
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        chunks = dict(self.chunks)
+        for key, chunk in other.chunks.items():
+            chunks[key] = chunks.get(key, 0) | chunk
+        return Bitmap(chunks)
+
+    def __iter__(self) -> Iterator[int]:
+        for key in sorted(self.chunks):
+            base = key << CHUNK_BITS
+            # Scan the reversed binary string so bit positions are found at C speed
+            bits = format(self.chunks[key], "b")[::-1]
+            position = bits.find("1")
+            while position != -1:
+                yield base + position
+                position = bits.find("1", position + 1)
+
+    def sample(self, size: int) -> List[int]:
+        """Pick up to `size` distinct doc ids uniformly at random."""
+        total = len(self)
+        if total <= size:
+            return list(self)
+        universe = (max(self.chunks) + 1) << CHUNK_BITS
+        if total * 16 < universe:
+            return random.sample(list(self), size)
+        # Dense result: rejection-sample random ids instead of materialising the set
+        picked = set()
+        while len(picked) < size:
+            doc_id = random.randrange(universe)
+            if doc_id in self:
+                picked.add(doc_id)
+        return list(picked)
+
+
+
+class TagBitmapIndex:
+    """In-process index over ModelTagData documents.
+
+    Keyword fields get one bitmap per value. Numeric fields keep a sorted array of
+    their distinct values, each with its own bitmap, so a range is a bisection
+    followed by an OR of the bitmaps in the slice. Queries are the dicts produced
+    by `build_query`, so the index is a drop-in for the `$match` stage.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._replay: Optional[list] = None  # writes seen while an async rebuild is running
+        self.clear()
+
+    def clear(self):
+        """Drop every indexed document."""
+        if self._replay is not None:
+            self._replay.append(("clear", ()))
+        self.keyword_bitmaps: Dict[str, Dict[str, Bitmap]] = {
+            field: {value: Bitmap() for value in get_keywords(category)}
+            for field, category in KEYWORD_FIELDS.items()
+        }
+        self.numeric_values: Dict[str, List[int]] = {field: [] for field in NUMERIC_FIELDS}
+        self.numeric_bitmaps: Dict[str, Dict[int, Bitmap]] = {field: {} for field in NUMERIC_FIELDS}
+        self.alive = Bitmap()
+        self.doc_ids: Dict[str, int] = {}  # user_Id -> dense doc id
+        self.user_ids: List[Optional[str]] = []  # dense doc id -> user_Id
+        self.postings: List[Optional[dict]] = []  # indexed values per doc id, for removal
+        self.free_ids: List[int] = []
+
+    def rebuild(self, docs: Iterable[dict]):
+        """Replace the index contents with `docs` and mark it ready."""
+        self.clear()
+        pending: Dict[tuple, List[int]] = {}
+        for doc in docs:
+            self._index(doc, pending=pending)
+        for _ in self._finish_rebuild(pending):
+            pass
+
+    async def rebuild_async(self, docs: AsyncIterable[dict]):
+        """Rebuild from an async cursor without blocking the event loop for the whole scan.
+
+        Documents are indexed into a fresh instance that is swapped in at the end;
+        writes that arrive meanwhile are replayed on top of it.
+        """
+        self._replay = []
+        try:
+            fresh = TagBitmapIndex()
+            pending: Dict[tuple, List[int]] = {}
+            async for doc in docs:
+                fresh._index(doc, pending=pending)
+            for _ in fresh._finish_rebuild(pending):
+                await asyncio.sleep(0)  # let requests run between bitmap builds
+            replay, self._replay = self._replay, None
+            self.__dict__.update(fresh.__dict__)
+            for operation, args in replay:
+                getattr(self, operation)(*args)
+        finally:
+            self._replay = None
+
+    def _finish_rebuild(self, pending: Dict[tuple, List[int]]):
+        """Turn the collected postings into bitmaps, yielding after each one."""
+        for (field, value), doc_ids in pending.items():
+            bitmaps = self.keyword_bitmaps[field] if field in KEYWORD_FIELDS else self.numeric_bitmaps[field]
+            bitmaps[value] = Bitmap.from_ids(doc_ids)
+            yield
+        for field, bitmaps in self.numeric_bitmaps.items():
+            self.numeric_values[field] = sorted(bitmaps)
+        self.alive = Bitmap.from_ids(self.doc_ids.values())
+        self.ready = True
+        logger.info(f"Model tag index built with {len(self)} documents")
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def upsert(self, doc: dict):
+        """Index a tag document, replacing any previous version for the same user_Id."""
+        if self._replay is not None:
+            self._replay.append(("upsert", (doc,)))
+        self._index(doc)
+
+    def _index(self, doc: dict, pending: Optional[Dict[tuple, List[int]]] = None):
+        user_id = doc.get("user_Id")
+        if not user_id:
+            return
+        if user_id in self.doc_ids:
+            doc_id = self.doc_ids[user_id]
+            self._unindex(doc_id)
+        else:
+            doc_id = self.free_ids.pop() if self.free_ids else len(self.user_ids)
+            if doc_id == len(self.user_ids):
+                self.user_ids.append(user_id)
+                self.postings.append(None)
+            else:
+                self.user_ids[doc_id] = user_id
+            self.doc_ids[user_id] = doc_id
+
+        postings = {}
+        for field in KEYWORD_FIELDS:
+            value = doc.get(field)
+            if not value:
+                continue
+            values = list(value) if isinstance(value, (list, tuple)) else [value]
+            postings[field] = values
+            bitmaps = self.keyword_bitmaps[field]
+            for item in values:
+                if pending is not None:
+                    pending.setdefault((field, item), []).append(doc_id)
+                else:
+                    bitmaps.setdefault(item, Bitmap()).add(doc_id)
+        for field in NUMERIC_FIELDS:
+            value = doc.get(field)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                value = int(value)
+                postings[field] = value
+                if pending is not None:
+                    pending.setdefault((field, value), []).append(doc_id)
+                    continue
+                bitmaps = self.numeric_bitmaps[field]
+                if value not in bitmaps:
+                    bitmaps[value] = Bitmap()
+                    insort(self.numeric_values[field], value)
+                bitmaps[value].add(doc_id)
+        self.postings[doc_id] = postings
+        if pending is None:
+            self.alive.add(doc_id)
+
+    def remove(self, user_id: str):
+        """Drop a user's tag document from the index (no-op if it is not indexed)."""
+        if self._replay is not None:
+            self._replay.append(("remove", (user_id,)))
+        doc_id = self.doc_ids.pop(user_id, None)
+        if doc_id is None:
+            return
+        self._unindex(doc_id)
+        self.alive.discard(doc_id)
+        self.user_ids[doc_id] = None
+        self.free_ids.append(doc_id)
+
+    def _unindex(self, doc_id: int):
+        postings = self.postings[doc_id] or {}
+        for field, value in postings.items():
+            if field in KEYWORD_FIELDS:
+                for item in value:
+                    self.keyword_bitmaps[field][item].discard(doc_id)
+            else:
+                bitmap = self.numeric_bitmaps[field][value]
+                bitmap.discard(doc_id)
+                if not bitmap:
+                    del self.numeric_bitmaps[field][value]
+                    values = self.numeric_values[field]
+                    del values[bisect_left(values, value)]
+        self.postings[doc_id] = None
+
+    def _numeric_range(self, field: str, condition) -> Bitmap:
+        if isinstance(condition, dict):
+            if not set(condition) <= {"$gte", "$lte"}:
+                raise UnsupportedQuery(field)
+            low, high = condition.get("$gte"), condition.get("$lte")
+        elif isinstance(condition, (int, float)) and not isinstance(condition, bool):
+            low = high = condition
+        else:
+            raise UnsupportedQuery(field)
+        values = self.numeric_values[field]
+        start = 0 if low is None else bisect_left(values, math.ceil(low))
+        end = len(values) if high is None else bisect_right(values, math.floor(high))
+        bitmaps = self.numeric_bitmaps[field]
+        result = Bitmap()
+        for value in values[start:end]:
+            result = result | bitmaps[value]
+        return result
+
+    def _keyword_values(self, field: str, values) -> Bitmap:
+        bitmaps = self.keyword_bitmaps[field]
+        result = Bitmap()
+        for value in values:
+            if value in bitmaps:
+                result = result | bitmaps[value]
+        return result
+
+    def _match_field(self, field: str, condition) -> Bitmap:
+        if field == "user_Id":
+            if isinstance(condition, dict):
+                if set(condition) != {"$in"}:
+                    raise UnsupportedQuery(field)
+                user_ids = condition["$in"]
+            else:
+                user_ids = [condition]
+            return Bitmap.from_ids(self.doc_ids[u] for u in user_ids if u in self.doc_ids)
+
+        if field in KEYWORD_FIELDS:
+            if isinstance(condition, dict):
+                if set(condition) != {"$in"}:
+                    raise UnsupportedQuery(field)
+                return self._keyword_values(field, condition["$in"])
+            if isinstance(condition, list):
+                raise UnsupportedQuery(field)  # whole-array equality is not indexed
+            return self._keyword_values(field, [condition])
+
+        if field in NUMERIC_FIELDS:
+            return self._numeric_range(field, condition)
+
+        raise UnsupportedQuery(field)
+
+    def match(self, query: dict) -> Bitmap:
+        """Evaluate a `build_query` style filter and return the matching doc ids."""
+        result = self.alive
+        for field, condition in query.items():
+            result = result & self._match_field(field, condition)
+            if not result:
+                break
+        return result
+
+    def count(self, query: dict) -> int:
+        return len(self.match(query))
+
+    def sample_user_ids(self, query: dict, size: int) -> List[str]:
+        """Return up to `size` random user_Ids matching `query` (the `$match` + `$sample` equivalent)."""
+        return [self.user_ids[doc_id] for doc_id in self.match(query).sample(size)]
+
+
+# Process-wide index for models_tags, loaded at startup
+model_tag_index = TagBitmapIndex()
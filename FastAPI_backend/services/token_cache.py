@@ -0,0 +1,72 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+MAX_TOKENS = 10_000
+
+
+def token_digest(token: str) -> bytes:
+    """Cache key for a token; the token itself is never kept in memory."""
+    return hashlib.sha256(token.encode()).digest()
+
+
+class VerifiedTokenCache:
+    """
+    LRU of verified JWT claims keyed by the token's SHA-256, each entry
+    expiring at the token's own `exp`.
+
+    A hit skips the RS256 signature check entirely; the CPU time that check
+    took when the token was first verified is credited as saved on every hit.
+    """
+
+    def __init__(self, max_tokens: int = MAX_TOKENS):
+        self.max_tokens = max_tokens
+        self.entries: "OrderedDict[bytes, Tuple[Dict[str, Any], float, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.cpu_seconds_saved = 0.0
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        digest = token_digest(token)
+        entry = self.entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        claims, expires_at, verify_cpu_seconds = entry
+        if time.time() >= expires_at:
+            del self.entries[digest]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(digest)
+        self.hits += 1
+        self.cpu_seconds_saved += verify_cpu_seconds
+        return dict(claims)
+
+    def put(self, token: str, claims: Dict[str, Any], verify_cpu_seconds: float = 0.0):
+        """Remember claims that were just verified (tokens without a numeric `exp` are not cached)."""
+        expires_at = claims.get("exp")
+        if not isinstance(expires_at, (int, float)) or expires_at <= time.time():
+            return
+        digest = token_digest(token)
+        self.entries[digest] = (dict(claims), float(expires_at), verify_cpu_seconds)
+        self.entries.move_to_end(digest)
+        while len(self.entries) > self.max_tokens:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "tokens": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "cpu_seconds_saved": round(self.cpu_seconds_saved, 6),
+        }
+
+
+# Process-wide cache used by the Auth0 token dependencies
+verified_tokens = VerifiedTokenCache()
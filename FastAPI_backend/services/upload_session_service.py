@@ -0,0 +1,332 @@
+import asyncio
+import logging
+import math
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterable, Optional
+
+from botocore.exceptions import ClientError
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from config.setting import AWS_BUCKET_NAME, AWS_REGION, file_collection, upload_sessions_collection
+from models.file_model import DirectUploadTicket, UploadSessionRequest, UploadSessionStatus
+from services.image_derivatives import schedule_derivatives
+from services.storage import object_store
+from services.file_service import ALLOWED_FILE_TYPES, ALLOWED_FOLDERS, MAX_FILE_SIZE, _validate_project, _validate_user
+
+logger = logging.getLogger(__name__)
+
+PART_SIZE = 8 * 1024 * 1024  # Above S3's 5MB minimum; one part is buffered per request
+MAX_PARTS = 10_000  # S3's limit on parts per upload
+MAX_VIDEO_FILE_SIZE = 2 * 1024 * 1024 * 1024  # Portfolio reels; other folders keep the 25MB limit
+DIRECT_UPLOAD_EXPIRES_SECONDS = 15 * 60  # Lifetime of a presigned POST policy
+SESSION_TTL = timedelta(hours=24)  # Sessions idle this long are aborted by the GC
+COMPLETING_TTL = timedelta(days=7)  # Claimed sessions are only reclaimed after a crashed completion
+GC_INTERVAL_SECONDS = 60 * 60
+
+
+def _max_file_size(folder: str) -> int:
+    return MAX_VIDEO_FILE_SIZE if folder == "video" else MAX_FILE_SIZE
+
+
+def _part_layout(file_size: int):
+    """(part_size, total_parts) for a file, growing parts past 8MB only when S3's part cap requires it."""
+    part_size = max(PART_SIZE, math.ceil(file_size / MAX_PARTS))
+    return part_size, math.ceil(file_size / part_size)
+
+
+def _expected_part_size(session: dict, part_number: int) -> int:
+    if part_number < session["total_parts"]:
+        return session["part_size"]
+    return session["file_size"] - session["part_size"] * (session["total_parts"] - 1)
+
+
+def _status(session: dict) -> UploadSessionStatus:
+    return UploadSessionStatus(
+        session_id=session["session_id"],
+        file_id=session["file_id"],
+        file_size=session["file_size"],
+        part_size=session["part_size"],
+        total_parts=session["total_parts"],
+        uploaded_parts=sorted(int(number) for number in session.get("parts", {})),
+        expires_at=session["updated_at"] + SESSION_TTL,
+    )
+
+
+async def _get_session(session_id: str, user_id: str, multipart: Optional[bool] = True) -> dict:
+    """The caller's session; `multipart` picks resumable (True) or direct (False) sessions, None accepts both."""
+    session = await upload_sessions_collection.find_one({"session_id": session_id})
+    if not session or (multipart is not None and bool(session.get("upload_id")) != multipart):
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    if session["user_id"] != user_id:
+        logger.warning(f"Unauthorized upload session access by {user_id} for {session_id}")
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    return session
+
+
+async def _validate_upload_request(request: UploadSessionRequest):
+    """The checks upload_file makes, run before any bytes are sent."""
+    if not await _validate_user(request.user_id):
+        logger.warning(f"Upload session attempt by non-existent user: {request.user_id}")
+        raise HTTPException(status_code=404, detail="User not found")
+
+    if request.project_id is not None and not await _validate_project(request.project_id):
+        logger.warning(f"Upload session attempt by non-existent project: {request.project_id}")
+        raise HTTPException(status_code=404, detail="project not found")
+
+    if request.folder not in ALLOWED_FOLDERS:
+        logger.warning(f"Invalid folder attempt by {request.user_id}: {request.folder}")
+        raise HTTPException(status_code=400, detail="Invalid folder name")
+
+    if request.file_type not in ALLOWED_FILE_TYPES:
+        logger.warning(f"Unsupported file type upload attempt: {request.file_type} by {request.user_id}")
+        raise HTTPException(status_code=400, detail="Unsupported file type")
+
+    max_size = _max_file_size(request.folder)
+    if request.file_size > max_size:
+        logger.warning(f"File size exceeded by {request.user_id}: {request.file_name} ({request.file_size} bytes)")
+        raise HTTPException(status_code=400, detail=f"File size exceeds {max_size // (1024 * 1024)}MB limit")
+
+
+async def _record_file(session: dict, file_size: int) -> str:
+    """Write the file_collection record for a finished upload (same shape as upload_file) and close the session."""
+    s3_url = f"https://{AWS_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{session['file_key']}"
+    file_metadata = {
+        "file_id": session["file_id"],
+        "file_name": session["file_name"],
+        "file_type": session["file_type"],
+        "file_size": file_size,
+        "uploaded_at": datetime.now(timezone.utc),
+        "s3_url": s3_url,
+        "uploaded_by": session["user_id"],
+        "folder": session["folder"],
+        "is_private": session["is_private"],
+        "description": session["description"],
+        "project_id": session["project_id"]
+    }
+    await file_collection.insert_one(file_metadata)
+    await upload_sessions_collection.delete_one({"session_id": session["session_id"]})
+    schedule_derivatives(session["file_id"], session["file_key"], session["folder"], session["file_type"])
+    return s3_url
+
+
+async def initiate_upload_session(request: UploadSessionRequest) -> UploadSessionStatus:
+    """Validate the upload up front and open an S3 multipart upload for it."""
+    await _validate_upload_request(request)
+
+    file_id = str(uuid.uuid4())
+    file_key = f"{request.folder}/{file_id}_{request.file_name}"
+    upload = await object_store.call(
+        "create_multipart_upload", Bucket=AWS_BUCKET_NAME, Key=file_key, ContentType=request.file_type
+    )
+
+    part_size, total_parts = _part_layout(request.file_size)
+    now = datetime.now(timezone.utc)
+    session = {
+        **request.model_dump(),
+        "session_id": str(uuid.uuid4()),
+        "upload_id": upload["UploadId"],
+        "file_id": file_id,
+        "file_key": file_key,
+        "part_size": part_size,
+        "total_parts": total_parts,
+        "parts": {},
+        "created_at": now,
+        "updated_at": now,
+    }
+    await upload_sessions_collection.insert_one(session)
+    logger.info(f"Upload session {session['session_id']} opened by {request.user_id}: {request.file_name} in {total_parts} parts")
+    return _status(session)
+
+
+async def upload_session_part(session_id: str, part_number: int, user_id: str, body: AsyncIterable[bytes]) -> UploadSessionStatus:
+    """Store one part. Parts may arrive in any order and in parallel; re-sending a part replaces it."""
+    session = await _get_session(session_id, user_id)
+    if not 1 <= part_number <= session["total_parts"]:
+        raise HTTPException(status_code=400, detail=f"Part number must be between 1 and {session['total_parts']}")
+
+    expected = _expected_part_size(session, part_number)
+    data = bytearray()
+    async for chunk in body:
+        data.extend(chunk)
+        if len(data) > expected:
+            raise HTTPException(status_code=400, detail=f"Part {part_number} must be {expected} bytes")
+    if len(data) != expected:
+        raise HTTPException(status_code=400, detail=f"Part {part_number} must be {expected} bytes")
+
+    part = await object_store.call(
+        "upload_part",
+        Bucket=AWS_BUCKET_NAME, Key=session["file_key"], UploadId=session["upload_id"], PartNumber=part_number, Body=bytes(data)
+    )
+
+    # Each part is its own field, so parallel parts never overwrite each other
+    session = await upload_sessions_collection.find_one_and_update(
+        {"session_id": session_id, "completing": {"$ne": True}},
+        {"$set": {f"parts.{part_number}": {"etag": part["ETag"], "size": expected}, "updated_at": datetime.now(timezone.utc)}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not session:
+        raise HTTPException(status_code=409, detail="Upload session is completing or no longer exists")
+    return _status(session)
+
+
+async def get_upload_session(session_id: str, user_id: str) -> UploadSessionStatus:
+    """Which parts are stored, so an interrupted client can resume with the rest."""
+    return _status(await _get_session(session_id, user_id))
+
+
+async def complete_upload_session(session_id: str, user_id: str):
+    """Assemble the parts in S3 and only then record the file in file_collection."""
+    await _get_session(session_id, user_id)
+
+    # Claim the session so a second complete (or a late part) cannot race this one
+    session = await upload_sessions_collection.find_one_and_update(
+        {"session_id": session_id, "completing": {"$ne": True}},
+        {"$set": {"completing": True, "updated_at": datetime.now(timezone.utc)}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not session:
+        raise HTTPException(status_code=409, detail="Upload session is already completing")
+
+    missing = [n for n in range(1, session["total_parts"] + 1) if str(n) not in session.get("parts", {})]
+    if missing:
+        await upload_sessions_collection.update_one({"session_id": session_id}, {"$set": {"completing": False}})
+        raise HTTPException(status_code=400, detail=f"Missing parts: {missing[:20]}")
+
+    parts = [{"PartNumber": n, "ETag": session["parts"][str(n)]["etag"]} for n in range(1, session["total_parts"] + 1)]
+    try:
+        await object_store.call(
+            "complete_multipart_upload",
+            Bucket=AWS_BUCKET_NAME, Key=session["file_key"], UploadId=session["upload_id"], MultipartUpload={"Parts": parts}
+        )
+    except Exception:
+        await upload_sessions_collection.update_one({"session_id": session_id}, {"$set": {"completing": False}})
+        raise
+
+    s3_url = await _record_file(session, session["file_size"])
+    logger.info(f"Upload session {session_id} completed by {user_id}: {session['file_name']} ({session['file_size']} bytes)")
+
+    return {"message": "File uploaded successfully", "file_url": s3_url}
+
+
+async def _abort(session: dict):
+    try:
+        if session.get("upload_id"):
+            await object_store.call(
+                "abort_multipart_upload", Bucket=AWS_BUCKET_NAME, Key=session["file_key"], UploadId=session["upload_id"]
+            )
+        else:
+            # Direct upload: the client may have posted the object without ever calling complete
+            await object_store.call("delete_object", Bucket=AWS_BUCKET_NAME, Key=session["file_key"])
+    except Exception as e:
+        logger.error(f"Error aborting upload of {session['file_key']}: {str(e)}")  # S3 lifecycle rules reclaim the parts
+    await upload_sessions_collection.delete_one({"session_id": session["session_id"]})
+
+
+async def abort_upload_session(session_id: str, user_id: str):
+    """Drop the session and every part stored so far."""
+    session = await _get_session(session_id, user_id, multipart=None)
+    await _abort(session)
+    logger.info(f"Upload session {session_id} aborted by {user_id}")
+    return {"message": "Upload session aborted"}
+
+
+async def initiate_direct_upload(request: UploadSessionRequest) -> DirectUploadTicket:
+    """
+    Presigned POST straight to S3, so the bytes never pass through the API.
+
+    The policy pins the key and Content-Type and bounds the size with a
+    content-length-range condition, so S3 itself rejects anything else.
+    """
+    await _validate_upload_request(request)
+
+    file_id = str(uuid.uuid4())
+    file_key = f"{request.folder}/{file_id}_{request.file_name}"
+    post = await object_store.call(
+        "generate_presigned_post",
+        Bucket=AWS_BUCKET_NAME,
+        Key=file_key,
+        Fields={"Content-Type": request.file_type},
+        Conditions=[{"Content-Type": request.file_type}, ["content-length-range", 1, request.file_size]],
+        ExpiresIn=DIRECT_UPLOAD_EXPIRES_SECONDS,
+    )
+
+    now = datetime.now(timezone.utc)
+    session = {
+        **request.model_dump(),
+        "session_id": str(uuid.uuid4()),
+        "upload_id": None,  # Not a multipart upload
+        "file_id": file_id,
+        "file_key": file_key,
+        "created_at": now,
+        "updated_at": now,
+    }
+    await upload_sessions_collection.insert_one(session)
+    logger.info(f"Direct upload {session['session_id']} signed for {request.user_id}: {request.file_name}")
+    return DirectUploadTicket(
+        session_id=session["session_id"],
+        file_id=file_id,
+        url=post["url"],
+        fields=post["fields"],
+        expires_at=now + timedelta(seconds=DIRECT_UPLOAD_EXPIRES_SECONDS),
+    )
+
+
+async def complete_direct_upload(session_id: str, user_id: str):
+    """Callback after the client's POST: check the stored object, then record it."""
+    await _get_session(session_id, user_id, multipart=False)
+
+    # Claim the session so a repeated callback cannot record the file twice
+    session = await upload_sessions_collection.find_one_and_update(
+        {"session_id": session_id, "completing": {"$ne": True}},
+        {"$set": {"completing": True, "updated_at": datetime.now(timezone.utc)}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not session:
+        raise HTTPException(status_code=409, detail="Upload is already completing")
+
+    try:
+        head = await object_store.call("head_object", Bucket=AWS_BUCKET_NAME, Key=session["file_key"])
+    except ClientError as e:
+        await upload_sessions_collection.update_one({"session_id": session_id}, {"$set": {"completing": False}})
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            raise HTTPException(status_code=400, detail="File has not been uploaded")
+        raise
+
+    file_size = head["ContentLength"]
+    if head.get("ContentType") != session["file_type"] or not 0 < file_size <= session["file_size"]:
+        # Only possible if the policy was bypassed; do not keep what was stored
+        logger.warning(f"Direct upload {session_id} by {user_id} does not match its policy ({head.get('ContentType')}, {file_size} bytes)")
+        await _abort(session)
+        raise HTTPException(status_code=400, detail="Uploaded file does not match the upload request")
+
+    s3_url = await _record_file(session, file_size)
+    logger.info(f"Direct upload {session_id} completed by {user_id}: {session['file_name']} ({file_size} bytes)")
+
+    return {"message": "File uploaded successfully", "file_url": s3_url}
+
+
+async def expire_stale_upload_sessions(now: Optional[datetime] = None) -> int:
+    """Abort sessions idle for longer than SESSION_TTL; returns how many were dropped.
+    Sessions claimed by a complete are left to it unless the claim is older than COMPLETING_TTL."""
+    now = now or datetime.now(timezone.utc)
+    stale = await upload_sessions_collection.find({"$or": [
+        {"updated_at": {"$lt": now - SESSION_TTL}, "completing": {"$ne": True}},
+        {"updated_at": {"$lt": now - COMPLETING_TTL}},
+    ]}).to_list(None)
+    for session in stale:
+        await _abort(session)
+    if stale:
+        logger.info(f"Expired {len(stale)} stale upload sessions")
+    return len(stale)
+
+
+async def run_upload_session_gc():
+    """Periodically expire stale upload sessions (run as a lifespan task)."""
+    while True:
+        try:
+            await expire_stale_upload_sessions()
+        except Exception as e:
+            logger.error(f"Error expiring upload sessions: {str(e)}")
+        await asyncio.sleep(GC_INTERVAL_SECONDS)
@@ -0,0 +1,120 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from config.setting import AWS_BUCKET_NAME
+from services.storage import object_store
+
+logger = logging.getLogger(__name__)
+
+PRIVATE_URL_EXPIRATION = 60 * 60  # Private files: same lifetime as before
+PUBLIC_URL_EXPIRATION = 7 * 24 * 60 * 60  # Public files: SigV4's maximum, so one URL (and its cached bytes) lasts days
+SAFETY_MARGIN = 0.25  # Re-sign once this fraction of a URL's lifetime is left, so handed-out URLs stay usable
+MAX_URLS = 100_000
+# Unsigned base URL for public files (e.g. a CDN in front of the bucket); public URLs are signed when unset
+PUBLIC_FILES_BASE_URL = os.getenv("PUBLIC_FILES_BASE_URL")
+
+# (file_key, response content type or None, public)
+UrlRequest = Tuple[str, Optional[str], bool]
+
+
+def sign_url(file_key: str, file_type: Optional[str], expiration: int) -> Optional[str]:
+    """Generate a pre-signed GET URL (blocking; served inline as `file_type` when given)."""
+    params = {"Bucket": AWS_BUCKET_NAME, "Key": file_key}
+    if file_type:
+        params.update({"ResponseContentDisposition": "inline", "ResponseContentType": file_type})
+    try:
+        return object_store.client.generate_presigned_url("get_object", Params=params, ExpiresIn=expiration)
+    except Exception as e:
+        logger.error(f"Error generating presigned URL: {e}")
+        return None
+
+
+def _sign_batch(requests: List[UrlRequest]) -> List[Tuple[Optional[str], float]]:
+    """Sign every request in one executor hop; returns (url, reusable_until) pairs."""
+    signed = []
+    for file_key, file_type, public in requests:
+        expiration = PUBLIC_URL_EXPIRATION if public else PRIVATE_URL_EXPIRATION
+        url = sign_url(file_key, file_type, expiration)
+        signed.append((url, time.time() + expiration * (1 - SAFETY_MARGIN)))
+    return signed
+
+
+class URLSigner:
+    """
+    Presigned GET URLs cached per (file_key, content type, visibility).
+
+    A cached URL is handed out until a safety margin before it expires, so a
+    page view re-uses the URLs of the previous one (and the browser re-uses
+    the bytes). Misses from one listing are signed together off the event
+    loop. Public files get unsigned URLs when PUBLIC_FILES_BASE_URL is set.
+    """
+
+    def __init__(self, max_urls: int = MAX_URLS):
+        self.max_urls = max_urls
+        self.entries: "OrderedDict[UrlRequest, Tuple[str, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+
+    def _cached(self, request: UrlRequest, now: float) -> Optional[str]:
+        entry = self.entries.get(request)
+        if entry is None or entry[1] <= now:
+            return None
+        self.entries.move_to_end(request)
+        return entry[0]
+
+    async def urls(self, requests: List[UrlRequest]) -> List[Optional[str]]:
+        """URLs for `requests` in order; everything not cached is signed in a single batch."""
+        now = time.time()
+        found: Dict[UrlRequest, Optional[str]] = {}
+        misses = []
+        for request in dict.fromkeys(requests):
+            file_key, _, public = request
+            if public and PUBLIC_FILES_BASE_URL:
+                found[request] = f"{PUBLIC_FILES_BASE_URL.rstrip('/')}/{quote(file_key)}"
+                continue
+            url = self._cached(request, now)
+            if url is None:
+                misses.append(request)
+            else:
+                found[request] = url
+        self.hits += len(found)
+        self.misses += len(misses)
+
+        if misses:
+            self.batches += 1
+            for request, (url, reusable_until) in zip(misses, await object_store.run(_sign_batch, misses, name="sign_urls")):
+                found[request] = url
+                if url is not None:
+                    self.entries[request] = (url, reusable_until)
+                    self.entries.move_to_end(request)
+            while len(self.entries) > self.max_urls:
+                self.entries.popitem(last=False)
+
+        return [found[request] for request in requests]
+
+    async def url(self, file_key: str, file_type: Optional[str], public: bool = False) -> Optional[str]:
+        return (await self.urls([(file_key, file_type, public)]))[0]
+
+    def forget(self, file_key: str):
+        """Drop every cached URL of a deleted file."""
+        for request in [request for request in self.entries if request[0] == file_key]:
+            del self.entries[request]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "urls": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "batches": self.batches,
+        }
+
+
+# Process-wide signer used by the file URL endpoints
+url_signer = URLSigner()
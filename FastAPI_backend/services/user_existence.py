@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from typing import AsyncIterable, Iterable, List, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from cachetools import TTLCache
+
+from config.setting import user_collection
+from services.loaders import RequestLoaders, request_loaders
+
+logger = logging.getLogger(__name__)
+
+FALSE_POSITIVE_RATE = 0.01
+HEADROOM = 10_000  # Registrations the filter absorbs before it is rebuilt
+CLOCK_SKEW_SECONDS = 60  # user_Ids minted this close to (or after) the build are not vouched for
+POSITIVE_TTL_SECONDS = 5 * 60
+POSITIVE_CACHE_SIZE = 50_000
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on one blake2b digest)."""
+
+    def __init__(self, capacity: int, error_rate: float = FALSE_POSITIVE_RATE):
+        self.capacity = max(capacity, 1)
+        self.size = max(64, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+def _minted_at(user_id: str) -> Optional[float]:
+    """Creation time encoded in a `{role}_{ObjectId}` user_Id, or None for other formats."""
+    try:
+        return ObjectId(user_id.rpartition("_")[2]).generation_time.timestamp()
+    except (InvalidId, TypeError):
+        return None
+
+
+class UserExistenceFilter:
+    """
+    Bloom filter of every registered user_Id.
+
+    It can only answer "definitely not registered". Users created in this
+    process are added as they register. A user_Id minted after the build
+    (e.g. by another instance) is never reported absent, and neither is any
+    id while the filter is loading or over capacity; those go to MongoDB.
+    Deletions leave the bit set, so a deleted user also falls back to MongoDB.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.bloom: Optional[BloomFilter] = None
+        self.built_at = 0.0  # Epoch seconds when the build scan started
+        self._replay: Optional[list] = None  # registrations seen while an async rebuild is running
+
+    def rebuild(self, user_ids: Iterable[str], started_at: Optional[float] = None):
+        """Replace the filter with `user_ids` and mark it ready."""
+        user_ids = list(user_ids)
+        bloom = BloomFilter(2 * len(user_ids) + HEADROOM)
+        for user_id in user_ids:
+            bloom.add(user_id)
+        self.bloom = bloom
+        self.built_at = time.time() if started_at is None else started_at
+        self.ready = True
+        logger.info(f"User existence filter built with {len(user_ids)} users ({len(bloom.bits)} bytes)")
+
+    async def rebuild_async(self, docs: AsyncIterable[dict]):
+        """Rebuild from an async cursor and swap in, replaying registrations that arrived during the scan."""
+        started_at = time.time()
+        self._replay = []
+        try:
+            fresh = UserExistenceFilter()
+            fresh.rebuild([doc["user_Id"] async for doc in docs if doc.get("user_Id")], started_at)
+            replay, self._replay = self._replay, None
+            self.__dict__.update(fresh.__dict__)
+            for user_id in replay:
+                self.add(user_id)
+        finally:
+            self._replay = None
+
+    def add(self, user_id: str):
+        if self._replay is not None:
+            self._replay.append(user_id)
+        if self.bloom is not None:
+            self.bloom.add(user_id)
+
+    @property
+    def saturated(self) -> bool:
+        return self.bloom is not None and self.bloom.count > self.bloom.capacity
+
+    def definitely_absent(self, user_id: str) -> bool:
+        """True only when the filter can vouch that `user_id` was never registered."""
+        if not self.ready or self.saturated or user_id in self.bloom:
+            return False
+        minted_at = _minted_at(user_id)
+        return minted_at is not None and minted_at < self.built_at - CLOCK_SKEW_SECONDS
+
+
+# Process-wide filter over users, loaded at startup, plus recently confirmed users
+user_existence_filter = UserExistenceFilter()
+registered_users = TTLCache(maxsize=POSITIVE_CACHE_SIZE, ttl=POSITIVE_TTL_SECONDS)
+_rebuild_task: Optional[asyncio.Task] = None
+
+
+async def user_is_registered(user_id: str, loaders: Optional[RequestLoaders] = None) -> bool:
+    """Whether `user_id` exists; definite negatives and recent positives skip MongoDB."""
+    if not user_id:
+        return False
+    if user_id in registered_users:
+        return True
+    if user_existence_filter.definitely_absent(user_id):
+        return False
+
+    user = await (loaders or request_loaders()).users.load(user_id)  # Batched with the request's other lookups
+    if user is not None:
+        registered_users[user_id] = True
+    return user is not None
+
+
+async def users_are_registered(user_ids: List[str]) -> List[bool]:
+    loaders = request_loaders()  # One loader even outside a request, so the misses share a query
+    return list(await asyncio.gather(*(user_is_registered(user_id, loaders) for user_id in user_ids)))
+
+
+def user_registered(user_id: str):
+    """Record a new user (called after it is written)."""
+    global _rebuild_task
+    user_existence_filter.add(user_id)
+    registered_users[user_id] = True
+    if user_existence_filter.saturated and (_rebuild_task is None or _rebuild_task.done()):
+        _rebuild_task = asyncio.create_task(load_user_existence_filter())
+
+
+def user_removed(user_id: Optional[str] = None):
+    """Forget a deleted user (or every user); the filter itself falls back to MongoDB for them."""
+    if user_id is None:
+        registered_users.clear()
+    else:
+        registered_users.pop(user_id, None)
+
+
+async def load_user_existence_filter():
+    """Build the user existence filter from a user_Id-only scan of users."""
+    try:
+        await user_existence_filter.rebuild_async(user_collection.find({}, {"_id": 0, "user_Id": 1}))
+    except Exception as e:
+        logger.error(f"Error building user existence filter: {str(e)}")
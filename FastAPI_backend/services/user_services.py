@@ -6,6 +6,7 @@ from fastapi import HTTPException, status
 from pydantic import BaseModel
 from models.User import User, UserUpdate
 from config.setting import user_collection
+from services.user_existence import user_registered, user_removed
 
 async def create_user(user: User):
     # Check for existing email
@@ -47,6 +48,7 @@ async def create_user(user: User):
         {"_id": result.inserted_id},
         {"$set": {"user_Id": generated_user_id}}
     )
+    user_registered(generated_user_id)
     
     # Return the complete user data
     # created_user = await user_collection.find_one({"_id": result.inserted_id})
@@ -91,6 +93,7 @@ async def delete_user(user_Id: str):
     result = await user_collection.delete_one({"user_Id": user_Id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    user_removed(user_Id)
     return {"detail": "User deleted successfully"}
 
 async def list_users(skip: int = 0, limit: int = 100):
@@ -111,6 +114,7 @@ async def delete_all_users():
         
         # Delete all documents
         result = await user_collection.delete_many({})
+        user_removed()
         
         if result.deleted_count > 0:
             return {
@@ -177,6 +181,7 @@ async def generate_fake_users(user_type: str, num_users: int):
         
         # Convert ObjectId to string for the response
         for user in fake_users:
+            user_registered(user["user_Id"])
             user["_id"] = str(user["_id"])
 
         return fake_users
@@ -0,0 +1,293 @@
+"""In-memory stand-ins for the Motor collections the services use.
+
+Tests import them directly (`from conftest import FakeCollection`) and
+monkeypatch them over the module-level collections from config.setting.
+"""
+import copy
+import random
+import re
+from types import SimpleNamespace
+
+
+def get_path(doc, path):
+    for key in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(key)
+    return doc
+
+
+def set_path(doc, path, value):
+    *parents, last = path.split(".")
+    for key in parents:
+        doc = doc.setdefault(key, {})
+    doc[last] = value
+
+
+def _compare(value, operator, operand):
+    # Arrays match when any element does, as in MongoDB
+    values = value if isinstance(value, list) else [value]
+    if operator == "$in":
+        return any(v in operand for v in values)
+    if operator == "$nin":
+        return not any(v in operand for v in values)
+    if operator == "$ne":
+        return operand not in values
+    if operator == "$exists":
+        return (value is not None) == operand
+    if operator == "$regex":
+        return any(isinstance(v, str) and re.search(operand, v) for v in values)
+    present = [v for v in values if v is not None]
+    if operator == "$gt":
+        return any(v > operand for v in present)
+    if operator == "$gte":
+        return any(v >= operand for v in present)
+    if operator == "$lt":
+        return any(v < operand for v in present)
+    if operator == "$lte":
+        return any(v <= operand for v in present)
+    raise NotImplementedError(operator)
+
+
+def matches(doc, query):
+    """Whether a document satisfies a find filter (the operators the services send)."""
+    for field, condition in (query or {}).items():
+        if field == "$and":
+            if not all(matches(doc, clause) for clause in condition):
+                return False
+        elif field == "$or":
+            if not any(matches(doc, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+            value = get_path(doc, field)
+            if not all(_compare(value, operator, operand) for operator, operand in condition.items()):
+                return False
+        else:
+            value = get_path(doc, field)
+            if value != condition and not (isinstance(value, list) and condition in value):
+                return False
+    return True
+
+
+def evaluate(doc, expression):
+    """The aggregation expressions used in $project, $group and pipeline updates."""
+    if expression == "$$ROOT":
+        return doc
+    if isinstance(expression, str) and expression.startswith("$"):
+        return get_path(doc, expression[1:])
+    if not isinstance(expression, dict):
+        return expression
+    if not all(key.startswith("$") for key in expression):
+        return {key: evaluate(doc, value) for key, value in expression.items()}
+    (operator, args), = expression.items()
+    values = [evaluate(doc, arg) for arg in args]
+    if operator == "$add":
+        return sum(values)
+    if operator == "$ifNull":
+        return values[1] if values[0] is None else values[0]
+    if operator == "$gt":
+        return values[0] > values[1]
+    if operator == "$divide":
+        return values[0] / values[1]
+    if operator == "$cond":
+        return values[1] if values[0] else values[2]
+    raise NotImplementedError(operator)
+
+
+def project(doc, projection):
+    if not projection:
+        return doc
+    if not any(value not in (0, False) for key, value in projection.items() if key != "_id"):
+        return {key: value for key, value in doc.items() if projection.get(key, 1)}
+    projected = {} if projection.get("_id", 1) in (0, False) or "_id" not in doc else {"_id": doc["_id"]}
+    for key, value in projection.items():
+        if key == "_id":
+            continue
+        if value is True or value == 1:
+            if get_path(doc, key) is not None:
+                set_path(projected, key, get_path(doc, key))
+        elif value not in (0, False):
+            projected[key] = evaluate(doc, value)
+    return projected
+
+
+def _group(docs, spec):
+    groups = {}
+    for doc in docs:
+        key = evaluate(doc, spec["_id"])
+        hashable = tuple(sorted(key.items())) if isinstance(key, dict) else key
+        group = groups.setdefault(hashable, {"_id": key})
+        for name, accumulator in spec.items():
+            if name == "_id":
+                continue
+            (operator, argument), = accumulator.items()
+            if operator == "$sum":
+                group[name] = group.get(name, 0) + evaluate(doc, argument)
+            elif operator == "$first":
+                group.setdefault(name, evaluate(doc, argument))
+            else:
+                raise NotImplementedError(operator)
+    return list(groups.values())
+
+
+def _sort_key(spec):
+    return list(spec.items()) if isinstance(spec, dict) else spec
+
+
+class FakeCursor:
+    """A Motor cursor over documents already in memory."""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction=None):
+        keys = [(key, direction)] if isinstance(key, str) else _sort_key(key)
+        for field, order in reversed(keys):  # Stable sorts, least significant key first
+            self.docs = sorted(self.docs, key=lambda doc: (get_path(doc, field) is not None, get_path(doc, field)), reverse=order < 0)
+        return self
+
+    def skip(self, n):
+        self.docs = self.docs[n:]
+        return self
+
+    def limit(self, n):
+        if n:
+            self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length=None):
+        return self.docs[:length] if length else self.docs
+
+    async def __aiter__(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakeCollection:
+    """Just enough of a Motor collection for the services, recording every filter and pipeline it is sent.
+
+    Reads return copies, as documents decoded from BSON would be.
+    """
+
+    def __init__(self, docs=()):
+        self.docs = [copy.deepcopy(doc) for doc in docs]
+        self.queries = []
+
+    def _matching(self, query):
+        return [doc for doc in self.docs if matches(doc, query)]
+
+    def find(self, query=None, projection=None):
+        self.queries.append(query or {})
+        return FakeCursor([project(copy.deepcopy(doc), projection) for doc in self._matching(query)])
+
+    async def find_one(self, query=None, projection=None):
+        docs = await self.find(query, projection).limit(1).to_list()
+        return docs[0] if docs else None
+
+    def aggregate(self, pipeline):
+        self.queries.append(pipeline)
+        docs = copy.deepcopy(self.docs)
+        for stage in pipeline:
+            (name, spec), = stage.items()
+            if name == "$match":
+                docs = [doc for doc in docs if matches(doc, spec)]
+            elif name == "$sort":
+                docs = FakeCursor(docs).sort(spec).docs
+            elif name == "$group":
+                docs = _group(docs, spec)
+            elif name == "$replaceRoot":
+                docs = [evaluate(doc, spec["newRoot"]) for doc in docs]
+            elif name == "$project":
+                docs = [project(doc, spec) for doc in docs]
+            elif name == "$limit":
+                docs = docs[:spec]
+            elif name == "$sample":
+                docs = random.sample(docs, min(spec["size"], len(docs)))
+            else:
+                raise NotImplementedError(name)
+        return FakeCursor(docs)
+
+    async def count_documents(self, query):
+        return len(self._matching(query))
+
+    async def distinct(self, key, query=None):
+        return sorted({get_path(doc, key) for doc in self._matching(query)} - {None})
+
+    async def insert_one(self, doc):
+        self.docs.append(copy.deepcopy(doc))
+        return SimpleNamespace(inserted_id=doc.get("_id"))
+
+    def _apply(self, doc, update, inserted):
+        if isinstance(update, list):  # Pipeline update
+            for stage in update:
+                values = {path: evaluate(doc, expression) for path, expression in stage["$set"].items()}
+                for path, value in values.items():
+                    set_path(doc, path, value)
+            return
+        for path, value in update.get("$set", {}).items():
+            set_path(doc, path, copy.deepcopy(value))
+        for path, value in update.get("$inc", {}).items():
+            set_path(doc, path, (get_path(doc, path) or 0) + value)
+        for path in update.get("$unset", {}):
+            *parents, last = path.split(".")
+            parent = get_path(doc, ".".join(parents)) if parents else doc
+            if isinstance(parent, dict):
+                parent.pop(last, None)
+        if inserted:
+            for path, value in update.get("$setOnInsert", {}).items():
+                set_path(doc, path, copy.deepcopy(value))
+
+    def _upsert(self, query):
+        doc = {field: value for field, value in query.items() if not field.startswith("$") and not isinstance(value, dict)}
+        self.docs.append(doc)
+        return doc
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=False, projection=None):
+        doc = next(iter(self._matching(query)), None)
+        before = copy.deepcopy(doc)
+        inserted = doc is None
+        if inserted:
+            if not upsert:
+                return None
+            doc = self._upsert(query)
+        self._apply(doc, update, inserted)
+        return project(copy.deepcopy(doc), projection) if return_document else before
+
+    async def update_one(self, query, update, upsert=False):
+        doc = next(iter(self._matching(query)), None)
+        if doc is None and upsert:
+            self._apply(self._upsert(query), update, True)
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=True)
+        if doc is not None:
+            self._apply(doc, update, False)
+        return SimpleNamespace(matched_count=int(doc is not None), modified_count=int(doc is not None), upserted_id=None)
+
+    async def update_many(self, query, update):
+        docs = self._matching(query)
+        for doc in docs:
+            self._apply(doc, update, False)
+        return SimpleNamespace(matched_count=len(docs), modified_count=len(docs))
+
+    async def replace_one(self, query, replacement, upsert=False):
+        doc = next(iter(self._matching(query)), None)
+        if doc is None and not upsert:
+            return SimpleNamespace(matched_count=0)
+        self.docs = [kept for kept in self.docs if kept is not doc] + [copy.deepcopy(replacement)]
+        return SimpleNamespace(matched_count=int(doc is not None))
+
+    async def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            if type(operation).__name__ == "ReplaceOne":
+                await self.replace_one(operation._filter, operation._doc, upsert=operation._upsert)
+            else:
+                await self.update_one(operation._filter, operation._doc, upsert=operation._upsert)
+
+    async def delete_one(self, query):
+        doc = next(iter(self._matching(query)), None)
+        self.docs = [kept for kept in self.docs if kept is not doc]
+        return SimpleNamespace(deleted_count=int(doc is not None))
+
+    async def delete_many(self, query):
+        kept = [doc for doc in self.docs if not matches(doc, query)]
+        deleted, self.docs = len(self.docs) - len(kept), kept
+        return SimpleNamespace(deleted_count=deleted)
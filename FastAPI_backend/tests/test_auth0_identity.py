@@ -0,0 +1,99 @@
+import asyncio
+import json
+import os
+import sys
+
+import httpx
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.auth0_identity import Auth0Identity
+
+
+class Auth0Stub:
+    """Management API stand-in served through httpx.MockTransport."""
+
+    def __init__(self):
+        self.users = {"auth0|1": {"name": "Ada", "email": "ada@example.com", "app_metadata": {}}}
+        self.calls = []
+        self.issued = 0
+
+    def handle(self, request):
+        self.calls.append((request.method, request.url.path))
+        if request.url.path == "/oauth/token":
+            self.issued += 1
+            return httpx.Response(200, json={"access_token": f"mgmt-{self.issued}", "expires_in": 86400})
+        if request.headers["Authorization"] != f"Bearer mgmt-{self.issued}":
+            return httpx.Response(401, json={"message": "Invalid token"})
+
+        user = self.users.get(request.url.path.rpartition("/")[2])
+        if user is None:
+            return httpx.Response(404, json={"message": "The user does not exist."})
+        if request.method == "PATCH":
+            user["app_metadata"].update(json.loads(request.content)["app_metadata"])
+        return httpx.Response(200, json=user)
+
+
+def identity_for(stub):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(stub.handle))
+    return Auth0Identity("tenant.example.com", "id", "secret", client=client)
+
+
+def test_role_checks_are_served_from_cache_after_select_role():
+    stub = Auth0Stub()
+    identity = identity_for(stub)
+
+    async def run():
+        profiles = await asyncio.gather(*(identity.get_profile("auth0|1") for _ in range(20)))
+        assert all(profile["role"] is None and profile["name"] == "Ada" for profile in profiles)
+
+        await identity.set_role("auth0|1", "model")
+        for _ in range(50):
+            assert (await identity.get_profile("auth0|1"))["role"] == "model"
+        await identity.aclose()
+
+    asyncio.run(run())
+    # One token exchange, one concurrent fetch and the role update; every later check is a cache hit
+    assert stub.calls == [("POST", "/oauth/token"), ("GET", "/api/v2/users/auth0|1"), ("PATCH", "/api/v2/users/auth0|1")]
+    assert identity.stats()["profile_hits"] == 50
+
+
+def test_rejected_management_token_is_replaced_once():
+    stub = Auth0Stub()
+    identity = identity_for(stub)
+
+    async def run():
+        await identity.get_profile("auth0|1")
+        stub.issued += 1  # Auth0 revokes the cached token
+        identity.forget("auth0|1")
+        assert (await identity.get_profile("auth0|1"))["email"] == "ada@example.com"
+        await identity.aclose()
+
+    asyncio.run(run())
+    assert identity.token_fetches == 2
+    assert [path for _, path in stub.calls].count("/oauth/token") == 2
+
+
+def test_login_code_exchanges_are_capped():
+    in_flight, peak, forms = 0, 0, []
+
+    async def handle(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        forms.append(request.content.decode())
+        return httpx.Response(200, json={"access_token": "at", "id_token": "it"})
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+        identity = Auth0Identity("tenant.example.com", "id", "secret", client=client, max_code_exchanges=3)
+        responses = await asyncio.gather(*(identity.exchange_code(f"code{i}", "https://app/cb") for i in range(12)))
+        assert all(response.json()["id_token"] == "it" for response in responses)
+        assert identity.stats()["code_exchanges"] == 12
+        await identity.aclose()
+
+    asyncio.run(run())
+    assert peak == 3
+    assert "grant_type=authorization_code" in forms[0] and "redirect_uri=https%3A%2F%2Fapp%2Fcb" in forms[0]
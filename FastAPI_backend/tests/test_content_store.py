@@ -0,0 +1,61 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import services.content_store as content_store
+import services.file_service as file_service
+import services.loaders as loaders
+import services.storage as storage
+import services.url_signer as url_signer
+from conftest import FakeCollection
+from test_storage import FakeS3, upload_of
+
+
+async def registered(user_id):
+    return True
+
+
+def test_identical_uploads_share_one_object_until_the_last_delete(monkeypatch):
+    s3, objects, files = FakeS3(), FakeCollection(), FakeCollection()
+    monkeypatch.setattr(storage, "s3_client", s3)
+    monkeypatch.setattr(content_store, "file_objects_collection", objects)
+    monkeypatch.setattr(file_service, "file_collection", files)
+    monkeypatch.setattr(loaders, "file_collection", files)  # File lookups go through the request's loader
+    monkeypatch.setattr(file_service, "_validate_user", registered)
+    monkeypatch.setattr(file_service, "schedule_derivatives", lambda *args: None)
+    monkeypatch.setattr(file_service, "url_signer", url_signer.URLSigner())
+    image = os.urandom(300 * 1024)
+
+    async def run():
+        await file_service.upload_file(upload_of(image, "image/png", "look.png")[1], "model_1", "portfolio")
+        await file_service.upload_file(upload_of(image, "image/png", "look-again.png")[1], "model_1", "image")
+        first, second = files.docs
+        assert first["object_key"] == second["object_key"] and first["file_id"] != second["file_id"]
+        assert s3.calls == ["put_object"]  # The duplicate was a metadata-only insert
+        assert [doc["ref_count"] for doc in objects.docs] == [2]
+
+        await file_service.delete_file(first["file_id"], "model_1")
+        assert s3.objects[second["object_key"]]["Body"] == image  # Still referenced
+        await file_service.delete_file(second["file_id"], "model_1")
+        return second["object_key"]
+
+    key = asyncio.run(run())
+    assert key not in s3.objects and not objects.docs and not files.docs
+
+
+def test_concurrent_first_uploads_keep_a_single_object(monkeypatch):
+    s3, objects = FakeS3(), FakeCollection()
+    monkeypatch.setattr(storage, "s3_client", s3)
+    monkeypatch.setattr(content_store, "file_objects_collection", objects)
+
+    async def run():
+        for file_id in ("a", "b"):
+            await storage.stream_upload(upload_of(b"same", "image/png")[1], "bucket", content_store.object_key(file_id), "image/png", 1024)
+        first = await content_store.register("f00d", content_store.object_key("a"), 4, "image/png")
+        second = await content_store.register("f00d", content_store.object_key("b"), 4, "image/png")
+        return first, second
+
+    assert asyncio.run(run()) == ("objects/a", "objects/a")
+    assert list(s3.objects) == ["objects/a"] and [(doc["sha256"], doc["ref_count"]) for doc in objects.docs] == [("f00d", 2)]
@@ -0,0 +1,67 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import services.explore_service as explore_service
+import services.file_service as file_service
+import services.url_signer as url_signer
+from models.explore_model import ExploreCardsRequest
+from conftest import FakeCollection
+
+
+def test_cards_are_hydrated_in_one_query_per_collection(monkeypatch):
+    users = FakeCollection([
+        {"user_Id": "model_1", "name": "Ana", "role": "model"},
+        {"user_Id": "model_2", "name": "Ben", "role": "model"},
+        {"user_Id": "brand_1", "name": "Acme", "role": "brand"},
+    ])
+    model_tags = FakeCollection([{"user_Id": "model_1", "age": 24, "rand_key": 0.5}])
+    brand_tags = FakeCollection([{"user_Id": "brand_1", "location": "Paris, France"}])
+    files = FakeCollection([
+        {"file_id": "f1", "file_name": "old.png", "folder": "profile-pic", "uploaded_by": "model_1", "file_type": "image/png", "uploaded_at": 1},
+        {"file_id": "f2", "file_name": "new.png", "folder": "profile-pic", "uploaded_by": "model_1", "file_type": "image/png", "uploaded_at": 2},
+        {"file_id": "f3", "file_name": "cover.png", "folder": "portfolio", "uploaded_by": "brand_1", "file_type": "image/png", "uploaded_at": 3},
+    ])
+    monkeypatch.setattr(explore_service, "user_collection", users)
+    monkeypatch.setattr(explore_service, "model_tags_collection", model_tags)
+    monkeypatch.setattr(explore_service, "brand_tags_collection", brand_tags)
+    monkeypatch.setattr(file_service, "file_collection", files)
+    monkeypatch.setattr(file_service, "url_signer", url_signer.URLSigner())
+    monkeypatch.setattr(url_signer, "sign_url", lambda key, file_type, expiration: f"signed:{key}")
+
+    request = ExploreCardsRequest(user_Ids=["brand_1", "model_1", "ghost_1", "model_2", "model_1"])
+    cards = asyncio.run(explore_service.get_explore_cards(request))
+
+    assert [card.user_Id for card in cards] == ["brand_1", "model_1", "model_2"]
+    assert cards[0].tags == {"user_Id": "brand_1", "location": "Paris, France"} and cards[0].image is None
+    assert cards[1].tags == {"user_Id": "model_1", "age": 24}
+    assert cards[1].image == "signed:profile-pic/f2_new.png"
+    assert cards[2].tags is None and cards[2].name == "Ben"
+    assert [len(collection.queries) for collection in (users, model_tags, brand_tags, files)] == [1, 1, 1, 1]
+
+
+def test_single_user_latest_file_uses_the_index_backed_pipeline(monkeypatch):
+    files = FakeCollection([
+        {"file_id": "f1", "file_name": "old.png", "folder": "profile-pic", "uploaded_by": "model_1", "file_type": "image/png", "uploaded_at": 1},
+        {"file_id": "f2", "file_name": "new.png", "folder": "profile-pic", "uploaded_by": "model_1", "file_type": "image/png", "uploaded_at": 2},
+        {"file_id": "f3", "file_name": "reel.mp4", "folder": "video", "uploaded_by": "model_1", "file_type": "video/mp4", "uploaded_at": 3},
+    ])
+
+    async def registered(user_id):
+        return True
+
+    monkeypatch.setattr(file_service, "file_collection", files)
+    monkeypatch.setattr(file_service, "_validate_user", registered)
+    monkeypatch.setattr(file_service, "url_signer", url_signer.URLSigner())
+    monkeypatch.setattr(url_signer, "sign_url", lambda key, file_type, expiration: f"signed:{key}")
+
+    latest = asyncio.run(file_service.get_latest_file_by_user_folder("model_1", "profile-pic"))
+    nothing = asyncio.run(file_service.get_latest_file_by_user_folder("model_1", "portfolio"))
+
+    assert latest["file_id"] == "f2" and latest["s3_url"] == "signed:profile-pic/f2_new.png"
+    assert nothing is None
+    # The sort follows the (uploaded_by, folder, uploaded_at) index, so no in-memory sort is needed
+    sort = list(files.queries[0][1]["$sort"].items())
+    assert sort == list(file_service.LATEST_FILE_INDEXES[0])
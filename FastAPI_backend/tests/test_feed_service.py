@@ -0,0 +1,150 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import services.feed_service as feed_service
+from services.feed_service import FeedSession, FeedSessions
+from conftest import FakeCollection
+
+
+def saved_lists():
+    return FakeCollection([{"user_Id": "brand_1", "saved_Ids": ["saved_1"]}])
+
+
+def ratings():
+    return FakeCollection([{"user_Id": "rated_1", "ratedBy_Id": "brand_1", "rating": 4}])
+
+
+def test_session_hands_out_each_candidate_once():
+    session = FeedSession()
+    session.mark_seen(["m3"])
+    assert session.refill([f"m{i}" for i in range(20)]) == 19
+
+    handed_out = session.take(8) + session.take(8) + session.take(8)
+    assert sorted(handed_out) == sorted(f"m{i}" for i in range(20) if i != 3)
+    assert session.take(8) == []
+    # Refilling with the same candidates queues nothing new
+    assert session.refill([f"m{i}" for i in range(20)]) == 0
+
+
+def test_sessions_are_bounded_by_bytes():
+    store = FeedSessions(max_bytes=50 * feed_service.ENTRY_BYTES)
+    for i in range(3):
+        session = FeedSession()
+        session.mark_seen(f"m{n}" for n in range(20))
+        store.entries[("brand_1", "models", str(i))] = session
+        store.resized(("brand_1", "models", str(i)), session)
+
+    # Three sessions of 20 entries do not fit in 50: the least recently used one goes
+    assert list(store.entries) == [("brand_1", "models", "1"), ("brand_1", "models", "2")]
+    assert store.bytes == 40 * feed_service.ENTRY_BYTES
+    assert store.reset_user("brand_1") == 2 and store.bytes == 0
+
+
+def test_large_matches_are_queued_a_sample_at_a_time():
+    session = FeedSession()
+    candidates = [f"m{i}" for i in range(3 * feed_service.MAX_QUEUE)]
+    assert session.refill(candidates) == feed_service.MAX_QUEUE and session.truncated
+    assert len(session.take(feed_service.MAX_QUEUE)) == feed_service.MAX_QUEUE
+    assert session.refill(candidates) == feed_service.MAX_QUEUE  # Only unseen ones the second time
+
+
+def test_drained_session_reruns_the_filter_at_most_once_per_interval(monkeypatch):
+    monkeypatch.setattr(feed_service, "saved_list_collection", saved_lists())
+    monkeypatch.setattr(feed_service, "rating_collection", ratings())
+    monkeypatch.setattr(feed_service, "sessions", FeedSessions())
+    calls = []
+
+    async def match(query):
+        calls.append(query)
+        return [f"m{i}" for i in range(1500)]
+
+    async def drain():
+        return await feed_service._next_batch("brand_3", "models", {}, 100, match)
+
+    served = [asyncio.run(drain()) for _ in range(15)]
+    assert sum(len(batch) for batch in served) == 1500 and len(calls) == 2  # The second call queued the last 500
+    assert [asyncio.run(drain()) for _ in range(5)] == [[]] * 5
+    assert len(calls) == 2  # Nothing was left out, so the drained session waits for REFILL_INTERVAL_SECONDS
+
+
+def test_session_dropped_during_a_refill_is_not_counted_again(monkeypatch):
+    monkeypatch.setattr(feed_service, "saved_list_collection", saved_lists())
+    monkeypatch.setattr(feed_service, "rating_collection", ratings())
+    monkeypatch.setattr(feed_service, "sessions", FeedSessions())
+    resets = []
+
+    async def match(query):
+        if resets:  # The refill: the user resets their feed meanwhile
+            feed_service.sessions.reset_user("brand_4")
+        resets.append(query)
+        return ["m1"]
+
+    async def scenario():
+        await feed_service._next_batch("brand_4", "models", {}, 5, match)
+        monkeypatch.setattr(feed_service, "REFILL_INTERVAL_SECONDS", 0)
+        await feed_service._next_batch("brand_4", "models", {}, 5, match)
+
+    asyncio.run(scenario())
+    assert feed_service.sessions.stats() == {"sessions": 0, "bytes": 0, "building": 0}
+
+
+def test_feed_excludes_saved_rated_and_self(monkeypatch):
+    monkeypatch.setattr(feed_service, "saved_list_collection", saved_lists())
+    monkeypatch.setattr(feed_service, "rating_collection", ratings())
+    monkeypatch.setattr(feed_service, "sessions", FeedSessions())
+    candidates = ["brand_1", "saved_1", "rated_1"] + [f"m{i}" for i in range(10)]
+    calls = []
+
+    async def match(query):
+        calls.append(query)
+        return candidates
+
+    async def scenario():
+        first = await feed_service._next_batch("brand_1", "models", {"gender": "Female"}, 6, match)
+        second = await feed_service._next_batch("brand_1", "models", {"gender": "Female"}, 6, match)
+        third = await feed_service._next_batch("brand_1", "models", {"gender": "Female"}, 6, match)
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    assert len(first) == 6 and len(second) == 4 and third == []
+    assert sorted(first + second) == sorted(f"m{i}" for i in range(10))
+    # The filter ran once for the session; later batches came from the queue
+    assert len(calls) == 1
+
+    # A different filter is a different session
+    asyncio.run(feed_service._next_batch("brand_1", "models", {"gender": "Male"}, 6, match))
+    assert len(calls) == 2
+
+
+def test_concurrent_first_requests_share_one_session(monkeypatch):
+    monkeypatch.setattr(feed_service, "saved_list_collection", saved_lists())
+    monkeypatch.setattr(feed_service, "rating_collection", ratings())
+    monkeypatch.setattr(feed_service, "sessions", FeedSessions())
+    calls = []
+
+    async def match(query):
+        calls.append(query)
+        await asyncio.sleep(0.01)  # Both requests arrive while the session is being built
+        return [f"m{i}" for i in range(10)]
+
+    async def scenario():
+        return await asyncio.gather(*(feed_service._next_batch("brand_2", "models", {}, 5, match) for _ in range(2)))
+
+    first, second = asyncio.run(scenario())
+    assert sorted(first + second) == sorted(f"m{i}" for i in range(10))  # No profile served twice
+    assert len(calls) == 1 and len(feed_service.sessions.entries) == 1
+
+
+def test_brand_feed_samples_instead_of_scanning(monkeypatch):
+    sampled = []
+
+    async def sample_documents(collection, query, size, projection=None):
+        sampled.append((query, size))
+        return [{"user_Id": "brand_1"}]
+
+    monkeypatch.setattr(feed_service, "sample_documents", sample_documents)
+    assert asyncio.run(feed_service._match_brand_tag_user_ids({"location": "Paris, France"})) == ["brand_1"]
+    assert sampled == [({"location": "Paris, France"}, feed_service.MAX_QUEUE)]
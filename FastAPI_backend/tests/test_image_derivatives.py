@@ -0,0 +1,67 @@
+import asyncio
+import io
+import os
+import sys
+
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import services.file_service as file_service
+import services.image_derivatives as image_derivatives
+import services.storage as storage
+import services.url_signer as url_signer
+from conftest import FakeCollection
+from test_storage import FakeS3
+
+
+def png(width, height):
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 80, 40)).save(out, "PNG")
+    return out.getvalue()
+
+
+def test_renditions_fit_each_size_class_without_upscaling():
+    renditions = image_derivatives.render_derivatives(png(2000, 1000))
+
+    assert set(renditions) == set(image_derivatives.SIZE_CLASSES)
+    with Image.open(io.BytesIO(renditions["thumb"]["webp"])) as thumb:
+        assert (thumb.format, thumb.size) == ("WEBP", (200, 100))
+    with Image.open(io.BytesIO(renditions["large"]["jpeg"])) as large:
+        assert (large.format, large.size) == ("JPEG", (1280, 640))
+
+    small = image_derivatives.render_derivatives(png(300, 150))
+    with Image.open(io.BytesIO(small["large"]["webp"])) as unchanged:
+        assert unchanged.size == (300, 150)
+
+
+def test_uploaded_image_gets_derivatives_served_by_size(monkeypatch):
+    s3 = FakeS3()
+    s3.objects["portfolio/f1_look.png"] = {"Body": png(1600, 1200), "ContentType": "image/png"}
+    files = FakeCollection([{"file_id": "f1", "file_name": "look.png", "folder": "portfolio", "file_type": "image/png", "is_private": False}])
+    monkeypatch.setattr(storage, "s3_client", s3)
+    monkeypatch.setattr(image_derivatives, "file_collection", files)
+    monkeypatch.setattr(file_service, "url_signer", url_signer.URLSigner())
+
+    async def run():
+        derivatives = await image_derivatives.generate_derivatives("f1", "portfolio/f1_look.png")
+        image_derivatives.shutdown()
+
+        listing = [await files.find_one({"file_id": "f1"}), {"file_id": "f2", "file_name": "cv.pdf", "folder": "portfolio", "file_type": "application/pdf"}]
+        await file_service._sign_file_urls(listing, owner_view=True, size="thumb")
+        return derivatives, listing
+
+    derivatives, listing = asyncio.run(run())
+
+    assert derivatives["thumb"] == {"webp": "derived/thumb/f1.webp", "jpeg": "derived/thumb/f1.jpeg"}
+    assert s3.objects["derived/small/f1.webp"]["ContentType"] == "image/webp"
+    assert s3.objects["derived/small/f1.webp"]["CacheControl"].endswith("immutable")
+    assert listing[0]["s3_url"].startswith("https://s3.test/derived/thumb/f1.webp")
+    assert listing[1]["s3_url"].startswith("https://s3.test/portfolio/f2_cv.pdf")  # No rendition: the original
+    assert "derivatives" not in listing[0]
+
+
+def test_only_gallery_images_are_rendered():
+    assert image_derivatives.wants_derivatives("profile-pic", "image/jpeg")
+    assert not image_derivatives.wants_derivatives("video", "video/mp4")
+    assert not image_derivatives.wants_derivatives("project", "image/png")
@@ -0,0 +1,261 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+from fastapi import Response
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import services.feed_service as feed_service
+import services.file_service as file_service
+import services.Modellatag_service as tag_service
+import services.rating_services as rating_services
+import services.upload_session_service as upload_session_service
+from config import indexes
+from config.indexes import INDEXES, ensure_indexes
+from models.Modella_preference import BrandModelPreferenceFilterRequest
+from models.Modella_tag import BrandTagFilterRequest, ModelTagFilterRequest, ProjectTagFilterRequest
+from services.Modella_preference_service import build_query_cross_filter
+from services.pagination import encode_cursor
+from conftest import FakeCursor
+
+MONGO_URL = os.getenv("MONGO_URL")
+SCRATCH_DB = "modella_index_plans"
+NOW = datetime.now(timezone.utc)
+USERS = ["model_1", "model_2", "brand_1"]
+
+
+class RecordedCursor(FakeCursor):
+    """Completes a recorded find command as the service chains sort and limit onto it."""
+
+    def __init__(self, command):
+        super().__init__([])
+        self.command = command
+
+    def sort(self, key, direction=None):
+        self.command["sort"] = dict([(key, direction)] if isinstance(key, str) else key)
+        return self
+
+    def limit(self, n):
+        self.command["limit"] = n
+        return self
+
+
+class Recorder:
+    """Stands in for a collection and keeps every find and aggregate it gets as an explainable command."""
+
+    def __init__(self):
+        self.commands = []
+
+    def find(self, filter=None, projection=None, sort=None, limit=0):
+        command = {"filter": filter or {}}
+        self.commands.append(command)
+        cursor = RecordedCursor(command)
+        if sort:
+            cursor.sort(sort)
+        if limit:
+            cursor.limit(limit)
+        return cursor
+
+    async def find_one(self, filter=None, projection=None):
+        self.find(filter, projection)
+        return None
+
+    async def distinct(self, key, filter=None):
+        self.commands.append({"key": key, "query": filter or {}})
+        return []
+
+    def aggregate(self, pipeline):
+        self.commands.append({"pipeline": pipeline})
+        return FakeCursor([])
+
+
+async def registered(*ids):
+    return True
+
+
+def sent(call, module, collection, **patches):
+    """The first command a real service call sends to `module.collection`."""
+    recorder = Recorder()
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(module, collection, recorder)
+        for name, value in patches.items():
+            patch.setattr(module, name, value)
+        asyncio.run(call)
+    return recorder.commands[0]
+
+
+def file_query(call):
+    return sent(call, file_service, "file_collection", _validate_user=registered, _validate_project=registered)
+
+
+async def model_tags_matching(sample=False, **filters):
+    # The models_tags fallbacks used while the in-memory tag index is still loading
+    query = await build_query_cross_filter(BrandModelPreferenceFilterRequest(**filters))
+    if sample:
+        return await tag_service.sample_model_tag_user_ids(query)
+    return await tag_service.match_model_tag_user_ids(query)
+
+
+async def brand_feed_candidates(**filters):
+    return await feed_service._match_brand_tag_user_ids(tag_service.build_query(BrandTagFilterRequest(**filters)))
+
+
+def model_tags_query(**filters):
+    return sent(model_tags_matching(**filters), tag_service, "model_tags_collection")
+
+
+# (collection, find or distinct command fields, or {"pipeline": [...]}) for each hot query the services send.
+# Queries built by service code are captured from the real calls so the shapes cannot drift.
+QUERY_SHAPES = {
+    "user by id": ("users", {"filter": {"user_Id": "model_1"}}),
+    "user by email": ("users", {"filter": {"email": "ana@example.com"}}),
+    "users by ids": ("users", {"filter": {"user_Id": {"$in": USERS}}}),
+    "user ids by role prefix": ("users", {"filter": {"user_Id": {"$regex": "^model"}}}),
+    "rating of a pair": ("ratings", {"filter": {"user_Id": "model_1", "ratedBy_Id": "brand_1"}}),
+    "recent reviews": ("ratings", sent(rating_services.get_recent_reviews_service("model_1"), rating_services, "rating_collection")),
+    "ratings at a level": ("ratings", sent(rating_services.get_ratings_by_level_service("model_1", 4), rating_services, "rating_collection")),
+    "already rated by": ("ratings", sent(feed_service._excluded_user_ids("brand_1"), feed_service, "rating_collection",
+                                         saved_list_collection=Recorder())),
+    "summaries of users": ("rating_summary", sent(rating_services.filter_users_by_most_frequent_rating(USERS, 4),
+                                                  rating_services, "rating_summary_collection")),
+    "users rated at a level": ("rating_summary", sent(rating_services.filter_user_ids_by_rating_level(USERS, 4),
+                                                      rating_services, "rating_summary_collection")),
+    "file by id": ("file_metadata", {"filter": {"file_id": "f1"}}),
+    "files of a user": ("file_metadata", file_query(file_service.get_files("model_1"))),
+    "public files": ("file_metadata", file_query(file_service.get_file_url())),
+    "own and public files": ("file_metadata", file_query(file_service.get_file_url("model_1"))),
+    "folder listing": ("file_metadata", file_query(file_service.get_files_urls_by_folder(folder="portfolio"))),
+    "own and public files in a folder": ("file_metadata", file_query(file_service.get_files_urls_by_folder("model_1", "portfolio"))),
+    "user folder": ("file_metadata", file_query(file_service.get_files_urls_by_user_folders("model_1", "portfolio"))),
+    "project file": ("file_metadata", file_query(file_service.get_file_by_project("model_1", "project_1"))),
+    "latest files": ("file_metadata", file_query(file_service.get_latest_files_by_users(USERS))),
+    "latest files in a folder": ("file_metadata", file_query(file_service.get_latest_files_by_users(USERS, "profile-pic"))),
+    "object by hash": ("file_objects", {"filter": {"sha256": "f00d"}}),
+    "upload session": ("upload_sessions", {"filter": {"session_id": "s1"}}),
+    "stale upload sessions": ("upload_sessions", sent(upload_session_service.expire_stale_upload_sessions(NOW),
+                                                      upload_session_service, "upload_sessions_collection")),
+    "project by id": ("projects", {"filter": {"project_Id": "project_1"}}),
+    "projects of a user": ("projects", {"filter": {"user_Id": "brand_1"}}),
+    "project of a user": ("projects", {"filter": {"user_Id": "brand_1", "project_Id": "project_1"}}),
+    "saved list": ("SavedList", {"filter": {"user_Id": "brand_1"}}),
+    "model tags of users": ("models_tags", {"filter": {"user_Id": {"$in": USERS}}}),
+    "model sample": ("models_tags", sent(model_tags_matching(sample=True), tag_service, "model_tags_collection")),
+    "model sample by gender": ("models_tags", sent(model_tags_matching(sample=True, gender=["Female"]), tag_service, "model_tags_collection")),
+    "model sample by location": ("models_tags", sent(model_tags_matching(sample=True, location=["Paris, France"]), tag_service, "model_tags_collection")),
+    "models matching by gender": ("models_tags", model_tags_query(gender=["Female"], age=(20, 30))),
+    "models matching by location": ("models_tags", model_tags_query(location=["Paris, France"], height=(160, 180))),
+    "brand tags of users": ("brands_tags", {"filter": {"user_Id": {"$in": USERS}}}),
+    "brand sample by location": ("brands_tags", sent(brand_feed_candidates(location="Paris, France"), feed_service, "brand_tags_collection")),
+    "brand feed sample": ("brands_tags", sent(brand_feed_candidates(), feed_service, "brand_tags_collection")),
+    "project tag": ("projects_tags", {"filter": {"user_Id": "brand_1", "project_Id": "project_1"}}),
+    "project tags of a user": ("projects_tags", {"filter": {"user_Id": "brand_1"}}),
+    "project sample": ("projects_tags", sent(tag_service.sample_matching_project_ids({"age": 25, "gender": "Female"}),
+                                             tag_service, "project_tags_collection")),
+    "model preference": ("model_preference", {"filter": {"user_Id": "model_1"}}),
+    "brand preference": ("brand_preferences", {"filter": {"user_Id": "brand_1"}}),
+    "model-brand preference": ("model_brand_preference", {"filter": {"user_Id": "model_1"}}),
+}
+
+
+def deep_page(endpoint, data, collection):
+    """The find a paginated filter endpoint sends for a page well past the first."""
+    cursor = encode_cursor({"id": str(ObjectId())})
+    return sent(endpoint(data, Response(), page_size=50, cursor=cursor), tag_service, collection)
+
+
+# Keyset pages behind the equality filters the filter endpoints are used with
+DEEP_PAGES = {
+    "models by gender": ("models_tags", deep_page(tag_service.filter_model_tags, ModelTagFilterRequest(gender="Female"), "model_tags_collection")),
+    "models by location": ("models_tags", deep_page(tag_service.filter_model_tags, ModelTagFilterRequest(location="Paris, France"), "model_tags_collection")),
+    "brands by location": ("brands_tags", deep_page(tag_service.filter_brand_tags, BrandTagFilterRequest(location="Paris, France"), "brand_tags_collection")),
+    "projects of a brand": ("projects_tags", deep_page(tag_service.filter_project_tags, ProjectTagFilterRequest(user_Id="brand_1"), "project_tags_collection")),
+}
+
+
+def winning_stages(explain) -> list:
+    """Stage names of every winning plan in an explain result (find, aggregate, classic or SBE)."""
+    stages = []
+
+    def walk(node, in_plan):
+        if isinstance(node, dict):
+            if in_plan and "stage" in node:
+                stages.append(node["stage"])
+            for key, value in node.items():
+                if key != "rejectedPlans":
+                    walk(value, in_plan or key == "winningPlan")
+        elif isinstance(node, list):
+            for item in node:
+                walk(item, in_plan)
+
+    walk(explain, False)
+    return stages
+
+
+def test_every_collection_has_declared_indexes():
+    from config import setting
+
+    collections = {value.name for value in vars(setting).values() if type(value).__name__ == "AsyncIOMotorCollection"}
+    assert collections == set(INDEXES)
+    for collection_name in INDEXES:
+        names = indexes._declared_names(collection_name)
+        assert len(names) == len(set(names)), collection_name
+    assert {collection for collection, _ in QUERY_SHAPES.values()} == set(INDEXES)
+
+
+@pytest.fixture(scope="module")
+def scratch_db():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pymongo import MongoClient
+
+    client = MongoClient(MONGO_URL)
+    client.drop_database(SCRATCH_DB)
+    database = client[SCRATCH_DB]
+    for collection_name in INDEXES:
+        database[collection_name].insert_one({"seed": True})  # Explain on a missing collection is just EOF
+
+    async def build():
+        motor_client = AsyncIOMotorClient(MONGO_URL)
+        await ensure_indexes(motor_client[SCRATCH_DB])
+        plan = await indexes.index_plan(motor_client[SCRATCH_DB])
+        motor_client.close()
+        return plan
+
+    plan = asyncio.run(build())
+    assert not any(changes["missing"] or changes["undeclared"] for changes in plan.values())
+    yield database
+    client.drop_database(SCRATCH_DB)
+    client.close()
+
+
+@pytest.mark.skipif(not MONGO_URL, reason="needs MONGO_URL pointing at a MongoDB server")
+@pytest.mark.parametrize("shape", list(QUERY_SHAPES))
+def test_hot_query_uses_an_index(scratch_db, shape):
+    collection_name, command = QUERY_SHAPES[shape]
+    stages = planned_stages(scratch_db, collection_name, command)
+    assert stages, f"no winning plan for {shape}"
+    assert "COLLSCAN" not in stages, f"{shape} scans {collection_name}: {stages}"
+
+
+@pytest.mark.skipif(not MONGO_URL, reason="needs MONGO_URL pointing at a MongoDB server")
+@pytest.mark.parametrize("shape", list(DEEP_PAGES))
+def test_deep_page_is_an_index_seek(scratch_db, shape):
+    collection_name, command = DEEP_PAGES[shape]
+    assert "$and" in command["filter"] and command["sort"] == {"_id": 1}  # A page after the first
+
+    stages = planned_stages(scratch_db, collection_name, command)
+    assert "IXSCAN" in stages, f"{shape} does not use an index: {stages}"
+    assert "COLLSCAN" not in stages and "SORT" not in stages, f"{shape} scans or sorts every match: {stages}"
+
+
+def planned_stages(database, collection_name, command) -> list:
+    if "pipeline" in command:
+        explained = {"aggregate": collection_name, "pipeline": command["pipeline"], "cursor": {}}
+    elif "key" in command:
+        explained = {"distinct": collection_name, **command}
+    else:
+        explained = {"find": collection_name, **command}
+    return winning_stages(database.command("explain", explained, verbosity="queryPlanner"))
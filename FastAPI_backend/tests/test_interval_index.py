@@ -0,0 +1,122 @@
+import asyncio
+import os
+import random
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.interval_index import ProjectIntervalIndex, build_interval_query, split_requirements
+from services.keywords import get_keywords
+
+
+def random_range(low, high):
+    a, b = random.randint(low, high), random.randint(low, high)
+    return (min(a, b), max(a, b))
+
+
+def make_project(i):
+    project = {"project_Id": f"project_{i}", "user_Id": f"brand_{i % 7}"}
+    if random.random() < 0.8:
+        project["age"] = random_range(18, 60)
+    if random.random() < 0.7:
+        project["height"] = random_range(150, 191)
+    if random.random() < 0.6:
+        project["gender"] = random.sample(get_keywords("genders"), 1)
+    if random.random() < 0.5:
+        project["location"] = random.choice(get_keywords("locations"))
+    return project
+
+
+def accepts(project, requirements):
+    """Reference interval semantics, checked one project at a time."""
+    ranges, keywords = split_requirements(requirements)
+    for field, (low, high) in ranges.items():
+        if field in project and (project[field][0] > high or project[field][1] < low):
+            return False
+    for field, values in keywords.items():
+        if field in project:
+            accepted = {project[field]} if isinstance(project[field], str) else set(project[field])
+            if not accepted & values:
+                return False
+    return True
+
+
+QUERIES = [
+    {"age": (20, 25)},
+    {"age": (20, 25), "height": (170, 175), "gender": ["Female"]},
+    {"location": ["Paris, France", "Rome, Italy"], "age": (40, 60)},
+    {"age": 30, "height": 168, "gender": "Male", "location": "Paris, France"},  # A model's own tag
+    {},
+]
+
+
+def test_match_agrees_with_reference():
+    random.seed(8)
+    projects = [make_project(i) for i in range(3000)]
+    index = ProjectIntervalIndex()
+    index.rebuild(projects)
+
+    for query in QUERIES:
+        expected = {p["project_Id"] for p in projects if accepts(p, query)}
+        assert set(index.match(*split_requirements(query))) == expected
+
+
+def test_selective_queries_check_few_candidates():
+    random.seed(9)
+    projects = [make_project(i) for i in range(3000)]
+    projects.append({"project_Id": "narrow", "age": (99, 99), "height": (150, 191)})
+    for p in projects[:-1]:
+        p["age"] = random_range(18, 60)  # Everyone but "narrow" constrains age
+    index = ProjectIntervalIndex()
+    index.rebuild(projects)
+
+    checked = []
+    accepts_original = index._accepts
+    index._accepts = lambda doc_id, ranges, keywords: checked.append(doc_id) or accepts_original(doc_id, ranges, keywords)
+
+    assert index.match(*split_requirements({"age": (95, 100)})) == ["narrow"]
+    assert len(checked) == 1
+
+
+def test_upsert_and_remove_kept_in_sync():
+    index = ProjectIntervalIndex()
+    index.rebuild([{"project_Id": "a", "age": (20, 30)}, {"project_Id": "b", "age": (40, 50)}])
+    query = split_requirements({"age": (25, 45)})
+    assert sorted(index.match(*query)) == ["a", "b"]
+
+    index.upsert({"project_Id": "a", "age": (10, 15)})
+    index.remove("b")
+    index.upsert({"project_Id": "c"})  # No age requirement: accepts every age
+    assert index.match(*query) == ["c"]
+    assert len(index) == 2
+
+    index.clear()
+    assert index.match(*query) == []
+
+
+def test_async_rebuild_replays_concurrent_writes():
+    index = ProjectIntervalIndex()
+
+    async def cursor():
+        for i in range(3):
+            yield {"project_Id": f"p{i}", "age": (20, 30)}
+            await asyncio.sleep(0)
+
+    async def scenario():
+        rebuild = asyncio.create_task(index.rebuild_async(cursor()))
+        await asyncio.sleep(0)
+        index.remove("p1")
+        index.upsert({"project_Id": "p3", "age": (25, 26)})
+        await rebuild
+
+    asyncio.run(scenario())
+    assert index.ready
+    assert sorted(index.match(*split_requirements({"age": 25}))) == ["p0", "p2", "p3"]
+
+
+def test_mongo_query_uses_interval_semantics():
+    query = build_interval_query(*split_requirements({"age": (20, 25), "gender": ["Female"]}))
+    assert query == {"$and": [
+        {"$or": [{"age": None}, {"age.0": {"$lte": 25}, "age.1": {"$gte": 20}}]},
+        {"$or": [{"gender": None}, {"gender": {"$in": ["Female"]}}]},
+    ]}
@@ -0,0 +1,126 @@
+import asyncio
+import base64
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwt
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import routes.role_management as role_management
+from services.jwks import JWKSKeyStore, cache_max_age
+
+
+def b64(number):
+    raw = number.to_bytes((number.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+class SigningKey:
+    def __init__(self, kid):
+        self.kid = kid
+        self.private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def jwk(self):
+        numbers = self.private.public_key().public_numbers()
+        return {"kty": "RSA", "kid": self.kid, "use": "sig", "alg": "RS256", "n": b64(numbers.n), "e": b64(numbers.e)}
+
+    def sign(self, claims):
+        pem = self.private.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+        return jwt.encode(claims, pem.decode(), algorithm="RS256", headers={"kid": self.kid})
+
+
+class JWKSServer:
+    """Local stand-in for Auth0's /.well-known/jwks.json."""
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.hits = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.hits += 1
+                time.sleep(0.05)  # Long enough for concurrent callers to pile up
+                body = json.dumps({"keys": [key.jwk() for key in server.keys]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Cache-Control", "public, max-age=600")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/.well-known/jwks.json"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+
+
+def test_cache_max_age():
+    assert cache_max_age("public, max-age=15000") == 15000
+    assert cache_max_age("max-age=5") == 60
+    assert cache_max_age("no-cache, max-age=3600") == 600
+    assert cache_max_age(None) == 600
+
+
+def test_unknown_kid_refetches_once_for_concurrent_callers():
+    old, new = SigningKey("old"), SigningKey("new")
+    server = JWKSServer([old])
+    store = JWKSKeyStore(server.url)
+
+    async def run():
+        assert await store.get_key("old") is not None
+        assert all(await asyncio.gather(*(store.get_key("old") for _ in range(20))))
+        assert server.hits == 1
+        assert store.expires_at - store.fetched_at == pytest.approx(600)  # Monotonic clock floats
+
+        # Auth0 rotates its keys: the first tokens signed with the new kid refetch once, together
+        server.keys = [old, new]
+        store.fetched_at -= 60  # Past the unknown-kid cooldown
+        keys = await asyncio.gather(*(store.get_key("new") for _ in range(10)))
+        assert all(keys) and server.hits == 2
+
+        # Forged kids right after a fetch do not reach the JWKS endpoint
+        assert await store.get_key("forged") is None
+        assert server.hits == 2
+        await store.aclose()
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.close()
+
+
+def test_token_dependency_verifies_against_cached_keys(monkeypatch):
+    key = SigningKey("k1")
+    server = JWKSServer([key])
+    monkeypatch.setattr(role_management, "jwks_store", JWKSKeyStore(server.url))
+    monkeypatch.setattr(role_management, "AUTH0_DOMAIN", "tenant.example.com")
+    monkeypatch.setattr(role_management, "AUTH0_AUDIENCE", "https://api.example.com")
+    claims = {"sub": "auth0|123", "aud": "https://api.example.com", "iss": "https://tenant.example.com/", "exp": int(time.time()) + 3600}
+
+    async def run():
+        for _ in range(5):
+            assert await role_management.get_user_id_from_token(f"Bearer {key.sign(claims)}") == "auth0|123"
+        assert server.hits == 1
+
+        result = await role_management.verify_token(f"Bearer {SigningKey('k1').sign(claims)}")  # Right kid, wrong key
+        assert not result.is_valid
+        await role_management.jwks_store.aclose()
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.close()
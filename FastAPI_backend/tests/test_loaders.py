@@ -0,0 +1,69 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import models.saved_list as saved_list
+import services.Modellatag_service as tag_service
+import services.loaders as loaders
+from services.loaders import DataLoader, request_loaders, start_request_loaders
+from conftest import FakeCollection
+
+
+def user_docs(*user_ids):
+    return FakeCollection([{"user_Id": user_id} for user_id in user_ids])
+
+
+def test_lookups_in_one_tick_share_one_query():
+    users = user_docs("model_1", "model_2", "brand_1")
+    loader = DataLoader(users, "user_Id")
+
+    async def run():
+        first = await asyncio.gather(
+            loader.load("model_1"), loader.load("brand_1"), loader.load("model_1"), loader.load("ghost_1"),
+        )
+        assert [doc and doc["user_Id"] for doc in first] == ["model_1", "brand_1", "model_1", None]
+        assert users.queries == [{"user_Id": {"$in": ["model_1", "brand_1", "ghost_1"]}}]
+
+        # Cached keys cost nothing; new ones go out in the next batch
+        await loader.load_many(["brand_1", "model_2"])
+        assert users.queries[1] == {"user_Id": {"$in": ["model_2"]}}
+        assert (loader.loads, loader.queries) == (6, 2)
+
+    asyncio.run(run())
+
+
+def test_saved_list_add_resolves_both_users_in_one_query(monkeypatch):
+    users = user_docs("model_1", "brand_1")
+    monkeypatch.setattr(loaders, "user_collection", users)
+    monkeypatch.setattr(saved_list, "saved_list_collection", FakeCollection())
+
+    # add_saved_id is shadowed by the project variant, so take the endpoint from the router
+    add_saved_id = next(route.endpoint for route in saved_list.router.routes if route.path.endswith("/add"))
+
+    async def run():
+        # What the HTTP middleware does for every request
+        request = start_request_loaders()
+        assert request_loaders() is request
+        result = await add_saved_id("brand_1", ["model_1"])
+        assert result == {"message": "ID added successfully"}
+        # Previously two find_one round trips
+        assert request.stats() == {"lookups": 2, "queries": 1}
+
+    asyncio.run(run())
+    assert len(users.queries) == 1
+
+
+def test_tag_reads_go_through_lazily_created_loaders(monkeypatch):
+    tags = user_docs("model_1", "model_2")
+    monkeypatch.setattr(loaders, "model_tags_collection", tags)
+
+    async def run():
+        request = start_request_loaders()
+        assert request._loaders == {}  # Nothing is allocated for requests that never look anything up
+        found = await asyncio.gather(tag_service.get_model_tag("model_1"), tag_service.get_model_tag("model_2"))
+        assert [tag.user_Id for tag in found] == ["model_1", "model_2"]
+        assert list(request._loaders) == ["model_tags"] and request.stats() == {"lookups": 2, "queries": 1}
+
+    asyncio.run(run())
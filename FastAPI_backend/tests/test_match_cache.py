@@ -0,0 +1,121 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import services.Modella_preference_service as preference_service
+from services.match_cache import BRANDS, MODELS, PROJECTS, MatchCache, canonical_signature, match_cache, project_predicate, query_matches, query_predicate
+
+
+def test_signature_ignores_order_and_unset_fields():
+    a = {"gender": ["Male", "Female"], "age": (30, 20), "location": None, "work_Field": []}
+    b = {"age": [20, 30], "gender": ["Female", "Male"]}
+    assert canonical_signature(a) == canonical_signature(b)
+    assert canonical_signature(a) != canonical_signature({"age": [20, 31], "gender": ["Female", "Male"]})
+
+
+def test_query_matches_like_mongodb():
+    query = {"age": {"$gte": 20, "$lte": 30}, "work_Field": {"$in": ["Runway", "Editorial"]}, "gender": "Female"}
+    assert query_matches({"age": 25, "work_Field": ["Editorial"], "gender": "Female"}, query)
+    assert not query_matches({"age": 31, "work_Field": ["Editorial"], "gender": "Female"}, query)
+    assert not query_matches({"age": 25, "work_Field": ["Commercial"], "gender": "Female"}, query)
+    assert not query_matches({"work_Field": ["Editorial"], "gender": "Female"}, query)
+
+
+def test_tag_write_evicts_only_affected_signatures():
+    cache = MatchCache()
+    paris = {"location": {"$in": ["Paris, France"]}}
+    rome = {"location": {"$in": ["Rome, Italy"]}}
+    cache.store(MODELS, "brand_1", canonical_signature({"location": ["Paris, France"]}), query_predicate(paris), ["model_1"])
+    cache.store(MODELS, "brand_2", canonical_signature({"location": ["Rome, Italy"]}), query_predicate(rome), ["model_2"])
+
+    # A model moving from Rome to Paris changes both results
+    cache.invalidate(MODELS, {"user_Id": "model_3", "location": "Milan, Italy"}, {"user_Id": "model_3", "location": "Paris, France"})
+    assert cache.lookup(MODELS, "brand_1") is None
+    assert cache.lookup(MODELS, "brand_2") == (["model_2"], None)
+
+    # Other kinds are untouched by model tag writes
+    cache.store(PROJECTS, "model_1", "{}", project_predicate({"age": (20, 25)}), ["project_1"])
+    cache.invalidate(MODELS, {"location": "Rome, Italy"})
+    assert cache.lookup(PROJECTS, "model_1") == (["project_1"], None)
+    cache.invalidate(PROJECTS, {"project_Id": "project_2", "age": (40, 50)})
+    assert cache.lookup(PROJECTS, "model_1") == (["project_1"], None)
+    cache.invalidate(PROJECTS, {"project_Id": "project_2", "age": (24, 50)})
+    assert cache.lookup(PROJECTS, "model_1") is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (3, 2, 3)
+
+
+def test_by_user_id_endpoint_is_cached_until_preference_changes(monkeypatch):
+    calls = {"preference": 0, "sample": 0}
+    preference = {"user_Id": "model_1", "client_Type": "Model", "location": ["Paris, France"], "rating_level": None}
+
+    async def fake_get_preference(user_id):
+        calls["preference"] += 1
+        return dict(preference)
+
+    async def fake_sample_documents(collection, query, size, projection=None):
+        calls["sample"] += 1
+        return [{"user_Id": "brand_1"}, {"user_Id": "brand_2"}]
+
+    monkeypatch.setattr(preference_service, "get_model_brand_preference", fake_get_preference)
+    monkeypatch.setattr(preference_service, "sample_documents", fake_sample_documents)
+    match_cache.clear()
+
+    async def run():
+        first = await preference_service.filter_Model_brand_preference_by_user_id("model_1")
+        second = await preference_service.filter_Model_brand_preference_by_user_id("model_1")
+        assert first == second == ["brand_1", "brand_2"]
+        assert calls == {"preference": 1, "sample": 1}
+
+        # A brand elsewhere does not evict the entry; one in Paris does
+        match_cache.invalidate(BRANDS, {"user_Id": "brand_9", "location": "Rome, Italy"})
+        await preference_service.filter_Model_brand_preference_by_user_id("model_1")
+        assert calls["sample"] == 1
+        match_cache.invalidate(BRANDS, {"user_Id": "brand_9", "location": "Paris, France"})
+        await preference_service.filter_Model_brand_preference_by_user_id("model_1")
+        assert calls["sample"] == 2
+
+        # Preference writes forget the user's entry
+        match_cache.forget_user(BRANDS, "model_1")
+        await preference_service.filter_Model_brand_preference_by_user_id("model_1")
+        assert calls == {"preference": 3, "sample": 3}
+
+    asyncio.run(run())
+    match_cache.clear()
+
+
+def test_evicted_entries_take_their_user_pointers_along():
+    cache = MatchCache(max_entries=2)
+    for i in range(5):
+        cache.store(MODELS, f"brand_{i}", f"sig_{i}", query_predicate({}), [f"model_{i}"])
+    cache.store(MODELS, "brand_5", "sig_4", query_predicate({}), ["model_4"])  # Shares brand_4's entry
+
+    assert set(cache.users) == {(MODELS, "brand_3"), (MODELS, "brand_4"), (MODELS, "brand_5")}
+    cache.invalidate(MODELS, {"user_Id": "model_9"})
+    assert cache.users == {} and cache.pointers == {}
+    assert cache.stats()["evictions"] == 5
+
+
+def test_results_computed_across_a_preference_write_are_not_cached(monkeypatch):
+    preference = {"user_Id": "model_1", "client_Type": "Model", "location": ["Paris, France"], "rating_level": None}
+
+    async def fake_get_preference(user_id):
+        return dict(preference)
+
+    async def racing_sample_documents(collection, query, size, projection=None):
+        # The preference is updated while the old one's brands are being fetched
+        match_cache.forget_user(BRANDS, "model_1")
+        return [{"user_Id": "brand_1"}]
+
+    monkeypatch.setattr(preference_service, "get_model_brand_preference", fake_get_preference)
+    monkeypatch.setattr(preference_service, "sample_documents", racing_sample_documents)
+    match_cache.clear()
+    discarded = match_cache.stats()["discarded"]
+
+    assert asyncio.run(preference_service.filter_Model_brand_preference_by_user_id("model_1")) == ["brand_1"]
+    assert match_cache.lookup(BRANDS, "model_1") is None
+    assert match_cache.stats()["discarded"] == discarded + 1
+    match_cache.clear()
@@ -0,0 +1,188 @@
+import asyncio
+import math
+import os
+import random
+import sys
+
+import pytest
+from fastapi import HTTPException, Response
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import services.Modella_preference_service as preference_service
+from models.Modella_preference import BrandModelPreferenceFilterRequest
+from services.keywords import get_keywords
+from services.match_scoring import FIELD_WEIGHTS, NUMERIC_FIELDS, RANGE_TOLERANCE, ModelScoringEngine
+
+
+def make_tag(i):
+    return {
+        "user_Id": f"model_{i}",
+        "age": random.randint(18, 60),
+        "height": random.randint(150, 191),
+        "gender": random.choice(get_keywords("genders")),
+        "location": random.choice(get_keywords("locations")),
+        "work_Field": random.sample(get_keywords("work_fields"), 3),
+        "skin_Tone": random.choice(get_keywords("skin_tones")),
+    }
+
+
+def reference_score(doc, preference):
+    """Per-document scorer with the engine's weighting rules."""
+    total = weight_sum = 0.0
+    for field, wanted in preference.items():
+        if not wanted:
+            continue
+        weight = FIELD_WEIGHTS[field]
+        weight_sum += weight
+        value = doc.get(field)
+        if value is None:
+            continue
+        if field in NUMERIC_FIELDS:
+            low, high = wanted
+            distance = max(low - value, 0) + max(value - high, 0)
+            total += weight * min(max(1 - distance / RANGE_TOLERANCE[field], 0), 1)
+        elif isinstance(value, list):
+            total += weight * len(set(value) & set(wanted)) / min(len(value), len(wanted))
+        elif value in wanted:
+            total += weight
+    return total / weight_sum
+
+
+PREFERENCE = {
+    "gender": ["Female"],
+    "age": (20, 30),
+    "height": (165, 180),
+    "work_Field": get_keywords("work_fields")[:2],
+    "location": get_keywords("locations")[:3],
+    "waist": (60, 70),  # never set on the test tags, so it only dilutes the score
+    "skin_Tone": None,
+}
+
+
+def test_scores_match_reference():
+    random.seed(3)
+    docs = [make_tag(i) for i in range(2000)]
+    engine = ModelScoringEngine()
+    engine.rebuild(docs)
+
+    scores = engine.score(PREFERENCE)
+    for doc in docs:
+        assert math.isclose(scores[engine.rows[doc["user_Id"]]], reference_score(doc, PREFERENCE), abs_tol=1e-5)
+
+
+def test_rank_returns_best_first():
+    random.seed(4)
+    docs = [make_tag(i) for i in range(2000)]
+    engine = ModelScoringEngine()
+    engine.rebuild(docs)
+
+    ranked = engine.rank(PREFERENCE, 25)
+    expected = sorted((reference_score(doc, PREFERENCE) for doc in docs), reverse=True)[:25]
+    assert [score for _, score in ranked] == sorted((score for _, score in ranked), reverse=True)
+    assert all(math.isclose(a, b, abs_tol=1e-5) for (_, a), b in zip(ranked, expected))
+    assert len({user_id for user_id, _ in ranked}) == 25
+
+
+def test_upsert_and_remove_kept_in_sync():
+    engine = ModelScoringEngine()
+    engine.rebuild([])
+    preference = {"gender": ["Female"]}
+
+    engine.upsert({"user_Id": "a", "gender": "Female"})
+    engine.upsert({"user_Id": "b", "gender": "Male"})
+    assert engine.rank(preference, 10) == [("a", 1.0), ("b", 0.0)]
+
+    engine.upsert({"user_Id": "b", "gender": "Female"})
+    engine.remove("a")
+    assert engine.rank(preference, 10) == [("b", 1.0)]
+
+    # Freed rows are reused and the arrays grow past their initial capacity
+    for i in range(3000):
+        engine.upsert({"user_Id": f"m{i}", "gender": "Male", "age": 25})
+    assert len(engine) == 3001
+    assert engine.rank(preference, 1) == [("b", 1.0)]
+
+    engine.clear()
+    assert engine.rank(preference, 10) == []
+
+
+def test_async_rebuild_replays_concurrent_writes():
+    engine = ModelScoringEngine()
+
+    async def cursor():
+        for i in range(3):
+            yield {"user_Id": f"model_{i}", "gender": "Male"}
+            await asyncio.sleep(0)
+
+    async def scenario():
+        rebuild = asyncio.create_task(engine.rebuild_async(cursor()))
+        await asyncio.sleep(0)
+        engine.upsert({"user_Id": "model_0", "gender": "Female"})
+        engine.remove("model_1")
+        await rebuild
+
+    asyncio.run(scenario())
+    assert engine.ready
+    assert engine.rank({"gender": ["Female"]}, 10) == [("model_0", 1.0), ("model_2", 0.0)]
+
+
+def test_rank_pages_cover_every_model_once():
+    random.seed(5)
+    engine = ModelScoringEngine()
+    engine.rebuild(make_tag(i) for i in range(500))
+    preference = {"gender": ["Female"], "age": (20, 30)}  # coarse scores, so many ties
+
+    pages, after = [], None
+    while True:
+        page = engine.rank(preference, 40, after)
+        if not page:
+            break
+        pages.extend(page)
+        after = (page[-1][1], page[-1][0])
+
+    assert pages == engine.rank(preference, 500)
+    assert len({user_id for user_id, _ in pages}) == 500
+
+
+def test_paging_is_refused_when_it_would_be_ignored(monkeypatch):
+    monkeypatch.setattr(preference_service, "model_scoring_engine", ModelScoringEngine())  # Still loading
+    data = BrandModelPreferenceFilterRequest(gender=["Female"])
+
+    def status(**params):
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(preference_service.filter_brand_Model_preference_matched_user_ids(data, Response(), **params))
+        return error.value.status_code
+
+    assert status(ranked=False, page_size=20, cursor=None) == 400  # Unranked results have no order to page through
+    assert status(ranked=True, page_size=None, cursor="abc") == 400
+    assert status(ranked=True, page_size=20, cursor=None) == 503  # No random sample in place of a page
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(preference_service.filter_brand_Model_preference_by_user_id("brand_1", Response(), ranked=False, page_size=20, cursor=None))
+    assert error.value.status_code == 400
+
+
+def test_paging_survives_the_cursor_model_being_removed():
+    engine = ModelScoringEngine()
+    engine.rebuild({"user_Id": f"model_{i}", "gender": "Female"} for i in range(6))  # One tie group
+    preference = {"gender": ["Female"]}
+
+    first = engine.rank(preference, 2)
+    assert first == [("model_0", 1.0), ("model_1", 1.0)]
+    engine.remove("model_1")
+    engine.upsert({"user_Id": "model_9", "gender": "Female"})  # Reuses the freed row
+    rest = engine.rank(preference, 10, (first[-1][1], first[-1][0]))
+    assert [user_id for user_id, _ in rest] == ["model_2", "model_3", "model_4", "model_5", "model_9"]
+
+
+def test_forged_cursor_id_is_refused(monkeypatch):
+    engine = ModelScoringEngine()
+    engine.rebuild([{"user_Id": "model_0", "gender": "Female"}])
+    monkeypatch.setattr(preference_service, "model_scoring_engine", engine)
+    data = BrandModelPreferenceFilterRequest(gender=["Female"])
+
+    for forged in ([1, 2], 7, None):
+        cursor = preference_service.encode_cursor({"score": 1.0, "id": forged})
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(preference_service.filter_brand_Model_preference_matched_user_ids(data, Response(), ranked=True, page_size=20, cursor=cursor))
+        assert error.value.status_code == 400
@@ -0,0 +1,46 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.pagination import decode_cursor, encode_cursor, find_page
+from conftest import FakeCollection
+
+
+def test_cursor_round_trip():
+    position = {"score": 0.8125, "id": "model_7"}
+    assert decode_cursor(encode_cursor(position)) == position
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", encode_cursor({"score": 1.0}), "W10"])
+def test_invalid_cursor_rejected(cursor):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor)
+    assert exc.value.status_code == 400
+
+
+def test_find_page_walks_every_match_once():
+    docs = [{"_id": ObjectId(), "gender": "Female" if i % 3 else "Male", "n": i} for i in range(50)]
+    collection = FakeCollection(docs)
+
+    async def walk():
+        seen, cursor = [], None
+        while True:
+            page, cursor = await find_page(collection, {"gender": "Female"}, 7, cursor)
+            seen.extend(doc["n"] for doc in page)
+            if cursor is None:
+                return seen
+
+    assert asyncio.run(walk()) == [i for i in range(50) if i % 3]
+    # Later pages seek past the previous page's last _id instead of skipping
+    assert "$and" in collection.queries[-1]
+
+
+def test_find_page_rejects_bad_object_id():
+    with pytest.raises(HTTPException):
+        asyncio.run(find_page(FakeCollection([]), {}, 10, encode_cursor({"id": "nope"})))
@@ -0,0 +1,45 @@
+import asyncio
+import os
+import random
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.random_sampling import RANDOM_KEY_FIELD, sample_documents, with_random_key, with_random_key_on_insert
+from conftest import FakeCollection
+
+
+def test_sample_returns_distinct_matches():
+    random.seed(1)
+    docs = [with_random_key({"user_Id": f"m{i}", "gender": random.choice(["Female", "Male"])}) for i in range(1000)]
+    collection = FakeCollection(docs)
+
+    sample = asyncio.run(sample_documents(collection, {"gender": "Female"}, 50))
+
+    assert len(sample) == 50
+    assert len({doc["user_Id"] for doc in sample}) == 50
+    assert all(doc["gender"] == "Female" for doc in sample)
+
+
+def test_sample_wraps_around_small_result_sets():
+    docs = [with_random_key({"user_Id": f"m{i}"}) for i in range(30)]
+
+    for _ in range(20):
+        sample = asyncio.run(sample_documents(FakeCollection(docs), {}, 100))
+        assert sorted(doc["user_Id"] for doc in sample) == sorted(doc["user_Id"] for doc in docs)
+
+
+def test_sample_covers_the_collection():
+    random.seed(2)
+    docs = [with_random_key({"user_Id": f"m{i}"}) for i in range(200)]
+    seen = set()
+    for _ in range(2000):
+        seen.update(doc["user_Id"] for doc in asyncio.run(sample_documents(FakeCollection(docs), {}, 10)))
+    assert len(seen) == 200
+
+
+def test_random_key_only_set_on_insert():
+    assert RANDOM_KEY_FIELD in with_random_key_on_insert({"$set": {"gender": "Female"}})["$setOnInsert"]
+    # Re-setting the stored key must not also appear in $setOnInsert (MongoDB rejects the conflict)
+    update = with_random_key_on_insert({"$set": {"gender": "Female", RANDOM_KEY_FIELD: 0.5}})
+    assert "$setOnInsert" not in update
@@ -0,0 +1,130 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import services.Modella_preference_service as preference_service
+import services.rating_services as rating_services
+from models.Modella_preference import ModelBrandPreferenceFilterRequest
+from conftest import FakeCollection
+
+
+RATINGS = [
+    {"user_Id": "u1", "ratedBy_Id": "x", "rating": 5},
+    {"user_Id": "u2", "ratedBy_Id": "x", "rating": 3},
+    {"user_Id": "u3", "ratedBy_Id": "x", "rating": 5},
+    {"user_Id": "u3", "ratedBy_Id": "y", "rating": 5},
+    {"user_Id": "u3", "ratedBy_Id": "z", "rating": 2},
+    {"user_Id": "u4", "ratedBy_Id": "y", "rating": 1},
+]
+
+
+def summaries_from(ratings, monkeypatch):
+    summaries = FakeCollection()
+    monkeypatch.setattr(rating_services, "rating_collection", FakeCollection(ratings))
+    monkeypatch.setattr(rating_services, "rating_summary_collection", summaries)
+    asyncio.run(rating_services.rebuild_rating_summaries_service())
+    summaries.queries.clear()
+    return summaries
+
+
+def strip(summary):
+    return {key: value for key, value in summary.items() if key not in ("updated_at", "rebuild_id")}
+
+
+def test_incremental_updates_match_rebuild(monkeypatch):
+    summaries = summaries_from([], monkeypatch)
+
+    async def writes():
+        await rating_services._apply_rating_summary("u3", {5: 1})  # create
+        await rating_services._apply_rating_summary("u3", {3: 1})  # create
+        await rating_services._apply_rating_summary("u3", {3: -1, 4: 1})  # update 3 -> 4
+        await rating_services._apply_rating_summary("u3", {2: 1})  # create
+        await rating_services._apply_rating_summary("u3", {5: -1})  # delete
+        return await rating_services.get_rating_summary_service("u3")
+
+    incremental = asyncio.run(writes())
+    rebuilt = summaries_from([{"user_Id": "u3", "rating": 4}, {"user_Id": "u3", "rating": 2}], monkeypatch)
+
+    assert strip(incremental) == strip(rebuilt.docs[0]) == {
+        "user_Id": "u3",
+        "count": 2,
+        "sum": 6,
+        "mean": 3,
+        "histogram": {"1": 0, "2": 1, "3": 0, "4": 1, "5": 0},
+    }
+
+
+def test_rebuild_drops_users_without_ratings(monkeypatch):
+    summaries = summaries_from(RATINGS, monkeypatch)
+    monkeypatch.setattr(rating_services, "rating_collection", FakeCollection(RATINGS[:2]))
+
+    result = asyncio.run(rating_services.rebuild_rating_summaries_service())
+
+    assert result["removed"] == 2
+    assert sorted(doc["user_Id"] for doc in summaries.docs) == ["u1", "u2"]
+
+
+def test_rebuild_does_not_interleave_with_rating_writes(monkeypatch):
+    summaries = summaries_from(RATINGS, monkeypatch)
+    gate = rating_services.SummaryWriteGate()
+    monkeypatch.setattr(rating_services, "summary_write_gate", gate)
+    # Written by another instance after the rebuild started
+    summaries.docs.append({"user_Id": "u9", "count": 1, "updated_at": datetime.now(timezone.utc) + timedelta(minutes=1)})
+    order = []
+
+    async def rebuild():
+        await rating_services.rebuild_rating_summaries_service()
+        order.append("rebuild")
+
+    async def write():
+        async with gate.write():
+            order.append("write")
+
+    async def run():
+        async with gate.write():
+            rebuilding = asyncio.create_task(rebuild())
+            await asyncio.sleep(0)
+            late = asyncio.create_task(write())
+            await asyncio.sleep(0)
+            assert order == []  # The rebuild waits for the write in flight; the new write waits for the rebuild
+        await asyncio.gather(rebuilding, late)
+
+    asyncio.run(run())
+    assert order == ["rebuild", "write"]
+    assert sorted(doc["user_Id"] for doc in summaries.docs) == ["u1", "u2", "u3", "u4", "u9"]
+
+
+def test_filter_user_ids_by_rating_level_uses_one_query(monkeypatch):
+    summaries = summaries_from(RATINGS, monkeypatch)
+
+    user_ids = [f"u{i}" for i in range(100, 0, -1)]
+    result = asyncio.run(rating_services.filter_user_ids_by_rating_level(user_ids, 5))
+
+    assert result == ["u3", "u1"]  # input order kept
+    assert len(summaries.queries) == 1
+    assert asyncio.run(rating_services.filter_user_ids_by_rating_level([], 5)) == []
+    assert len(summaries.queries) == 1
+
+
+def test_filter_users_by_most_frequent_rating(monkeypatch):
+    summaries = summaries_from(RATINGS, monkeypatch)
+
+    result = asyncio.run(rating_services.filter_users_by_most_frequent_rating(["u1", "u2", "u3", "u4", "u9"], 5))
+
+    assert result == ["u1", "u3"]
+    assert len(summaries.queries) == 1
+
+
+def test_matching_endpoint_filters_ratings_in_one_query(monkeypatch):
+    summaries = summaries_from(RATINGS, monkeypatch)
+    brands = FakeCollection([{"user_Id": f"u{i}", "gender": "Female", "rand_key": i / 10} for i in range(1, 6)])
+    monkeypatch.setattr(preference_service, "brand_tags_collection", brands)
+
+    request = ModelBrandPreferenceFilterRequest(rating_level=5)
+    result = asyncio.run(preference_service.filter_Model_brand_preference_matched_user_ids(request))
+
+    assert sorted(result) == ["u1", "u3"]
+    assert len(summaries.queries) == 1
@@ -0,0 +1,187 @@
+import asyncio
+import io
+import os
+import sys
+import threading
+import uuid
+
+import pytest
+from botocore.exceptions import ClientError
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import services.file_service as file_service
+import services.storage as storage
+from conftest import FakeCollection
+
+MB = 1024 * 1024
+
+
+class FakeS3:
+    """In-memory stand-in for the boto3 S3 client, with S3's multipart part-size rule."""
+
+    def __init__(self):
+        self.objects = {}  # key -> {"Body": bytes, "ContentType": str}
+        self.uploads = {}  # UploadId -> {"Key": ..., "ContentType": ..., "Parts": {n: bytes}}
+        self.policies = {}  # Presigned POST policy id -> (Key, Conditions)
+        self.calls = []
+        self.largest_body = 0
+
+    def _body(self, body):
+        self.largest_body = max(self.largest_body, len(body))
+        return bytes(body)
+
+    def put_object(self, Bucket, Key, Body, ContentType=None, **kwargs):
+        self.calls.append("put_object")
+        self.objects[Key] = {"Body": self._body(Body), "ContentType": ContentType, **kwargs}
+        return {"ETag": f'"{uuid.uuid4().hex}"'}
+
+    def create_multipart_upload(self, Bucket, Key, ContentType=None, **kwargs):
+        self.calls.append("create_multipart_upload")
+        upload_id = uuid.uuid4().hex
+        self.uploads[upload_id] = {"Key": Key, "ContentType": ContentType, "Parts": {}}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self.calls.append("upload_part")
+        self.uploads[UploadId]["Parts"][PartNumber] = self._body(Body)
+        return {"ETag": f'"part-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.calls.append("complete_multipart_upload")
+        upload = self.uploads.pop(UploadId)
+        numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+        if any(len(upload["Parts"][n]) < storage.CHUNK_SIZE for n in numbers[:-1]):
+            raise ClientError({"Error": {"Code": "EntityTooSmall"}}, "CompleteMultipartUpload")
+        self.objects[Key] = {"Body": b"".join(upload["Parts"][n] for n in numbers), "ContentType": upload["ContentType"]}
+        return {"Key": Key}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.calls.append("abort_multipart_upload")
+        self.uploads.pop(UploadId, None)
+
+    def get_object(self, Bucket, Key):
+        self.calls.append("get_object")
+        return {"Body": io.BytesIO(self.objects[Key]["Body"]), "ContentType": self.objects[Key]["ContentType"]}
+
+    def head_object(self, Bucket, Key):
+        self.calls.append("head_object")
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        stored = self.objects[Key]
+        return {"ContentLength": len(stored["Body"]), "ContentType": stored["ContentType"]}
+
+    def delete_object(self, Bucket, Key):
+        self.calls.append("delete_object")
+        self.objects.pop(Key, None)
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600):
+        self.calls.append("generate_presigned_url")
+        return f"https://s3.test/{Params['Key']}?expires={ExpiresIn}&signature={self.calls.count('generate_presigned_url')}"
+
+    def generate_presigned_post(self, Bucket, Key, Fields=None, Conditions=None, ExpiresIn=3600):
+        self.calls.append("generate_presigned_post")
+        policy = uuid.uuid4().hex
+        self.policies[policy] = (Key, Conditions or [])
+        return {"url": f"https://{Bucket}.s3.amazonaws.com/", "fields": {**(Fields or {}), "key": Key, "policy": policy}}
+
+    def post_object(self, fields, body):
+        """What S3 does with a browser POST: enforce the signed policy, then store."""
+        key, conditions = self.policies[fields["policy"]]
+        for condition in conditions:
+            if isinstance(condition, list) and condition[0] == "content-length-range" and not condition[1] <= len(body) <= condition[2]:
+                return 400
+            if isinstance(condition, dict) and any(fields.get(name) != value for name, value in condition.items()):
+                return 403
+        self.objects[key] = {"Body": body, "ContentType": fields.get("Content-Type")}
+        return 204
+
+
+class CountingIO(io.BytesIO):
+    """Request body that records how much of it was read."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+def upload_of(data, content_type="video/mp4", filename="reel.mp4"):
+    body = CountingIO(data)
+    return body, UploadFile(file=body, filename=filename, headers=Headers({"content-type": content_type}))
+
+
+def test_large_file_is_streamed_in_parts(monkeypatch):
+    s3 = FakeS3()
+    monkeypatch.setattr(storage, "s3_client", s3)
+    data = os.urandom(12 * MB)
+    _, file = upload_of(data)
+
+    size = asyncio.run(storage.stream_upload(file, "bucket", "video/reel.mp4", "video/mp4", 25 * MB))
+
+    assert size == len(data)
+    assert s3.objects["video/reel.mp4"] == {"Body": data, "ContentType": "video/mp4"}
+    assert s3.calls.count("upload_part") == 3
+    assert s3.largest_body == storage.CHUNK_SIZE  # Never more than one chunk in flight
+
+
+def test_small_file_is_a_single_put(monkeypatch):
+    s3 = FakeS3()
+    monkeypatch.setattr(storage, "s3_client", s3)
+    _, file = upload_of(b"png-bytes", "image/png", "a.png")
+
+    assert asyncio.run(storage.stream_upload(file, "bucket", "image/a.png", "image/png", 25 * MB)) == 9
+    assert s3.calls == ["put_object"]
+
+
+def test_oversized_upload_is_cut_off_and_aborted(monkeypatch):
+    s3, files = FakeS3(), FakeCollection()
+
+    async def registered(user_id):
+        return True
+
+    monkeypatch.setattr(storage, "s3_client", s3)
+    monkeypatch.setattr(file_service, "file_collection", files)
+    monkeypatch.setattr(file_service, "_validate_user", registered)
+    body, file = upload_of(b"\0" * (40 * MB))
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(file_service.upload_file(file, "model_1", "video"))
+
+    assert error.value.status_code == 400
+    assert body.bytes_read == 30 * MB  # Reading stopped at the first chunk past 25MB
+    assert not s3.calls and not s3.objects and not s3.uploads  # Caught while hashing, before anything reached S3
+    assert not files.docs
+
+
+def test_calls_report_queueing_and_time_out_without_blocking_the_loop():
+    release = threading.Event()
+
+    class SlowS3:
+        def head_object(self, Bucket, Key):
+            release.wait(5)
+            return {"ContentLength": 1}
+
+    store = storage.AsyncStorage(SlowS3(), workers=2)
+
+    async def run():
+        calls = [asyncio.create_task(store.call("head_object", timeout=0.2, Bucket="b", Key=str(i))) for i in range(3)]
+        await asyncio.sleep(0.05)  # The loop keeps running while all workers are busy
+        assert (store.stats()["in_flight"], store.stats()["queued"]) == (2, 1)
+
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        assert all(isinstance(result, HTTPException) and result.status_code == 504 for result in results)
+        release.set()
+        await asyncio.sleep(0.1)  # Let the stuck workers finish
+
+    asyncio.run(run())
+    stats = store.stats()
+    assert stats["timeouts"] == 3 and stats["in_flight"] == 0 and stats["queued"] == 0
+    assert stats["operations"]["head_object"]["calls"] == 2  # The call that timed out in the queue never ran
+    store.shutdown()
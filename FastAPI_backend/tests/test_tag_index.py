@@ -0,0 +1,123 @@
+import asyncio
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.keywords import get_keywords
+from services.tag_index import Bitmap, TagBitmapIndex, UnsupportedQuery
+from conftest import matches
+
+
+def make_tag(i):
+    return {
+        "user_Id": f"model_{i}",
+        "age": random.randint(18, 60),
+        "height": random.randint(150, 191),
+        "gender": random.choice(get_keywords("genders")),
+        "location": random.choice(get_keywords("locations")),
+        "work_Field": random.sample(get_keywords("work_fields"), 3),
+        "skin_Tone": random.choice(get_keywords("skin_tones")),
+    }
+
+
+def matched_user_ids(index, query):
+    return sorted(index.user_ids[doc_id] for doc_id in index.match(query))
+
+
+QUERIES = [
+    {"gender": "Female"},
+    {"location": {"$in": ["Paris, France", "Rome, Italy"]}},
+    {"work_Field": {"$in": ["Beauty Modeling", "Editorial Modeling"]}},
+    {"work_Field": "Beauty Modeling", "gender": "Male"},
+    {"age": 25},
+    {"age": {"$gte": 20, "$lte": 30}, "height": {"$gte": 160, "$lte": 175}},
+    {"gender": "Female", "age": {"$gte": 18, "$lte": 22}, "location": {"$in": ["Mumbai, India"]}},
+    {"user_Id": "model_3"},
+]
+
+
+def test_bitmap_set_operations():
+    a = Bitmap.from_ids([1, 5, 65535, 65536, 200000])
+    b = Bitmap.from_ids([5, 65536, 7])
+    assert list(a & b) == [5, 65536]
+    assert list(a | b) == [1, 5, 7, 65535, 65536, 200000]
+    assert len(a) == 5 and 200000 in a and 2 not in a
+    a.discard(200000)
+    assert 200000 not in a and len(a) == 4
+
+
+def test_match_agrees_with_reference_filter():
+    random.seed(7)
+    docs = [make_tag(i) for i in range(2000)]
+    index = TagBitmapIndex()
+    index.rebuild(docs)
+    for query in QUERIES:
+        expected = sorted(doc["user_Id"] for doc in docs if matches(doc, query))
+        assert matched_user_ids(index, query) == expected, query
+
+
+def test_upsert_remove_and_clear_keep_index_in_sync():
+    index = TagBitmapIndex()
+    index.rebuild([])
+    index.upsert({"user_Id": "model_a", "age": 20, "gender": "Female"})
+    index.upsert({"user_Id": "model_b", "age": 30, "gender": "Male"})
+    assert matched_user_ids(index, {"gender": "Female"}) == ["model_a"]
+
+    # A patch moves the document between postings
+    index.upsert({"user_Id": "model_a", "age": 31, "gender": "Male"})
+    assert matched_user_ids(index, {"gender": "Female"}) == []
+    assert matched_user_ids(index, {"age": {"$gte": 30, "$lte": 40}}) == ["model_a", "model_b"]
+
+    index.remove("model_b")
+    assert matched_user_ids(index, {"gender": "Male"}) == ["model_a"]
+    assert index.numeric_values["age"] == [31]
+
+    # Freed doc ids are reused
+    index.upsert({"user_Id": "model_c", "age": 19})
+    assert len(index) == 2 and matched_user_ids(index, {"age": 19}) == ["model_c"]
+
+    index.clear()
+    assert len(index) == 0 and not index.match({"age": 19})
+
+
+def test_unsupported_queries_are_rejected():
+    index = TagBitmapIndex()
+    index.rebuild([make_tag(0)])
+    with pytest.raises(UnsupportedQuery):
+        index.match({"client_Type": "Model"})
+    with pytest.raises(UnsupportedQuery):
+        index.match({"age": {"$gt": 20}})
+
+
+def test_sample_user_ids_returns_distinct_matches():
+    random.seed(11)
+    docs = [make_tag(i) for i in range(5000)]
+    index = TagBitmapIndex()
+    index.rebuild(docs)
+    query = {"gender": "Female"}
+    expected = {doc["user_Id"] for doc in docs if matches(doc, query)}
+    sample = index.sample_user_ids(query, 100)
+    assert len(sample) == len(set(sample)) == 100
+    assert set(sample) <= expected
+    assert set(index.sample_user_ids({"user_Id": "model_1"}, 100)) == {"model_1"}
+
+
+def test_async_rebuild_replays_concurrent_writes():
+    index = TagBitmapIndex()
+
+    async def cursor():
+        for i in range(3):
+            yield {"user_Id": f"model_{i}", "age": 20 + i}
+            # Writes that land while the scan is running
+            if i == 0:
+                index.upsert({"user_Id": "model_new", "age": 40})
+                index.remove("model_0")
+            await asyncio.sleep(0)
+
+    asyncio.run(index.rebuild_async(cursor()))
+    assert index.ready
+    assert matched_user_ids(index, {"age": {"$gte": 0, "$lte": 100}}) == ["model_1", "model_2", "model_new"]
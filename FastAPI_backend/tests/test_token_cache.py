@@ -0,0 +1,67 @@
+import asyncio
+import os
+import sys
+import time
+
+from jose import jwk
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import routes.role_management as role_management
+from services.token_cache import VerifiedTokenCache, verified_tokens
+from test_jwks import SigningKey
+
+
+class StaticKeyStore:
+    def __init__(self, key):
+        self.key = jwk.construct(key.jwk(), "RS256")
+        self.lookups = 0
+
+    async def get_key(self, kid):
+        self.lookups += 1
+        return self.key
+
+
+def test_entries_expire_at_token_exp_and_stay_bounded():
+    cache = VerifiedTokenCache(max_tokens=2)
+    now = time.time()
+    cache.put("a", {"sub": "a", "exp": now + 60}, 0.002)
+    cache.put("expired", {"sub": "x", "exp": now - 1})
+    cache.put("no-exp", {"sub": "y"})
+    assert cache.get("a") == {"sub": "a", "exp": now + 60}
+    assert cache.get("expired") is None and cache.get("no-exp") is None
+
+    cache.put("b", {"sub": "b", "exp": now + 60})
+    cache.put("c", {"sub": "c", "exp": now + 60})  # Evicts "a", the least recently used
+    assert cache.get("a") is None and cache.get("c") is not None
+
+    cache.entries[next(iter(cache.entries))] = ({"sub": "b"}, now - 1, 0.0)  # "b" reaches its exp
+    assert cache.get("b") is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["tokens"]) == (2, 4, 1)
+    assert stats["cpu_seconds_saved"] == 0.002
+
+
+def test_repeated_bearer_token_is_verified_once(monkeypatch):
+    key = SigningKey("k1")
+    store = StaticKeyStore(key)
+    monkeypatch.setattr(role_management, "jwks_store", store)
+    monkeypatch.setattr(role_management, "AUTH0_DOMAIN", "tenant.example.com")
+    monkeypatch.setattr(role_management, "AUTH0_AUDIENCE", "https://api.example.com")
+    claims = {"sub": "auth0|42", "aud": "https://api.example.com", "iss": "https://tenant.example.com/", "exp": int(time.time()) + 3600}
+    token = key.sign(claims)
+    verified_tokens.clear()
+    hits_before = verified_tokens.hits
+
+    async def run():
+        for _ in range(10):
+            assert await role_management.get_user_id_from_token(f"Bearer {token}") == "auth0|42"
+        result = await role_management.verify_token(f"Bearer {token}")
+        assert result.is_valid and result.user_id == "auth0|42"
+
+    asyncio.run(run())
+    assert store.lookups == 1
+    assert verified_tokens.hits - hits_before == 10
+    assert verified_tokens.stats()["cpu_seconds_saved"] > 0
+    verified_tokens.clear()
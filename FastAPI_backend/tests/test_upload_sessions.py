@@ -0,0 +1,166 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import services.storage as storage
+import services.upload_session_service as sessions
+from models.file_model import UploadSessionRequest
+from conftest import FakeCollection
+from test_storage import FakeS3
+
+MB = 1024 * 1024
+
+
+async def registered(user_id):
+    return True
+
+
+async def body_of(data):
+    for start in range(0, len(data), 64 * 1024):  # Arrives the way request.stream() yields it
+        yield data[start:start + 64 * 1024]
+
+
+@pytest.fixture
+def stores(monkeypatch):
+    s3, upload_sessions, files = FakeS3(), FakeCollection(), FakeCollection()
+    monkeypatch.setattr(storage, "s3_client", s3)
+    monkeypatch.setattr(sessions, "upload_sessions_collection", upload_sessions)
+    monkeypatch.setattr(sessions, "file_collection", files)
+    monkeypatch.setattr(sessions, "_validate_user", registered)
+    return s3, upload_sessions, files
+
+
+def test_parts_upload_in_parallel_and_resume(stores):
+    s3, upload_sessions, files = stores
+    data = os.urandom(20 * MB)
+    request = UploadSessionRequest(user_id="model_1", file_name="reel.mp4", file_type="video/mp4", file_size=len(data), folder="video")
+
+    async def run():
+        session = await sessions.initiate_upload_session(request)
+        assert (session.part_size, session.total_parts) == (8 * MB, 3)
+
+        def part(n):
+            return data[(n - 1) * session.part_size:n * session.part_size]
+
+        # Parts 3 and 1 land in parallel; the connection drops before part 2
+        await asyncio.gather(*(sessions.upload_session_part(session.session_id, n, "model_1", body_of(part(n))) for n in (3, 1)))
+        assert not files.docs
+        with pytest.raises(HTTPException) as error:
+            await sessions.complete_upload_session(session.session_id, "model_1")
+        assert error.value.status_code == 400
+
+        status = await sessions.get_upload_session(session.session_id, "model_1")
+        assert status.uploaded_parts == [1, 3]
+        await sessions.upload_session_part(session.session_id, 2, "model_1", body_of(part(2)))
+        return session, await sessions.complete_upload_session(session.session_id, "model_1")
+
+    session, result = asyncio.run(run())
+    assert result["message"] == "File uploaded successfully"
+    assert s3.objects[f"video/{session.file_id}_reel.mp4"]["Body"] == data
+    assert [doc["file_size"] for doc in files.docs] == [len(data)]
+    assert not upload_sessions.docs
+
+
+def test_parts_must_match_the_layout(stores):
+    s3, upload_sessions, files = stores
+    request = UploadSessionRequest(user_id="model_1", file_name="reel.mp4", file_type="video/mp4", file_size=10 * MB, folder="video")
+
+    async def run():
+        session = await sessions.initiate_upload_session(request)
+        with pytest.raises(HTTPException):
+            await sessions.upload_session_part(session.session_id, 1, "model_1", body_of(b"\0" * (9 * MB)))
+        with pytest.raises(HTTPException) as error:
+            await sessions.upload_session_part(session.session_id, 1, "brand_1", body_of(b"\0" * (8 * MB)))
+        assert error.value.status_code == 403
+
+    asyncio.run(run())
+    assert s3.calls == ["create_multipart_upload"]
+
+
+def test_stale_sessions_are_aborted(stores):
+    s3, upload_sessions, files = stores
+    request = UploadSessionRequest(user_id="model_1", file_name="reel.mp4", file_type="video/mp4", file_size=10 * MB, folder="video")
+
+    async def run():
+        fresh = await sessions.initiate_upload_session(request)
+        stale = await sessions.initiate_upload_session(request)
+        next(doc for doc in upload_sessions.docs if doc["session_id"] == stale.session_id)["updated_at"] -= timedelta(days=2)
+        assert await sessions.expire_stale_upload_sessions(datetime.now(timezone.utc)) == 1
+        return fresh
+
+    fresh = asyncio.run(run())
+    assert [doc["session_id"] for doc in upload_sessions.docs] == [fresh.session_id]
+    assert s3.calls.count("abort_multipart_upload") == 1 and len(s3.uploads) == 1
+
+
+def test_gc_leaves_a_completing_session_alone(stores, monkeypatch):
+    s3, upload_sessions, files = stores
+    data = os.urandom(10 * MB)
+    request = UploadSessionRequest(user_id="model_1", file_name="reel.mp4", file_type="video/mp4", file_size=len(data), folder="video")
+    call = storage.object_store.call
+
+    async def gc_while_assembling(method, **kwargs):
+        if method == "complete_multipart_upload":
+            # The complete refreshed the idle session when it claimed it
+            assert await sessions.expire_stale_upload_sessions(datetime.now(timezone.utc) + timedelta(hours=25)) == 0
+        return await call(method, **kwargs)
+
+    async def run():
+        session = await sessions.initiate_upload_session(request)
+        for n in (1, 2):
+            await sessions.upload_session_part(session.session_id, n, "model_1", body_of(data[(n - 1) * 8 * MB:n * 8 * MB]))
+        upload_sessions.docs[0]["updated_at"] -= timedelta(hours=23)
+        monkeypatch.setattr(sessions.object_store, "call", gc_while_assembling)
+        return await sessions.complete_upload_session(session.session_id, "model_1")
+
+    assert asyncio.run(run())["message"] == "File uploaded successfully"
+    assert len(files.docs) == 1 and "abort_multipart_upload" not in s3.calls
+
+
+def test_gc_reclaims_a_crashed_completion(stores):
+    s3, upload_sessions, files = stores
+    request = UploadSessionRequest(user_id="model_1", file_name="reel.mp4", file_type="video/mp4", file_size=10 * MB, folder="video")
+
+    async def run():
+        await sessions.initiate_upload_session(request)
+        upload_sessions.docs[0].update(completing=True)
+        now = datetime.now(timezone.utc)
+        assert await sessions.expire_stale_upload_sessions(now + timedelta(days=2)) == 0
+        assert await sessions.expire_stale_upload_sessions(now + timedelta(days=8)) == 1
+
+    asyncio.run(run())
+    assert not upload_sessions.docs and s3.calls.count("abort_multipart_upload") == 1
+
+
+def test_direct_upload_is_recorded_only_after_the_object_checks_out(stores):
+    s3, upload_sessions, files = stores
+    request = UploadSessionRequest(user_id="model_1", file_name="look.png", file_type="image/png", file_size=1000, folder="portfolio")
+
+    async def run():
+        ticket = await sessions.initiate_direct_upload(request)
+        assert s3.post_object(ticket.fields, b"\0" * 1001) == 400  # S3 enforces the content-length-range
+        with pytest.raises(HTTPException) as error:
+            await sessions.complete_direct_upload(ticket.session_id, "model_1")
+        assert error.value.status_code == 400 and not files.docs
+
+        assert s3.post_object(ticket.fields, b"\0" * 900) == 204
+        return ticket, await sessions.complete_direct_upload(ticket.session_id, "model_1")
+
+    ticket, result = asyncio.run(run())
+    assert result["file_url"].endswith(f"portfolio/{ticket.file_id}_look.png")
+    assert [(doc["file_size"], doc["uploaded_by"], doc["folder"]) for doc in files.docs] == [(900, "model_1", "portfolio")]
+    assert not upload_sessions.docs
+    assert "create_multipart_upload" not in s3.calls and "put_object" not in s3.calls  # No bytes went through the API
+
+
+def test_direct_upload_policy_is_checked_up_front(stores):
+    request = UploadSessionRequest(user_id="model_1", file_name="clip.mov", file_type="video/quicktime", file_size=1000, folder="video")
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(sessions.initiate_direct_upload(request))
+    assert error.value.status_code == 400
@@ -0,0 +1,66 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import services.file_service as file_service
+import services.storage as storage
+import services.url_signer as url_signer
+from conftest import FakeCollection
+from test_storage import FakeS3
+
+
+def gallery(count):
+    return [
+        {"file_id": f"f{i}", "file_name": f"{i}.png", "folder": "portfolio", "file_type": "image/png",
+         "uploaded_by": "model_1", "is_private": i % 10 == 0}
+        for i in range(count)
+    ]
+
+
+def test_gallery_urls_are_signed_once_and_reused(monkeypatch):
+    s3, signer = FakeS3(), url_signer.URLSigner()
+    monkeypatch.setattr(storage, "s3_client", s3)
+    monkeypatch.setattr(file_service, "url_signer", signer)
+    monkeypatch.setattr(file_service, "file_collection", FakeCollection(gallery(500)))
+
+    first = asyncio.run(file_service.get_files_urls_by_folder(folder="portfolio"))
+    second = asyncio.run(file_service.get_files_urls_by_folder(folder="portfolio"))
+
+    # Anonymous viewers never get private files; the 450 public ones are signed in one batch
+    assert sum(file["s3_url"] is None for file in first) == 50
+    assert s3.calls.count("generate_presigned_url") == 450 and signer.batches == 1
+    assert [file["s3_url"] for file in second] == [file["s3_url"] for file in first]  # Stable, so browsers can cache
+    assert signer.stats()["hits"] == 450
+    assert "expires=604800" in first[1]["s3_url"]  # Public files get long-lived URLs
+
+
+def test_urls_are_resigned_before_they_expire(monkeypatch):
+    s3, signer = FakeS3(), url_signer.URLSigner()
+    monkeypatch.setattr(storage, "s3_client", s3)
+    now = [1_000_000.0]
+    monkeypatch.setattr(url_signer.time, "time", lambda: now[0])
+
+    async def private_url():
+        return await signer.url("image/a.png", "image/png", public=False)
+
+    url = asyncio.run(private_url())
+    now[0] += 44 * 60
+    assert asyncio.run(private_url()) == url
+    now[0] += 2 * 60  # Inside the last quarter of the hour-long signature
+    assert asyncio.run(private_url()) != url
+
+    signer.forget("image/a.png")
+    assert not signer.entries
+
+
+def test_public_files_can_use_unsigned_urls(monkeypatch):
+    s3, signer = FakeS3(), url_signer.URLSigner()
+    monkeypatch.setattr(storage, "s3_client", s3)
+    monkeypatch.setattr(url_signer, "PUBLIC_FILES_BASE_URL", "https://cdn.example.com/")
+
+    urls = asyncio.run(signer.urls([("portfolio/f 1.png", "image/png", True), ("image/p.png", "image/png", False)]))
+
+    assert urls[0] == "https://cdn.example.com/portfolio/f%201.png"
+    assert urls[1].startswith("https://s3.test/image/p.png") and s3.calls == ["generate_presigned_url"]
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import services.loaders as loaders
+import services.user_existence as user_existence
+from services.user_existence import BloomFilter, UserExistenceFilter
+from conftest import FakeCollection
+
+
+def old_user_id(i, role="model"):
+    minted = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=i)
+    return f"{role}_{ObjectId.from_datetime(minted)}"
+
+
+def test_bloom_filter_has_no_false_negatives():
+    members = [old_user_id(i) for i in range(5000)]
+    others = [old_user_id(i, "brand") for i in range(5000)]
+    bloom = BloomFilter(len(members))
+    for user_id in members:
+        bloom.add(user_id)
+
+    assert all(user_id in bloom for user_id in members)
+    assert sum(user_id in bloom for user_id in others) < 0.03 * len(others)
+
+
+def test_filter_only_vouches_for_ids_minted_before_the_build():
+    existence = UserExistenceFilter()
+    assert not existence.definitely_absent(old_user_id(1))  # Not loaded yet
+
+    existence.rebuild([old_user_id(i) for i in range(100)])
+    assert not existence.definitely_absent(old_user_id(5))
+    assert existence.definitely_absent(old_user_id(5, "brand"))
+    assert not existence.definitely_absent(f"model_{ObjectId()}")  # Possibly created by another instance
+    assert not existence.definitely_absent("not-an-object-id")
+
+    existence.add(old_user_id(5, "brand"))
+    assert not existence.definitely_absent(old_user_id(5, "brand"))
+
+
+def test_negatives_and_cached_positives_skip_mongodb(monkeypatch):
+    users = FakeCollection([{"user_Id": old_user_id(i)} for i in range(10)])
+    existence = UserExistenceFilter()
+    existence.rebuild([doc["user_Id"] for doc in users.docs])
+    monkeypatch.setattr(loaders, "user_collection", users)
+    monkeypatch.setattr(user_existence, "user_existence_filter", existence)
+    user_existence.registered_users.clear()
+
+    async def run():
+        assert await user_existence.users_are_registered([old_user_id(1, "brand"), old_user_id(2, "brand")]) == [False, False]
+        assert len(users.queries) == 0
+
+        assert await user_existence.users_are_registered([old_user_id(1), old_user_id(2)]) == [True, True]
+        assert len(users.queries) == 1  # One batched query for both
+        assert await user_existence.user_is_registered(old_user_id(1))
+        assert len(users.queries) == 1
+
+        # A deleted user is no longer served from the positive cache
+        await users.delete_one({"user_Id": old_user_id(1)})
+        user_existence.user_removed(old_user_id(1))
+        assert not await user_existence.user_is_registered(old_user_id(1))
+        assert len(users.queries) == 2
+
+    asyncio.run(run())
+    user_existence.registered_users.clear()